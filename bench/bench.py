@@ -0,0 +1,70 @@
+"""
+Decode throughput benchmark for the Huffman engine
+Times compressBuffer and decompressBuffer through the shared library on text and
+skewed binary data, which both go through the table decoder, and on uniform random
+data, which is written as a stored stream and so only measures the copy
+
+Usage: python bench/bench.py [--size MB] [--repeat N]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from corpus import corpus_path
+from gui.engine import load_engine
+
+
+def text_corpus(size):
+    """input.txt repeated up to size bytes"""
+    sample = (BASE_DIR / "input.txt").read_bytes()
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def skewed_corpus(size):
+    """Seeded binary with geometrically falling byte frequencies (bench/corpus.py)"""
+    return corpus_path("skewed", size).read_bytes()
+
+
+def stored_corpus(size):
+    """Seeded uniform random bytes; too random to code, so they are stored as they are"""
+    return corpus_path("uniform", size).read_bytes()
+
+
+def best_time(func, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=16, help="corpus size in MB")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    engine = load_engine()
+    if engine is None:
+        sys.exit("libhuffman not found - run make first")
+
+    size = args.size * 1024 * 1024
+    print(f"{'corpus':<10}{'ratio':>8}{'compress MB/s':>16}{'decompress MB/s':>18}")
+    for name, make in (("text", text_corpus), ("skewed", skewed_corpus), ("stored", stored_corpus)):
+        data = make(size)
+        packed = engine.compress(data)
+        assert engine.decompress(packed) == data, f"{name}: round trip mismatch"
+        comp = best_time(engine.compress, data, args.repeat)
+        decomp = best_time(engine.decompress, packed, args.repeat)
+        mb = size / (1024 * 1024)
+        print(f"{name:<10}{len(packed) / size:>8.3f}{mb / comp:>16.1f}{mb / decomp:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
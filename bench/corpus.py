@@ -0,0 +1,165 @@
+"""
+Deterministic benchmark corpora
+Every generator is seeded, so the same kind and size always gives the same bytes
+
+Usage: python bench/corpus.py [--sizes 1M,16M] [--dir bench/corpus]
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+CORPUS_DIR = BENCH_DIR / "corpus"
+SEED = 20240601
+
+# Generate in pieces of about this many bytes to keep memory flat
+CHUNK = 1 << 20
+
+WORDS = (
+    "the of and to in a is that for it as was with be by on not he I this are or his from at which "
+    "but have an they you were her she there been one all we their has would when if so no will more "
+    "time can out up about into than them only other new some could these two may first then do any "
+    "like my now over such our man me even most made after also did many before must through back "
+    "years where much your way well down should because each just those people how too little state "
+    "good very make world still own see men work long get here between both life being under never "
+    "day same another know while last might us great old year off come since against go came right "
+    "used take three government country during without place around however home small found thought "
+    "went say part once general high upon school every house something fact although water during"
+).split()
+
+LOG_LEVELS = ("INFO", "INFO", "INFO", "INFO", "DEBUG", "DEBUG", "WARN", "ERROR")
+LOG_PATHS = ("/api/users", "/api/orders", "/api/orders/items", "/health", "/static/app.js",
+             "/api/search", "/login", "/api/cart")
+LOG_STATUS = (200, 200, 200, 200, 201, 204, 304, 400, 404, 500)
+
+
+def parse_size(text):
+    """Byte count with an optional K, M or G suffix, like the CLI's --block-size"""
+    text = text.strip().upper()
+    scale = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}.get(text[-1:], 1)
+    return int(text[:-1] if scale > 1 else text) * scale
+
+
+def format_size(size):
+    for suffix, scale in (("G", 1 << 30), ("M", 1 << 20), ("K", 1 << 10)):
+        if size >= scale and size % scale == 0:
+            return f"{size // scale}{suffix}"
+    return str(size)
+
+
+def english(rng, size):
+    """Sentences drawn from a Zipf-weighted vocabulary"""
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    out = bytearray()
+    while len(out) < size:
+        words = rng.choices(WORDS, weights, k=CHUNK // 5)
+        pieces = []
+        i = 0
+        while i < len(words):
+            length = rng.randint(6, 24)
+            sentence = " ".join(words[i:i + length])
+            pieces.append(sentence[:1].upper() + sentence[1:] + rng.choice(".....?!"))
+            i += length
+            if rng.random() < 0.15:
+                pieces.append("\n\n")
+        out += " ".join(pieces).encode()
+    return bytes(out[:size])
+
+
+def logs(rng, size):
+    """Web-server style log lines with timestamps, levels and request fields"""
+    clock = datetime(2024, 1, 1)
+    out = bytearray()
+    while len(out) < size:
+        lines = []
+        for _ in range(CHUNK // 100):
+            clock += timedelta(milliseconds=rng.randint(1, 250))
+            lines.append(
+                f"{clock:%Y-%m-%dT%H:%M:%S}.{clock.microsecond // 1000:03d}Z {rng.choice(LOG_LEVELS):<5} "
+                f"[worker-{rng.randint(0, 15)}] request_id={rng.getrandbits(64):016x} "
+                f"method=GET path={rng.choice(LOG_PATHS)} status={rng.choice(LOG_STATUS)} "
+                f"latency_ms={int(rng.expovariate(1 / 40))}\n"
+            )
+        out += "".join(lines).encode()
+    return bytes(out[:size])
+
+
+def weighted_bytes(rng, size, weights):
+    """Independent bytes with the given per-symbol weights, every symbol present at least once"""
+    cum = []
+    total = 0
+    for w in weights:
+        total += w
+        cum.append(total)
+    symbols = range(len(weights))
+    out = bytearray()
+    while len(out) < size:
+        out += bytes(rng.choices(symbols, cum_weights=cum, k=min(CHUNK, size - len(out))))
+    # Guarantee the full alphabet so the tree always has 256 leaves
+    if size >= len(weights):
+        out[:len(weights)] = bytes(symbols)
+    return bytes(out)
+
+
+def skewed(rng, size):
+    """Binary with geometrically falling symbol frequencies"""
+    return weighted_bytes(rng, size, [0.96 ** s for s in range(256)])
+
+
+def uniform(rng, size):
+    """Uniform random bytes; incompressible"""
+    return rng.getrandbits(size * 8).to_bytes(size, "little") if size else b""
+
+
+def single(rng, size):
+    """One repeated byte"""
+    return b"a" * size
+
+
+def fib256(rng, size):
+    """256 symbols with Fibonacci-proportioned frequencies, the worst case for code length"""
+    fib = [1, 1]
+    while len(fib) < 256:
+        fib.append(fib[-1] + fib[-2])
+    return weighted_bytes(rng, size, fib)
+
+
+KINDS = {
+    "english": english,
+    "logs": logs,
+    "skewed": skewed,
+    "uniform": uniform,
+    "single": single,
+    "fib256": fib256,
+}
+
+
+def corpus_path(kind, size, directory=CORPUS_DIR):
+    """Path of a corpus file, generating it first if it does not exist yet"""
+    path = Path(directory) / f"{kind}-{format_size(size)}.bin"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rng = random.Random(f"{SEED}-{kind}-{size}")
+        data = KINDS[kind](rng, size)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1M,16M", help="comma-separated sizes, K/M/G suffixes allowed")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="comma-separated corpus kinds")
+    parser.add_argument("--dir", default=str(CORPUS_DIR), help="where to write the corpus files")
+    args = parser.parse_args()
+
+    for size in map(parse_size, args.sizes.split(",")):
+        for kind in args.kinds.split(","):
+            print(corpus_path(kind, size, args.dir))
+
+
+if __name__ == "__main__":
+    main()
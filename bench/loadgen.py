@@ -0,0 +1,167 @@
+"""
+Load generator for the engine daemon
+Sends small jobs over concurrent connections and reports jobs/s and latency percentiles
+
+Usage:
+  python bench/loadgen.py [--clients 16] [--jobs 4000] [--size 4K] [--kind logs] [--operation compress]
+  python bench/loadgen.py --socket /run/huffman.sock      # an already running daemon
+  python bench/loadgen.py --spawn                         # one process per job, for comparison
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from corpus import BENCH_DIR, KINDS, corpus_path, format_size, parse_size
+
+BASE_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from gui.client import connect
+
+EXE_NAME = "huffman.exe" if sys.platform == "win32" else "huffman"
+OPERATIONS = ("compress", "decompress", "mixed")
+
+
+def make_payloads(kind, size, count, seed=1):
+    """`count` slices of `size` bytes at seeded offsets of a 4 MiB corpus file"""
+    data = corpus_path(kind, 4 << 20).read_bytes()
+    rng = random.Random(seed)
+    return [data[offset:offset + size] for offset in (rng.randrange(len(data) - size) for _ in range(count))]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def start_daemon(exe, socket_path, workers):
+    process = await asyncio.create_subprocess_exec(exe, "-j", str(workers), "serve", str(socket_path),
+                                                   stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        if Path(socket_path).exists():
+            return process
+        await asyncio.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"daemon did not start listening on {socket_path}")
+
+
+async def run_daemon_jobs(socket_path, jobs, clients):
+    """Run (operation, data) jobs over `clients` connections; returns per-job latencies in seconds"""
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    latencies = []
+
+    async def client_loop():
+        async with await connect(socket_path) as client:
+            while not queue.empty():
+                operation, data = queue.get_nowait()
+                start = time.perf_counter()
+                if operation == "compress":
+                    await client.compress(data)
+                else:
+                    await client.decompress(data)
+                latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client_loop() for _ in range(clients)))
+    return latencies
+
+
+async def run_spawned_jobs(exe, jobs, clients):
+    """The same jobs with one `huffman compress - -` process each, `clients` at a time"""
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    latencies = []
+
+    async def spawn_loop():
+        while not queue.empty():
+            operation, data = queue.get_nowait()
+            start = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(exe, operation, "-", "-", stdin=subprocess.PIPE,
+                                                           stdout=subprocess.PIPE)
+            await process.communicate(data)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(spawn_loop() for _ in range(clients)))
+    return latencies
+
+
+async def prepare_jobs(socket_path, payloads, operation):
+    """Decompression jobs need compressed inputs, made with the daemon itself"""
+    if operation == "compress":
+        return [("compress", data) for data in payloads]
+    async with await connect(socket_path) as client:
+        packed = [await client.compress(data) for data in payloads]
+    if operation == "decompress":
+        return [("decompress", data) for data in packed]
+    return [("compress", data) if i % 2 else ("decompress", packed[i]) for i, data in enumerate(payloads)]
+
+
+async def run(args):
+    exe = str(Path(args.exe).resolve())
+    payloads = make_payloads(args.kind, args.size, args.jobs)
+    with tempfile.TemporaryDirectory(prefix="huffman-load-") as workdir:
+        socket_path = args.socket or str(Path(workdir) / "huffman.sock")
+        daemon = None if args.socket else await start_daemon(exe, socket_path, args.workers)
+        try:
+            jobs = await prepare_jobs(socket_path, payloads, args.operation)
+            start = time.perf_counter()
+            if args.spawn:
+                latencies = await run_spawned_jobs(exe, jobs, args.clients)
+            else:
+                latencies = await run_daemon_jobs(socket_path, jobs, args.clients)
+            elapsed = time.perf_counter() - start
+        finally:
+            if daemon is not None:
+                daemon.terminate()
+                await daemon.wait()
+
+    latencies.sort()
+    return {
+        "mode": "spawn" if args.spawn else "daemon",
+        "operation": args.operation,
+        "clients": args.clients,
+        "jobs": len(latencies),
+        "job_size": args.size,
+        "seconds": elapsed,
+        "jobs_per_s": len(latencies) / elapsed,
+        "mb_per_s": len(latencies) * args.size / elapsed / 1e6,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "max_ms": latencies[-1] * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--exe", default=str(BASE_DIR / EXE_NAME), help="huffman executable")
+    parser.add_argument("--socket", help="use the daemon already listening here instead of starting one")
+    parser.add_argument("--workers", type=int, default=0, help="workers of the started daemon (0 = one per CPU)")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent connections")
+    parser.add_argument("--jobs", type=int, default=4000, help="jobs to run")
+    parser.add_argument("--size", type=parse_size, default=4096, help="bytes per job, K/M suffixes allowed")
+    parser.add_argument("--kind", default="logs", choices=sorted(KINDS), help="corpus the jobs are cut from")
+    parser.add_argument("--operation", default="compress", choices=OPERATIONS)
+    parser.add_argument("--spawn", action="store_true", help="run every job as its own process instead")
+    parser.add_argument("--json", action="store_true", help="print the result as one JSON object")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{result['mode']}: {result['jobs']} {args.operation} jobs of {format_size(args.size)} "
+          f"over {args.clients} clients in {result['seconds']:.2f} s")
+    print(f"  {result['jobs_per_s']:.0f} jobs/s, {result['mb_per_s']:.1f} MB/s, "
+          f"latency p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, max {result['max_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark suite for the huffman executable
+Times compress and decompress on every generated corpus and reports MB/s, ratio and peak RSS
+
+Usage:
+  python bench/suite.py [--sizes 1M,16M] [--repeat 3] [--save baseline.json]
+  python bench/suite.py --compare baseline.json [--tolerance 0.10]
+  python bench/suite.py --kinds english,logs --files input.txt --modes static,context
+"""
+
+import argparse
+import filecmp
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from corpus import BENCH_DIR, CORPUS_DIR, KINDS, corpus_path, format_size, parse_size
+
+BASE_DIR = BENCH_DIR.parent
+EXE_NAME = "huffman.exe" if sys.platform == "win32" else "huffman"
+
+# Throughput and RSS are compared against the baseline; ratio must not get worse at all
+METRICS = (
+    ("compress_mbps", "higher"),
+    ("decompress_mbps", "higher"),
+    ("compress_rss_kb", "lower"),
+    ("decompress_rss_kb", "lower"),
+)
+RATIO_SLACK = 1e-4
+
+# Coding modes and the CLI flags that select them; results of modes other than static are named <input>:<mode>
+MODES = {
+    "static": [],
+    "context": ["--context"],
+    "adaptive": ["--adaptive"],
+}
+
+
+def run_engine(exe, operation, src, dst, engine_args):
+    """One CLI run; returns its --stats=json report, which includes the process's peak RSS"""
+    command = [str(exe), *engine_args, "--stats=json", operation, str(src), str(dst)]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed: {result.stderr.decode(errors='replace').strip()}")
+    return json.loads(result.stdout.decode().strip().splitlines()[-1])
+
+
+def measure(exe, path, repeat, engine_args, workdir):
+    """Best-of-`repeat` throughput for both directions, with a round-trip check"""
+    packed = Path(workdir) / "packed.huff"
+    restored = Path(workdir) / "restored.bin"
+    raw_size = path.stat().st_size
+    best = {"compress": float("inf"), "decompress": float("inf")}
+    rss = {"compress": 0, "decompress": 0}
+    for _ in range(repeat):
+        for operation, src, dst in (("compress", path, packed), ("decompress", packed, restored)):
+            stats = run_engine(exe, operation, src, dst, engine_args)
+            best[operation] = min(best[operation], stats["total_ns"] / 1e9)
+            rss[operation] = max(rss[operation], stats.get("peak_rss_kb", 0))
+    if not filecmp.cmp(path, restored, shallow=False):
+        raise RuntimeError(f"{path.name}: round trip mismatch")
+
+    def mbps(seconds):
+        return round(raw_size / 1e6 / seconds, 2) if seconds > 0 else None
+
+    return {
+        "size": raw_size,
+        "ratio": round(packed.stat().st_size / raw_size, 6) if raw_size else 1.0,
+        "compress_mbps": mbps(best["compress"]),
+        "decompress_mbps": mbps(best["decompress"]),
+        "compress_rss_kb": rss["compress"] or None,
+        "decompress_rss_kb": rss["decompress"] or None,
+    }
+
+
+def compare(results, baseline, tolerance, rss_tolerance):
+    """Lines describing every metric that got worse than the baseline allows"""
+    regressions = []
+    for name, current in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if current["ratio"] > old["ratio"] + RATIO_SLACK:
+            regressions.append(f"{name}: ratio {old['ratio']:.4f} -> {current['ratio']:.4f}")
+        for metric, better in METRICS:
+            before, after = old.get(metric), current.get(metric)
+            if not before or not after:
+                continue
+            allowed = rss_tolerance if metric.endswith("rss_kb") else tolerance
+            change = (after - before) / before
+            if (better == "higher" and change < -allowed) or (better == "lower" and change > allowed):
+                regressions.append(f"{name}: {metric} {before} -> {after} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1M,16M", help="comma-separated corpus sizes, K/M/G suffixes allowed")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="comma-separated corpus kinds")
+    parser.add_argument("--files", help="comma-separated extra input files, such as input.txt")
+    parser.add_argument("--modes", default="static", help=f"comma-separated coding modes ({', '.join(MODES)})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is kept)")
+    parser.add_argument("--exe", default=str(BASE_DIR / EXE_NAME), help="huffman executable to time")
+    parser.add_argument("--threads", help="passed to the executable as --threads")
+    parser.add_argument("--block-size", help="passed to the executable as --block-size")
+    parser.add_argument("--corpus-dir", default=str(CORPUS_DIR), help="where generated corpora are cached")
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed throughput drop (fraction)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.25, help="allowed peak RSS growth (fraction)")
+    args = parser.parse_args()
+
+    exe = Path(args.exe)
+    if not exe.exists():
+        sys.exit(f"{exe} not found - run make first")
+    engine_args = []
+    if args.threads:
+        engine_args += ["--threads", args.threads]
+    if args.block_size:
+        engine_args += ["--block-size", args.block_size]
+    modes = args.modes.split(",")
+    for mode in modes:
+        if mode not in MODES:
+            sys.exit(f"unknown mode {mode!r} (expected one of {', '.join(MODES)})")
+
+    inputs = []
+    for size in map(parse_size, args.sizes.split(",")):
+        for kind in filter(None, args.kinds.split(",")):
+            inputs.append((f"{kind}-{format_size(size)}", corpus_path(kind, size, args.corpus_dir)))
+    for file in filter(None, (args.files or "").split(",")):
+        inputs.append((Path(file).name, Path(file)))
+
+    results = {}
+    print(f"{'input':<24}{'ratio':>8}{'compress MB/s':>16}{'decompress MB/s':>18}{'peak RSS MB':>14}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for input_name, path in inputs:
+            for mode in modes:
+                name = input_name if mode == "static" else f"{input_name}:{mode}"
+                row = results[name] = measure(exe, path, args.repeat, engine_args + MODES[mode], workdir)
+                peak = max(row["compress_rss_kb"] or 0, row["decompress_rss_kb"] or 0)
+                print(f"{name:<24}{row['ratio']:>8.3f}{row['compress_mbps'] or 0:>16.1f}"
+                      f"{row['decompress_mbps'] or 0:>18.1f}{peak / 1024:>14.1f}")
+
+    report = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "engine_args": engine_args,
+            "modes": modes,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["results"]
+        regressions = compare(results, baseline, args.tolerance, args.rss_tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,8 @@ a = Analysis(
     binaries=[
         # Include the huffman.exe backend
         ('huffman.exe', '.'),
+        # In-process engine loaded by gui/engine.py
+        ('huffman.dll', '.'),
     ],
     datas=[
         # Include the gui package
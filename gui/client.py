@@ -0,0 +1,139 @@
+"""
+Asyncio client for the engine daemon started with `huffman serve <socket>`
+A connection runs one job at a time; open one per job that should run concurrently
+"""
+
+import asyncio
+import os
+import struct
+
+from .engine import HuffmanError, PHASES
+
+
+# Wire format, see include/serve.h
+_REQUEST = struct.Struct("<BBBBIQII")
+_RESPONSE = struct.Struct(f"<iIQ5Q{len(PHASES)}Q256Qdd")
+
+SOURCE_FILES = 0
+SOURCE_INLINE = 1
+
+FLAG_CONTEXT = 1
+FLAG_ADAPTIVE = 2
+FLAG_DICTIONARY = 4
+
+# Largest inline payload the daemon accepts (SERVE_MAX_INLINE); larger data goes by file
+MAX_INLINE = 64 << 20
+
+
+def _stats_dict(fields):
+    """Same keys and units as HuffmanStats.as_dict() and the CLI's --stats=json output"""
+    input_size, output_size, coded_bits, limit_loss_bits, total_ns = fields[:5]
+    phases = fields[5:5 + len(PHASES)]
+    histogram = fields[5 + len(PHASES):5 + len(PHASES) + 256]
+    entropy, average_code_length = fields[-2:]
+    return {
+        "input_size": input_size,
+        "output_size": output_size,
+        "entropy": entropy,
+        "average_code_length": average_code_length,
+        "coded_bits": coded_bits,
+        "limit_loss_bits": limit_loss_bits,
+        "total_ns": total_ns,
+        "phases_ns": dict(zip(PHASES, phases)),
+        "histogram": list(histogram),
+    }
+
+
+class HuffmanClient:
+    """One connection to a running daemon
+
+    The methods mirror HuffmanEngine's: the file functions return the stats
+    of the job as a dict, the buffer functions the output bytes (and fill
+    `stats` when a dict is passed in).  Errors reported by the engine raise
+    HuffmanError; `dictionary=True` codes with the daemon's --dict.
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, socket_path):
+        reader, writer = await asyncio.open_unix_connection(str(socket_path))
+        return cls(reader, writer)
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def compress_file(self, input_file, output_file, threads=None, block_size=None, max_code_length=None,
+                            adaptive=None, context=None, dictionary=False):
+        """Compress input_file into output_file on the daemon and return the stats of the job"""
+        stats, _ = await self._files(b"c", input_file, output_file, threads, block_size, max_code_length,
+                                     adaptive, context, dictionary)
+        return stats
+
+    async def decompress_file(self, input_file, output_file, threads=None, dictionary=False):
+        """Decompress input_file into output_file on the daemon and return the stats of the job"""
+        stats, _ = await self._files(b"d", input_file, output_file, threads, dictionary=dictionary)
+        return stats
+
+    async def compress(self, data, threads=None, block_size=None, stats=None, max_code_length=None,
+                       adaptive=None, context=None, dictionary=False):
+        """Compress a bytes-like object and return the compressed bytes"""
+        return await self._inline(b"c", data, stats, threads, block_size, max_code_length, adaptive, context,
+                                  dictionary)
+
+    async def decompress(self, data, threads=None, stats=None, dictionary=False):
+        """Decompress a bytes-like object and return the original bytes"""
+        return await self._inline(b"d", data, stats, threads, dictionary=dictionary)
+
+    async def _files(self, operation, input_file, output_file, threads=None, block_size=None,
+                     max_code_length=None, adaptive=None, context=None, dictionary=False):
+        # The daemon resolves relative paths against its own working directory, not ours
+        paths = (os.path.abspath(input_file).encode(), os.path.abspath(output_file).encode())
+        return await self._request(operation, SOURCE_FILES, paths, threads, block_size, max_code_length,
+                                   adaptive, context, dictionary)
+
+    async def _inline(self, operation, data, stats, threads=None, block_size=None, max_code_length=None,
+                      adaptive=None, context=None, dictionary=False):
+        if len(data) > MAX_INLINE:
+            raise ValueError(f"Inline data is limited to {MAX_INLINE} bytes; use the file functions")
+        job_stats, output = await self._request(operation, SOURCE_INLINE, (bytes(data), b""), threads,
+                                                block_size, max_code_length, adaptive, context, dictionary)
+        if stats is not None:
+            stats.update(job_stats)
+        return output
+
+    async def _request(self, operation, source, payload, threads, block_size, max_code_length, adaptive,
+                       context, dictionary):
+        flags = ((FLAG_CONTEXT if context else 0) | (FLAG_ADAPTIVE if adaptive else 0) |
+                 (FLAG_DICTIONARY if dictionary else 0))
+        first, second = payload
+        header = _REQUEST.pack(operation[0], source, flags, max_code_length or 0,
+                               1 if threads is None else threads, block_size or 0, len(first), len(second))
+        async with self._lock:
+            self._writer.write(header + first + second)
+            await self._writer.drain()
+            try:
+                fields = _RESPONSE.unpack(await self._reader.readexactly(_RESPONSE.size))
+                status, message_length, data_length = fields[:3]
+                message = await self._reader.readexactly(message_length)
+                output = await self._reader.readexactly(data_length)
+            except asyncio.IncompleteReadError as e:
+                raise ConnectionError("The daemon closed the connection") from e
+        if status != 0:
+            raise HuffmanError(status, message.decode(errors="replace"))
+        return _stats_dict(fields[3:]), output
+
+
+async def connect(socket_path):
+    """Open a HuffmanClient on the daemon listening at socket_path"""
+    return await HuffmanClient.connect(socket_path)
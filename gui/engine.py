@@ -0,0 +1,354 @@
+"""
+In-process binding to the Huffman engine shared library
+Loaded through ctypes, which releases the GIL for the duration of every call
+"""
+
+import ctypes
+import os
+import sys
+import threading
+from pathlib import Path
+
+
+HUFF_OK = 0
+HUFF_ERR_CANCELED = -5
+HUFF_ERR_DICTIONARY = -6
+HUFF_ERR_CHECKSUM = -7
+HUFF_ERR_LIMIT = -8
+
+# Preamble every file written since format version 2 starts with (include/format.h)
+FORMAT_MAGIC = b"\x89HUF"
+FORMAT_PREAMBLE_SIZE = 8
+
+
+class HuffmanError(RuntimeError):
+    """Raised when the engine reports a non-zero status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Order of HuffmanStats.phaseNs (HUFF_PHASE_* in include/huffman.h)
+PHASES = ("read", "histogram", "table", "code", "write")
+
+
+class HuffmanStats(ctypes.Structure):
+    """Mirror of struct HuffmanStats in include/huffman.h"""
+    _fields_ = [
+        ("inputSize", ctypes.c_uint64),
+        ("outputSize", ctypes.c_uint64),
+        ("histogram", ctypes.c_uint64 * 256),
+        ("codedBits", ctypes.c_uint64),
+        ("entropy", ctypes.c_double),
+        ("averageCodeLength", ctypes.c_double),
+        ("totalNs", ctypes.c_uint64),
+        ("phaseNs", ctypes.c_uint64 * len(PHASES)),
+        ("limitLossBits", ctypes.c_uint64),
+    ]
+
+    def as_dict(self):
+        """Same keys and units as the CLI's --stats=json output"""
+        return {
+            "input_size": self.inputSize,
+            "output_size": self.outputSize,
+            "entropy": self.entropy,
+            "average_code_length": self.averageCodeLength,
+            "coded_bits": self.codedBits,
+            "limit_loss_bits": self.limitLossBits,
+            "total_ns": self.totalNs,
+            "phases_ns": dict(zip(PHASES, self.phaseNs)),
+            "histogram": list(self.histogram),
+        }
+
+
+class HuffmanOptions(ctypes.Structure):
+    """Mirror of struct HuffmanOptions in include/huffman.h"""
+    _fields_ = [
+        ("threads", ctypes.c_uint),
+        ("blockSize", ctypes.c_size_t),
+        ("stats", ctypes.POINTER(HuffmanStats)),
+        ("progress", ctypes.POINTER(ctypes.c_uint64)),
+        ("cancel", ctypes.POINTER(ctypes.c_int)),
+        ("maxCodeLength", ctypes.c_uint),
+        ("adaptive", ctypes.c_int),
+        ("context", ctypes.c_int),
+        ("dictionary", ctypes.c_void_p),
+        ("maxOutputSize", ctypes.c_uint64),
+    ]
+
+
+class HuffmanCacheStats(ctypes.Structure):
+    """Mirror of struct HuffmanCacheStats in include/huffman.h"""
+    _fields_ = [
+        ("hits", ctypes.c_uint64),
+        ("misses", ctypes.c_uint64),
+        ("evictions", ctypes.c_uint64),
+        ("entries", ctypes.c_uint64),
+        ("bytes", ctypes.c_uint64),
+        ("limit", ctypes.c_uint64),
+    ]
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name, _ in self._fields_}
+
+
+class HuffmanDictionary:
+    """A dictionary file loaded by the engine, with its code and decode tables built once
+
+    Obtain one from HuffmanEngine.load_dictionary(); it can be passed to any
+    number of calls at once and is released when garbage collected.
+    """
+
+    def __init__(self, lib, path, handle):
+        self._lib = lib
+        self.path = path
+        self._handle = handle
+
+    def __del__(self):
+        if self._handle:
+            self._lib.huffmanFreeDictionary(self._handle)
+            self._handle = None
+
+
+class JobControl:
+    """Progress counter and cancel flag shared with one running engine call
+
+    The engine updates `progress` (input bytes processed) while it runs;
+    any thread may read it or call cancel() to stop the call, which then
+    raises HuffmanError with status HUFF_ERR_CANCELED.
+    """
+
+    def __init__(self):
+        self._progress = ctypes.c_uint64(0)
+        self._cancel = ctypes.c_int(0)
+
+    @property
+    def progress(self):
+        return self._progress.value
+
+    @property
+    def canceled(self):
+        return bool(self._cancel.value)
+
+    def cancel(self):
+        self._cancel.value = 1
+
+
+def _library_names():
+    if sys.platform == "win32":
+        return ["huffman.dll"]
+    if sys.platform == "darwin":
+        return ["libhuffman.dylib", "libhuffman.so"]
+    return ["libhuffman.so"]
+
+
+class HuffmanEngine:
+    """Thin wrapper around libhuffman's file and buffer entry points"""
+
+    def __init__(self, library_path):
+        self.path = str(library_path)
+        self._lib = ctypes.CDLL(self.path)
+        self._declare_functions()
+        # Resolved path -> ((mtime_ns, size), HuffmanDictionary)
+        self._dictionaries = {}
+        self._dictionaries_lock = threading.Lock()
+
+    def _declare_functions(self):
+        lib = self._lib
+        c_ubyte_p = ctypes.POINTER(ctypes.c_ubyte)
+
+        for name in ("compressFile", "decompressFile"):
+            func = getattr(lib, name)
+            func.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+            func.restype = ctypes.c_int
+
+        for name in ("compressBuffer", "decompressBuffer"):
+            func = getattr(lib, name)
+            func.argtypes = [ctypes.c_char_p, ctypes.c_size_t,
+                             ctypes.POINTER(c_ubyte_p), ctypes.POINTER(ctypes.c_size_t)]
+            func.restype = ctypes.c_int
+
+        options_p = ctypes.POINTER(HuffmanOptions)
+        lib.huffmanDefaultOptions.argtypes = [options_p]
+        lib.huffmanDefaultOptions.restype = None
+        for name in ("compressFileWithOptions", "decompressFileWithOptions"):
+            func = getattr(lib, name)
+            func.argtypes = [ctypes.c_char_p, ctypes.c_char_p, options_p]
+            func.restype = ctypes.c_int
+        for name in ("compressBufferWithOptions", "decompressBufferWithOptions"):
+            func = getattr(lib, name)
+            func.argtypes = [ctypes.c_char_p, ctypes.c_size_t, ctypes.POINTER(c_ubyte_p),
+                             ctypes.POINTER(ctypes.c_size_t), options_p]
+            func.restype = ctypes.c_int
+        lib.huffmanTestFile.argtypes = [ctypes.c_char_p, options_p]
+        lib.huffmanTestFile.restype = ctypes.c_int
+
+        lib.freeBuffer.argtypes = [c_ubyte_p]
+        lib.freeBuffer.restype = None
+        lib.huffmanStrerror.argtypes = [ctypes.c_int]
+        lib.huffmanStrerror.restype = ctypes.c_char_p
+
+        lib.huffmanTrainDictionary.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.c_size_t,
+                                               ctypes.c_char_p, options_p]
+        lib.huffmanTrainDictionary.restype = ctypes.c_int
+        lib.huffmanLoadDictionary.argtypes = [ctypes.c_char_p, ctypes.POINTER(ctypes.c_void_p)]
+        lib.huffmanLoadDictionary.restype = ctypes.c_int
+        lib.huffmanFreeDictionary.argtypes = [ctypes.c_void_p]
+        lib.huffmanFreeDictionary.restype = None
+
+        lib.huffmanSetTableCacheLimit.argtypes = [ctypes.c_size_t]
+        lib.huffmanSetTableCacheLimit.restype = None
+        lib.huffmanTableCacheStats.argtypes = [ctypes.POINTER(HuffmanCacheStats)]
+        lib.huffmanTableCacheStats.restype = None
+
+    def _check(self, status):
+        if status != HUFF_OK:
+            message = self._lib.huffmanStrerror(status).decode(errors="replace")
+            raise HuffmanError(status, message)
+
+    def set_table_cache_limit(self, limit):
+        """Cap the memory of the engine's table cache in bytes; 0 empties and disables it"""
+        self._lib.huffmanSetTableCacheLimit(limit)
+
+    def table_cache_stats(self):
+        """Hit, miss and eviction counters of the table cache, with its size and limit"""
+        stats = HuffmanCacheStats()
+        self._lib.huffmanTableCacheStats(ctypes.byref(stats))
+        return stats.as_dict()
+
+    def load_dictionary(self, path):
+        """Return the loaded dictionary at `path`, reading it only when the file is new or changed"""
+        path = str(Path(path).resolve())
+        info = os.stat(path)
+        key = (info.st_mtime_ns, info.st_size)
+        with self._dictionaries_lock:
+            cached = self._dictionaries.get(path)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            handle = ctypes.c_void_p()
+            self._check(self._lib.huffmanLoadDictionary(path.encode(), ctypes.byref(handle)))
+            dictionary = HuffmanDictionary(self._lib, path, handle)
+            self._dictionaries[path] = (key, dictionary)
+            return dictionary
+
+    def train_dictionary(self, samples, dict_file, max_code_length=None, control=None):
+        """Build a dictionary from the sample files into dict_file and return the HuffmanStats of the run"""
+        samples = [str(sample).encode() for sample in samples]
+        paths = (ctypes.c_char_p * len(samples))(*samples)
+        stats = HuffmanStats()
+        options = self.options(stats=stats, control=control, max_code_length=max_code_length)
+        self._check(self._lib.huffmanTrainDictionary(paths, len(samples), str(dict_file).encode(),
+                                                     ctypes.byref(options)))
+        return stats
+
+    def options(self, threads=None, block_size=None, stats=None, control=None, max_code_length=None,
+                adaptive=None, context=None, dictionary=None):
+        """Build a HuffmanOptions struct; None keeps the engine default
+
+        `dictionary` is a HuffmanDictionary or the path of a dictionary file.
+        """
+        options = HuffmanOptions()
+        self._lib.huffmanDefaultOptions(ctypes.byref(options))
+        if threads is not None:
+            options.threads = threads
+        if block_size is not None:
+            options.blockSize = block_size
+        if max_code_length is not None:
+            options.maxCodeLength = max_code_length
+        if adaptive is not None:
+            options.adaptive = int(adaptive)
+        if context is not None:
+            options.context = int(context)
+        if stats is not None:
+            options.stats = ctypes.pointer(stats)
+        if control is not None:
+            options.progress = ctypes.pointer(control._progress)
+            options.cancel = ctypes.pointer(control._cancel)
+        if dictionary is not None:
+            if not isinstance(dictionary, HuffmanDictionary):
+                dictionary = self.load_dictionary(dictionary)
+            options.dictionary = dictionary._handle
+            # Keeps the tables alive for the call even if the cache reloads the file
+            options._dictionary = dictionary
+        return options
+
+    def compress_file(self, input_file, output_file, threads=None, block_size=None, control=None,
+                      max_code_length=None, adaptive=None, context=None, dictionary=None):
+        """Compress input_file into output_file and return the HuffmanStats of the run"""
+        stats = HuffmanStats()
+        options = self.options(threads, block_size, stats, control, max_code_length, adaptive, context,
+                               dictionary)
+        self._check(self._lib.compressFileWithOptions(
+            str(input_file).encode(), str(output_file).encode(), ctypes.byref(options)))
+        return stats
+
+    def decompress_file(self, input_file, output_file, threads=None, control=None, dictionary=None):
+        """Decompress input_file into output_file and return the HuffmanStats of the run"""
+        stats = HuffmanStats()
+        options = self.options(threads, stats=stats, control=control, dictionary=dictionary)
+        self._check(self._lib.decompressFileWithOptions(
+            str(input_file).encode(), str(output_file).encode(), ctypes.byref(options)))
+        return stats
+
+    def test_file(self, input_file, threads=None, control=None, dictionary=None):
+        """Decode input_file without writing it and return the HuffmanStats; corrupt files raise HuffmanError"""
+        stats = HuffmanStats()
+        options = self.options(threads, stats=stats, control=control, dictionary=dictionary)
+        self._check(self._lib.huffmanTestFile(str(input_file).encode(), ctypes.byref(options)))
+        return stats
+
+    def compress(self, data, threads=None, block_size=None, stats=None, max_code_length=None, adaptive=None,
+                 context=None, dictionary=None):
+        """Compress a bytes-like object and return the compressed bytes; fills `stats` if given"""
+        options = self.options(threads, block_size, stats, max_code_length=max_code_length, adaptive=adaptive,
+                               context=context, dictionary=dictionary)
+        return self._run_buffer(self._lib.compressBufferWithOptions, data, ctypes.byref(options))
+
+    def decompress(self, data, threads=None, stats=None, dictionary=None):
+        """Decompress a bytes-like object and return the original bytes; fills `stats` if given"""
+        options = self.options(threads, stats=stats, dictionary=dictionary)
+        return self._run_buffer(self._lib.decompressBufferWithOptions, data, ctypes.byref(options))
+
+    def _run_buffer(self, func, data, *extra):
+        data = bytes(data)
+        output = ctypes.POINTER(ctypes.c_ubyte)()
+        output_size = ctypes.c_size_t(0)
+        self._check(func(data, len(data), ctypes.byref(output), ctypes.byref(output_size), *extra))
+        try:
+            return ctypes.string_at(output, output_size.value)
+        finally:
+            self._lib.freeBuffer(output)
+
+
+_engine = None
+
+
+def has_preamble(header):
+    """Whether the first FORMAT_PREAMBLE_SIZE bytes of a file are a compressed file's preamble"""
+    return len(header) == FORMAT_PREAMBLE_SIZE and header.startswith(FORMAT_MAGIC)
+
+
+def find_library(base_dir=None):
+    """Locate the shared library next to the project or in releases/"""
+    base_dir = Path(base_dir) if base_dir else Path(__file__).parent.parent
+    for directory in (base_dir, base_dir / "releases"):
+        for name in _library_names():
+            path = directory / name
+            if path.exists():
+                return path
+    return None
+
+
+def load_engine():
+    """Return a shared HuffmanEngine instance, or None if the library is unavailable"""
+    global _engine
+    if _engine is None:
+        path = find_library()
+        if path is None:
+            return None
+        try:
+            _engine = HuffmanEngine(path)
+        except (OSError, AttributeError):
+            return None
+    return _engine
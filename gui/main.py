@@ -5,8 +5,13 @@ Modern PyQt6 GUI with stats panel, tree visualization, and smart file detection
 
 import sys
 import os
+import asyncio
+import json
+import signal
 import time
+import threading
 import subprocess
+from collections import Counter
 from pathlib import Path
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -15,92 +20,273 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QFont
 
+from .engine import load_engine, has_preamble, HuffmanError, JobControl, FORMAT_PREAMBLE_SIZE
+from .client import connect as connect_daemon
 from .widgets import DropZone, StatsPanel
 from .tree_visualizer import HuffmanTreeWindow
 from .styles import MAIN_STYLESHEET
 
+try:
+    import numpy as np
+except ImportError:  # optional; only speeds up the histogram fallback
+    np = None
+
+# Read size for the fallback histogram; keeps memory flat however large the file
+HISTOGRAM_CHUNK_SIZE = 1 << 20
+
+# Seconds between progress updates while a job runs
+PROGRESS_INTERVAL = 0.2
+
+CANCELED_MESSAGE = "Canceled"
+
+# Socket of a running `huffman serve` daemon; jobs go there first when it is set
+DAEMON_SOCKET_ENV = "HUFFMAN_SOCKET"
+
 
 class CompressionWorker(QThread):
     """Worker thread for compression/decompression operations"""
     finished = pyqtSignal(bool, str, dict)  # success, message, stats
+    progress = pyqtSignal(object, object, float, float)  # done bytes, total bytes, MB/s, ETA seconds (-1 = unknown)
     
-    def __init__(self, operation, input_file, output_file, exe_path):
+    def __init__(self, operation, input_file, output_file, exe_path, engine=None,
+                 threads=1, block_size=0, dictionary=None, socket_path=None):
         super().__init__()
         self.operation = operation
         self.input_file = input_file
         self.output_file = output_file
         self.exe_path = exe_path
+        self.engine = engine
+        self.socket_path = socket_path
+        # Block mode: threads=0 means one per CPU, block_size=0 the engine default
+        self.threads = threads
+        self.block_size = block_size
+        # Path of a trained dictionary file, or None
+        self.dictionary = dictionary
+        # --stats=json fields reported by the engine for the last run, if any
+        self.engine_stats = None
+        # Progress counter and cancel flag shared with the engine
+        self.control = JobControl()
+        self._process = None
+        self._canceled = False
+        self._start_time = 0.0
+        self._total = 0
+    
+    def cancel(self):
+        """Stop the running job; the engine removes the partial output"""
+        self._canceled = True
+        self.control.cancel()
+        process = self._process
+        if process is not None and process.poll() is None:
+            if sys.platform == "win32":
+                process.terminate()
+            else:
+                process.send_signal(signal.SIGINT)
     
     def run(self):
         try:
             # Get original file size
             original_size = os.path.getsize(self.input_file)
+            self._total = original_size
             
             # Record start time
             start_time = time.time()
+            self._start_time = start_time
             
-            result = subprocess.run(
-                [self.exe_path, self.operation, self.input_file, self.output_file],
-                capture_output=True,
-                text=True
-            )
+            if self.socket_path is not None:
+                error = self._run_on_daemon()
+            elif self.engine is not None:
+                error = self._run_in_process()
+            else:
+                error = self._run_subprocess()
             
             # Record end time
             elapsed_time = time.time() - start_time
             
-            if result.returncode == 0:
+            if self._canceled:
+                # A killed subprocess could not clean up after itself; the daemon may be removing it already
+                if error is not None:
+                    try:
+                        os.remove(self.output_file)
+                    except FileNotFoundError:
+                        pass
+                self.finished.emit(False, CANCELED_MESSAGE, {'canceled': True})
+            elif error is None:
                 # Get result file size
                 result_size = os.path.getsize(self.output_file) if os.path.exists(self.output_file) else 0
                 
-                # Read frequency data for tree visualization (only for compression)
+                # Frequency data for tree visualization (only for compression)
                 frequency_data = {}
                 if self.operation == "compress":
-                    frequency_data = self._read_frequency_data(self.input_file)
+                    if self.engine_stats is not None:
+                        histogram = self.engine_stats['histogram']
+                    else:
+                        histogram = self._read_histogram(self.input_file)
+                    frequency_data = self._frequency_data(histogram)
                 
                 stats = {
                     'original_size': original_size,
                     'result_size': result_size,
                     'time': elapsed_time,
                     'frequency_data': frequency_data,
+                    'engine_stats': self.engine_stats,
                     'is_compression': self.operation == "compress"
                 }
                 
                 action = 'compressed' if self.operation == 'compress' else 'decompressed'
                 self.finished.emit(True, f"Successfully {action}!", stats)
             else:
-                self.finished.emit(False, result.stderr or "Operation failed", {})
+                self.finished.emit(False, error, {})
         except Exception as e:
             self.finished.emit(False, str(e), {})
     
-    def _read_frequency_data(self, input_file):
-        """Read file and calculate character frequencies"""
-        frequency_data = {}
+    def _report_progress(self, done):
+        """Emit progress with the average rate so far and the time left at that rate"""
+        elapsed = time.time() - self._start_time
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self._total - done) / rate if rate > 0 and self._total else -1.0
+        self.progress.emit(done, self._total, rate / 1e6, eta)
+    
+    def _run_in_process(self):
+        """Run the operation through the shared library; returns an error message or None"""
+        outcome = {}
+        
+        def call():
+            try:
+                if self.operation == "compress":
+                    stats = self.engine.compress_file(self.input_file, self.output_file,
+                                                      threads=self.threads, block_size=self.block_size,
+                                                      control=self.control, dictionary=self.dictionary)
+                else:
+                    stats = self.engine.decompress_file(self.input_file, self.output_file,
+                                                        threads=self.threads, control=self.control,
+                                                        dictionary=self.dictionary)
+                outcome['stats'] = stats.as_dict()
+            except Exception as e:
+                outcome['error'] = str(e) or "Operation failed"
+        
+        # ctypes releases the GIL, so this thread is free to poll the counter while the engine runs
+        engine_thread = threading.Thread(target=call, daemon=True)
+        engine_thread.start()
+        while engine_thread.is_alive():
+            engine_thread.join(PROGRESS_INTERVAL)
+            self._report_progress(self.control.progress)
+        
+        if 'error' in outcome:
+            return outcome['error']
+        self.engine_stats = outcome['stats']
+        return None
+    
+    def _run_on_daemon(self):
+        """Run the operation on the engine daemon; returns an error message or None"""
+        async def job():
+            async with await connect_daemon(self.socket_path) as client:
+                if self.operation == "compress":
+                    return await client.compress_file(self.input_file, self.output_file,
+                                                      threads=self.threads, block_size=self.block_size)
+                return await client.decompress_file(self.input_file, self.output_file, threads=self.threads)
+        
+        async def watch():
+            task = asyncio.ensure_future(job())
+            while not self._canceled:
+                done, _ = await asyncio.wait({task}, timeout=PROGRESS_INTERVAL)
+                if done:
+                    return task.result()
+            # Leaving the connection closes it, and the daemon cancels a job whose client hangs up
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            return None
+        
+        try:
+            self.engine_stats = asyncio.run(watch())
+        except Exception as e:
+            return str(e) or "Operation failed"
+        if self._canceled:
+            # A job that finished before the cancel is discarded too
+            return CANCELED_MESSAGE
+        return None
+    
+    def _run_subprocess(self):
+        """Run the operation through the huffman executable; returns an error message or None"""
+        command = [self.exe_path, "--threads", str(self.threads), "--stats=json", "--progress"]
+        if self.operation == "compress" and self.block_size:
+            command += ["--block-size", str(self.block_size)]
+        if self.dictionary:
+            command += ["--dict", self.dictionary]
+        command += [self.operation, self.input_file, self.output_file]
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if self._canceled:
+            self.cancel()
+        
+        # stderr carries "progress <done> <total>" lines mixed with any error messages
+        errors = []
+        for line in self._process.stderr:
+            fields = line.split()
+            if len(fields) == 3 and fields[0] == "progress":
+                self._report_progress(int(fields[1]))
+            else:
+                errors.append(line)
+        output = self._process.stdout.read()
+        returncode = self._process.wait()
+        self._process = None
+        
+        if returncode != 0:
+            return "".join(errors) or "Operation failed"
+        try:
+            self.engine_stats = json.loads(output.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            # No stats line in the output; the breakdown just stays unavailable
+            self.engine_stats = None
+        return None
+    
+    def _read_histogram(self, input_file):
+        """Count bytes in fixed-size chunks; only used when the engine did not report a histogram"""
+        histogram = [0] * 256
         try:
             with open(input_file, 'rb') as f:
-                content = f.read()
-                for byte in content:
-                    char = chr(byte) if byte < 128 else f"0x{byte:02x}"
-                    frequency_data[char] = frequency_data.get(char, 0) + 1
+                chunks = iter(lambda: f.read(HISTOGRAM_CHUNK_SIZE), b"")
+                if np is not None:
+                    counts = np.zeros(256, dtype=np.int64)
+                    for chunk in chunks:
+                        counts += np.bincount(np.frombuffer(chunk, dtype=np.uint8), minlength=256)
+                    histogram = counts.tolist()
+                else:
+                    counts = Counter()
+                    for chunk in chunks:
+                        counts.update(chunk)
+                    for byte, count in counts.items():
+                        histogram[byte] = count
         except Exception:
             pass
-        return frequency_data
+        return histogram
+    
+    def _frequency_data(self, histogram):
+        """Label byte counts for the tree view: ASCII as characters, the rest as hex"""
+        return {
+            chr(byte) if byte < 128 else f"0x{byte:02x}": count
+            for byte, count in enumerate(histogram) if count
+        }
 
 
 class HuffmanCompressor(QMainWindow):
     """Main application window"""
     
-    # File extensions that should trigger compress action
-    COMPRESSIBLE_EXTENSIONS = {'.txt', '.md', '.json', '.xml', '.html', '.css', '.js', 
-                               '.py', '.c', '.h', '.cpp', '.java', '.csv', '.log', '.ini'}
-    # File extensions that should trigger decompress action
+    # Extensions of legacy compressed files, which predate the magic number
     COMPRESSED_EXTENSIONS = {'.bin', '.huff', '.compressed'}
+    # Inputs at least this large are coded in parallel blocks on every core
+    BLOCK_MODE_THRESHOLD = 8 * 1024 * 1024
     
     def __init__(self):
         super().__init__()
         self.selected_file = None
         self.last_frequency_data = None
+        self.dictionary_file = None
         self.tree_window = None
         self.exe_path = self._find_executable()
+        self.engine = load_engine()
+        self.socket_path = self._find_daemon()
         self._setup_window()
         self._setup_ui()
         self._apply_styles()
@@ -120,6 +306,13 @@ class HuffmanCompressor(QMainWindow):
                 return str(path)
         return str(base_dir / "huffman.exe")
     
+    def _find_daemon(self):
+        """Socket of a running daemon named by $HUFFMAN_SOCKET, if there is one"""
+        socket_path = os.environ.get(DAEMON_SOCKET_ENV)
+        if socket_path and Path(socket_path).is_socket():
+            return socket_path
+        return None
+    
     def _setup_window(self):
         """Configure main window properties"""
         self.setWindowTitle("Huffman Compressor")
@@ -252,6 +445,15 @@ class HuffmanCompressor(QMainWindow):
         self.view_tree_btn.setVisible(False)
         buttons_layout.addWidget(self.view_tree_btn)
         
+        self.dict_btn = QPushButton("Dictionary")
+        self.dict_btn.setObjectName("dictBtn")
+        self.dict_btn.setFixedSize(110, 48)
+        self.dict_btn.setCheckable(True)
+        self.dict_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.dict_btn.setToolTip("Compress and decompress with a dictionary trained by 'huffman train'")
+        self.dict_btn.clicked.connect(self._toggle_dictionary)
+        buttons_layout.addWidget(self.dict_btn)
+        
         main_layout.addLayout(buttons_layout)
         main_layout.addSpacing(15)
         
@@ -268,6 +470,24 @@ class HuffmanCompressor(QMainWindow):
         self.progress_bar.setTextVisible(False)
         self.progress_bar.setFixedHeight(4)
         main_layout.addWidget(self.progress_bar)
+        
+        # Live progress: percentage, throughput and time left, with a way out
+        progress_layout = QHBoxLayout()
+        progress_layout.setContentsMargins(0, 8, 0, 0)
+        self.progress_label = QLabel("")
+        self.progress_label.setObjectName("subtitleLabel")
+        self.progress_label.setVisible(False)
+        progress_layout.addWidget(self.progress_label)
+        progress_layout.addStretch()
+        
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setObjectName("cancelBtn")
+        self.cancel_btn.setFixedSize(90, 28)
+        self.cancel_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.cancel_btn.clicked.connect(self._cancel_operation)
+        self.cancel_btn.setVisible(False)
+        progress_layout.addWidget(self.cancel_btn)
+        main_layout.addLayout(progress_layout)
     
     def _apply_styles(self):
         """Apply the stylesheet"""
@@ -278,24 +498,17 @@ class HuffmanCompressor(QMainWindow):
         if not file_path:
             return None
         
-        ext = Path(file_path).suffix.lower()
+        # Compressed files announce themselves in their 8-byte preamble
+        try:
+            with open(file_path, 'rb') as f:
+                if has_preamble(f.read(FORMAT_PREAMBLE_SIZE)):
+                    return "decompress"
+        except OSError:
+            pass
         
-        if ext in self.COMPRESSED_EXTENSIONS:
+        if Path(file_path).suffix.lower() in self.COMPRESSED_EXTENSIONS:
             return "decompress"
-        elif ext in self.COMPRESSIBLE_EXTENSIONS:
-            return "compress"
-        else:
-            # For unknown extensions, check if it's likely binary
-            try:
-                with open(file_path, 'rb') as f:
-                    chunk = f.read(1024)
-                    # If file contains many non-printable chars, treat as binary/compressed
-                    non_printable = sum(1 for b in chunk if b < 32 and b not in (9, 10, 13))
-                    if len(chunk) > 0 and non_printable / len(chunk) > 0.3:
-                        return "decompress"
-            except:
-                pass
-            return "compress"  # Default to compress
+        return "compress"
     
     def _update_button_states(self):
         """Update button visibility based on selected file"""
@@ -320,6 +533,9 @@ class HuffmanCompressor(QMainWindow):
             self.decompress_btn.setVisible(True)
             self.decompress_btn.setEnabled(False)
             self.file_type_label.setVisible(False)
+        if file_type and self.dictionary_file:
+            self.file_type_label.setText(
+                f"{self.file_type_label.text()} · dictionary {Path(self.dictionary_file).name}")
     
     def _browse_file(self):
         """Open file dialog to select a file"""
@@ -332,6 +548,29 @@ class HuffmanCompressor(QMainWindow):
         if file_path:
             self._on_file_dropped(file_path)
     
+    def _toggle_dictionary(self):
+        """Pick a dictionary file for the next jobs, or stop using the current one"""
+        dictionary_file = None
+        if self.dictionary_file is None:
+            dictionary_file, _ = QFileDialog.getOpenFileName(
+                self,
+                "Select Dictionary",
+                "",
+                "Huffman Dictionaries (*.hufd);;All Files (*)"
+            )
+        if dictionary_file and self.engine is not None:
+            # Loaded once here; jobs reuse the engine's cached tables
+            try:
+                self.engine.load_dictionary(dictionary_file)
+            except (OSError, HuffmanError) as e:
+                self._show_message("Error", f"Cannot load dictionary: {e}", QMessageBox.Icon.Critical)
+                dictionary_file = None
+        self.dictionary_file = dictionary_file or None
+        self.dict_btn.setChecked(self.dictionary_file is not None)
+        self.dict_btn.setToolTip(self.dictionary_file or
+                                 "Compress and decompress with a dictionary trained by 'huffman train'")
+        self._update_button_states()
+    
     def _on_file_dropped(self, file_path):
         """Handle file selection"""
         self.selected_file = file_path
@@ -373,16 +612,53 @@ class HuffmanCompressor(QMainWindow):
         self.compress_btn.setEnabled(False)
         self.decompress_btn.setEnabled(False)
         self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)  # Indeterminate
+        self.progress_bar.setRange(0, 0)  # Indeterminate until the first progress report
+        self.progress_label.setText("Starting…")
+        self.progress_label.setVisible(True)
+        self.cancel_btn.setText("Cancel")
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.setVisible(True)
         
-        self.worker = CompressionWorker(operation, input_file, output_file, self.exe_path)
+        threads = 1
+        if os.path.getsize(input_file) >= self.BLOCK_MODE_THRESHOLD:
+            threads = 0
+        self.worker = CompressionWorker(operation, input_file, output_file, self.exe_path, self.engine,
+                                        threads=threads, dictionary=self.dictionary_file,
+                                        # The daemon only knows the dictionary it was started with
+                                        socket_path=None if self.dictionary_file else self.socket_path)
         self.worker.finished.connect(self._on_operation_finished)
+        self.worker.progress.connect(self._on_progress)
         self.worker.start()
     
+    def _on_progress(self, done, total, rate, eta):
+        """Show how far the running job has got"""
+        parts = []
+        if total:
+            fraction = min(done / total, 1.0)
+            self.progress_bar.setRange(0, 1000)
+            self.progress_bar.setValue(int(fraction * 1000))
+            parts.append(f"{fraction * 100:.0f}%")
+        else:
+            parts.append(self.stats_panel.format_size(done))
+        parts.append(f"{rate:.1f} MB/s")
+        if eta >= 0:
+            minutes, seconds = divmod(int(eta + 0.5), 60)
+            parts.append(f"ETA {minutes}:{seconds:02d}")
+        self.progress_label.setText(" · ".join(parts))
+    
+    def _cancel_operation(self):
+        """Ask the running job to stop"""
+        if self.worker is not None and self.worker.isRunning():
+            self.cancel_btn.setEnabled(False)
+            self.cancel_btn.setText("Canceling…")
+            self.worker.cancel()
+    
     def _on_operation_finished(self, success, message, stats):
         """Handle operation completion"""
         self._update_button_states()
         self.progress_bar.setVisible(False)
+        self.progress_label.setVisible(False)
+        self.cancel_btn.setVisible(False)
         
         if success and stats:
             # Update stats panel
@@ -390,7 +666,8 @@ class HuffmanCompressor(QMainWindow):
                 stats['original_size'],
                 stats['result_size'],
                 stats['time'],
-                stats['is_compression']
+                stats['is_compression'],
+                stats.get('engine_stats')
             )
             
             # Store frequency data for tree visualization
@@ -398,7 +675,7 @@ class HuffmanCompressor(QMainWindow):
                 self.last_frequency_data = stats['frequency_data']
                 self.view_tree_btn.setVisible(True)
         
-        if not success:
+        if not success and not stats.get('canceled'):
             self._show_message("Error", message, QMessageBox.Icon.Critical)
     
     def _show_tree(self):
@@ -117,6 +117,29 @@ MAIN_STYLESHEET = """
         color: #6b7280;
     }
     
+    #cancelBtn {
+        background-color: #ef4444;
+        color: #ffffff;
+        border: none;
+        border-radius: 6px;
+        font-size: 13px;
+        font-weight: 600;
+        font-family: 'Segoe UI', Arial, sans-serif;
+    }
+    
+    #cancelBtn:hover {
+        background-color: #dc2626;
+    }
+    
+    #cancelBtn:pressed {
+        background-color: #b91c1c;
+    }
+    
+    #cancelBtn:disabled {
+        background-color: #374151;
+        color: #6b7280;
+    }
+    
     #viewTreeBtn {
         background-color: #8b5cf6;
         color: #ffffff;
@@ -135,6 +158,26 @@ MAIN_STYLESHEET = """
         background-color: #6d28d9;
     }
     
+    #dictBtn {
+        background-color: #374151;
+        color: #e5e7eb;
+        border: 1px solid #4b5563;
+        border-radius: 8px;
+        font-size: 14px;
+        font-weight: 600;
+        font-family: 'Segoe UI', Arial, sans-serif;
+    }
+    
+    #dictBtn:hover {
+        background-color: #4b5563;
+    }
+    
+    #dictBtn:checked {
+        background-color: #0d9488;
+        border-color: #14b8a6;
+        color: #ffffff;
+    }
+    
     #progressBar {
         background-color: #374151;
         border: none;
@@ -0,0 +1,147 @@
+"""
+Huffman tree model for the tree viewer
+Builds the same code the C engine does and stores the nodes in flat arrays
+"""
+
+from array import array
+
+# Mirrors the weight scaling in buildCodeLengths (src/canonical.c)
+INT_MAX = 2 ** 31 - 1
+
+
+class HuffmanTree:
+    """Flat node store: node i is described by index i of each array
+
+    left/right hold child indices (-1 for leaves), labels the leaf's display
+    label (None for internal nodes) and freqs the byte counts below the node.
+    Leaves come first, in the byte order they were given in, and every node
+    comes after its children, so the root is always the last node.
+    """
+
+    __slots__ = ("labels", "freqs", "left", "right", "root")
+
+    def __init__(self):
+        self.labels = []
+        self.freqs = array("Q")
+        self.left = array("l")
+        self.right = array("l")
+        self.root = -1
+
+    def __len__(self):
+        return len(self.freqs)
+
+    def is_leaf(self, node):
+        return self.left[node] < 0
+
+    def _add(self, label, freq, left=-1, right=-1):
+        self.labels.append(label)
+        self.freqs.append(freq)
+        self.left.append(left)
+        self.right.append(right)
+        return len(self.freqs) - 1
+
+    @classmethod
+    def from_frequencies(cls, frequency_data):
+        """Tree of the canonical code the engine writes for `frequency_data`
+
+        `frequency_data` maps labels to counts in byte order, as the GUI's
+        histogram does; the order matters because the engine breaks ties by
+        heap position.  Code lengths come from a port of the engine's heap,
+        and codes are then assigned canonically, so every edge label in the
+        tree is the bit the compressed file really uses.  (Trees deeper than
+        24 levels are length-limited by the engine; those are shown unlimited.)
+        """
+        tree = cls()
+        for label, freq in frequency_data.items():
+            if freq > 0:
+                tree._add(label, freq)
+        count = len(tree)
+        if count == 0:
+            return None
+        if count == 1:
+            tree.root = 0
+            return tree
+
+        lengths = _code_lengths(tree.freqs)
+
+        # Canonical codes put a level's leaves (in byte order) left of its internal nodes,
+        # so the tree can be assembled bottom-up one level at a time
+        by_length = {}
+        for leaf in range(count):
+            by_length.setdefault(lengths[leaf], []).append(leaf)
+        level = []
+        for depth in range(max(lengths), 0, -1):
+            pairs = [tree._add(None, tree.freqs[a] + tree.freqs[b], a, b)
+                     for a, b in zip(level[::2], level[1::2])]
+            level = by_length.get(depth, []) + pairs
+        tree.root = tree._add(None, tree.freqs[level[0]] + tree.freqs[level[1]], level[0], level[1])
+        return tree
+
+
+def _code_lengths(freqs):
+    """Leaf depths of the engine's Huffman tree (buildHuffmanTree in src/minheap.c)
+
+    The heap is the engine's array heap, not heapq: node order on equal
+    weights decides which of several equally good trees comes out.
+    """
+    count = len(freqs)
+    total = sum(freqs)
+    shift = 0
+    while (total >> shift) > INT_MAX - 256:
+        shift += 1
+    weight = [max(f >> shift, 1) for f in freqs]
+    left = [-1] * count
+    right = [-1] * count
+
+    heap = list(range(count))
+
+    def sift_down(i):
+        size = len(heap)
+        while True:
+            smallest = i
+            l, r = 2 * i + 1, 2 * i + 2
+            if l < size and weight[heap[l]] < weight[heap[smallest]]:
+                smallest = l
+            if r < size and weight[heap[r]] < weight[heap[smallest]]:
+                smallest = r
+            if smallest == i:
+                return
+            heap[i], heap[smallest] = heap[smallest], heap[i]
+            i = smallest
+
+    def extract_min():
+        top = heap[0]
+        last = heap.pop()
+        if heap:
+            heap[0] = last
+            sift_down(0)
+        return top
+
+    for i in range((count - 1) // 2, -1, -1):
+        sift_down(i)
+
+    while len(heap) > 1:
+        a = extract_min()
+        b = extract_min()
+        node = len(weight)
+        weight.append(weight[a] + weight[b])
+        left.append(a)
+        right.append(b)
+        # Sift up with the engine's strict comparison
+        heap.append(node)
+        i = len(heap) - 1
+        while i and weight[node] < weight[heap[(i - 1) // 2]]:
+            heap[i] = heap[(i - 1) // 2]
+            i = (i - 1) // 2
+        heap[i] = node
+
+    lengths = [0] * count
+    stack = [(heap[0], 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node < count:
+            lengths[node] = depth
+        else:
+            stack.append((left[node], depth + 1))
+            stack.append((right[node], depth + 1))
+    return lengths
@@ -3,29 +3,17 @@ Huffman Tree Visualization Widget
 Renders the Huffman tree structure using QPainter with zoom support
 """
 
-import math
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QScrollArea, QFrame
 )
-from PyQt6.QtCore import Qt, QRectF, QPointF
-from PyQt6.QtGui import QPainter, QPen, QBrush, QColor, QFont, QPainterPath, QWheelEvent, QTransform
+from PyQt6.QtCore import Qt, QRectF
+from PyQt6.QtGui import (
+    QPainter, QPen, QBrush, QColor, QFont, QPicture, QWheelEvent
+)
 
 from .styles import TREE_WINDOW_STYLESHEET
-
-
-class TreeNode:
-    """Represents a node in the Huffman tree"""
-    def __init__(self, char=None, freq=0, left=None, right=None):
-        self.char = char
-        self.freq = freq
-        self.left = left
-        self.right = right
-        self.x = 0
-        self.y = 0
-    
-    def is_leaf(self):
-        return self.left is None and self.right is None
+from .tree_model import HuffmanTree
 
 
 class TreeCanvas(QWidget):
@@ -34,10 +22,21 @@ class TreeCanvas(QWidget):
     NODE_RADIUS = 25
     LEVEL_HEIGHT = 80
     MIN_NODE_SPACING = 60
+    # Side of a cached tile, in tree coordinates
+    TILE_SIZE = 512
+    # Below this zoom labels are too small to read, so tiles leave them out
+    LABEL_ZOOM = 0.5
     
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.tree = None
         self.root = None
+        # Node positions, indexed like the tree's arrays
+        self.node_x = []
+        self.node_y = []
+        # Layout extent in tree coordinates, computed once per tree
+        self.tree_width = 0
+        self.tree_height = 0
         self.zoom_level = 1.0
         self.min_zoom = 0.3
         self.max_zoom = 3.0
@@ -46,6 +45,8 @@ class TreeCanvas(QWidget):
         self.pan_y = 0
         self._last_mouse_pos = None
         self._is_panning = False
+        self._create_resources()
+        self._invalidate_tiles()
         self.setMinimumSize(800, 600)
         self.setStyleSheet("background-color: #1e1e36;")
         self.setCursor(Qt.CursorShape.OpenHandCursor)
@@ -53,15 +54,17 @@ class TreeCanvas(QWidget):
     def set_zoom(self, zoom):
         """Set zoom level"""
         self.zoom_level = max(self.min_zoom, min(self.max_zoom, zoom))
-        if self.root:
-            tree_width = self._calculate_tree_width(self.root)
-            tree_height = self._get_tree_height(self.root) * self.LEVEL_HEIGHT + 100
-            self.setMinimumSize(
-                int(max(800, tree_width + 100) * self.zoom_level),
-                int(max(600, tree_height) * self.zoom_level)
-            )
+        if self.root is not None:
+            self._update_size()
         self.update()
     
+    def _update_size(self):
+        """Size the canvas to the cached layout at the current zoom"""
+        self.setMinimumSize(
+            int(max(800, self.tree_width + 100) * self.zoom_level),
+            int(max(600, self.tree_height * self.LEVEL_HEIGHT + 100) * self.zoom_level)
+        )
+    
     def wheelEvent(self, event: QWheelEvent):
         """Handle mouse wheel for zooming"""
         delta = event.angleDelta().y()
@@ -108,8 +111,8 @@ class TreeCanvas(QWidget):
         if self.root is None:
             return
         
-        tree_width = self._calculate_tree_width(self.root) + 100  # Add margins
-        tree_height = self._get_tree_height(self.root) * self.LEVEL_HEIGHT + 120  # Add margins
+        tree_width = self.tree_width + 100  # Add margins
+        tree_height = self.tree_height * self.LEVEL_HEIGHT + 120  # Add margins
         
         # Calculate zoom to fit
         zoom_x = viewport_width / tree_width if tree_width > 0 else 1.0
@@ -133,75 +136,121 @@ class TreeCanvas(QWidget):
     def set_tree(self, frequency_data):
         """Build and set the Huffman tree from frequency data"""
         if not frequency_data:
+            self.tree = None
             self.root = None
             self.update()
             return
         
         # Build Huffman tree from frequency data
-        self.root = self._build_tree(frequency_data)
+        self.tree = HuffmanTree.from_frequencies(frequency_data)
+        self._invalidate_tiles()
+        self.root = self.tree.root if self.tree else None
         
         # Calculate node positions
-        if self.root:
-            tree_width = self._calculate_tree_width(self.root)
-            self._calculate_positions(self.root, 0, tree_width, 0)
-            self.setMinimumSize(
-                int(max(800, tree_width + 100) * self.zoom_level),
-                int(max(600, self._get_tree_height(self.root) * self.LEVEL_HEIGHT + 100) * self.zoom_level)
-            )
+        if self.root is not None:
+            self._layout()
+            self._update_size()
         
         self.update()
     
-    def _build_tree(self, frequency_data):
-        """Build Huffman tree using priority queue approach"""
-        nodes = [TreeNode(char=char, freq=freq) for char, freq in frequency_data.items() if freq > 0]
-        
-        if not nodes:
-            return None
-        
-        if len(nodes) == 1:
-            return nodes[0]
-        
-        while len(nodes) > 1:
-            nodes.sort(key=lambda x: x.freq)
-            left = nodes.pop(0)
-            right = nodes.pop(0)
-            parent = TreeNode(freq=left.freq + right.freq, left=left, right=right)
-            nodes.append(parent)
-        
-        return nodes[0]
+    def _layout(self):
+        """Width, depth and position of every node, without recursion
+
+        Each node gets a horizontal span as wide as its leaves need and sits
+        at its middle.  The store keeps children before their parents, so
+        one forward pass sums the widths and one backward pass hands each
+        child its part of the parent's span.
+        """
+        tree = self.tree
+        count = len(tree)
+        left, right = tree.left, tree.right
+        
+        width = [0.0] * count
+        for node in range(count):
+            if left[node] < 0:
+                width[node] = self.MIN_NODE_SPACING
+            else:
+                width[node] = width[left[node]] + width[right[node]]
+        
+        start = [0.0] * count
+        level = [0] * count
+        self.node_x = [0.0] * count
+        self.node_y = [0.0] * count
+        for node in range(count - 1, -1, -1):
+            self.node_x[node] = start[node] + width[node] / 2
+            self.node_y[node] = level[node] * self.LEVEL_HEIGHT + 60
+            if left[node] >= 0:
+                start[left[node]] = start[node]
+                start[right[node]] = start[node] + width[left[node]]
+                level[left[node]] = level[right[node]] = level[node] + 1
+        
+        self.tree_width = width[tree.root]
+        self.tree_height = max(level) + 1
     
-    def _calculate_tree_width(self, node):
-        """Calculate total width needed for the tree"""
-        if node is None:
-            return 0
-        if node.is_leaf():
-            return self.MIN_NODE_SPACING
-        return self._calculate_tree_width(node.left) + self._calculate_tree_width(node.right)
+    def _create_resources(self):
+        """Pens, brushes and fonts shared by every paint"""
+        self._edge_pen = QPen(QColor("#4a4a6a"), 2)
+        self._bit_pen = QPen(QColor("#8b5cf6"))
+        self._leaf_brush = QBrush(QColor("#22c55e"))
+        self._leaf_pen = QPen(QColor("#16a34a"), 2)
+        self._internal_brush = QBrush(QColor("#8b5cf6"))
+        self._internal_pen = QPen(QColor("#7c3aed"), 2)
+        self._text_pen = QPen(QColor("#ffffff"))
+        self._empty_pen = QPen(QColor("#6b7280"))
+        self._label_font = QFont("Segoe UI", 10, QFont.Weight.Bold)
+        self._freq_font = QFont("Segoe UI", 8)
+        self._empty_font = QFont("Segoe UI", 14)
     
-    def _get_tree_height(self, node):
-        """Get the height of the tree"""
-        if node is None:
-            return 0
-        return 1 + max(self._get_tree_height(node.left), self._get_tree_height(node.right))
+    def _invalidate_tiles(self):
+        """Forget the tile index and recorded tiles after the layout changed"""
+        self._tile_items = None
+        self._tile_pictures = {}
     
-    def _calculate_positions(self, node, x_start, x_end, level):
-        """Calculate x, y positions for each node"""
-        if node is None:
-            return
-        
-        node.x = (x_start + x_end) / 2
-        node.y = level * self.LEVEL_HEIGHT + 60
-        
-        if node.left:
-            mid = (x_start + x_end) / 2
-            self._calculate_positions(node.left, x_start, mid, level + 1)
-        
-        if node.right:
-            mid = (x_start + x_end) / 2
-            self._calculate_positions(node.right, mid, x_end, level + 1)
+    def _zoom_bucket(self):
+        """Tiles are recorded once per bucket: without labels when zoomed out, with them otherwise"""
+        return 1 if self.zoom_level >= self.LABEL_ZOOM else 0
+    
+    def _index_tiles(self):
+        """Map each tile to the edges and nodes that overlap it"""
+        tiles = {}
+        size = self.TILE_SIZE
+        r = self.NODE_RADIUS
+        tree = self.tree
+        
+        def add(kind, item, left, top, right, bottom):
+            for tx in range(int(left // size), int(right // size) + 1):
+                for ty in range(int(top // size), int(bottom // size) + 1):
+                    tiles.setdefault((tx, ty), ([], []))[kind].append(item)
+        
+        for node in range(len(tree)):
+            x, y = self.node_x[node], self.node_y[node]
+            for child in (tree.left[node], tree.right[node]):
+                if child >= 0:
+                    cx, cy = self.node_x[child], self.node_y[child]
+                    # Pad by the bit label drawn beside the edge
+                    add(0, (node, child), min(x, cx) - 25, y, max(x, cx) + 25, cy)
+            add(1, node, x - r - 2, y - r - 2, x + r + 2, y + r + 2)
+        self._tile_items = tiles
+    
+    def _tile_picture(self, tile, bucket):
+        """Recorded drawing of one tile, made on first use"""
+        key = (tile, bucket)
+        picture = self._tile_pictures.get(key)
+        if picture is None:
+            edges, nodes = self._tile_items[tile]
+            picture = QPicture()
+            painter = QPainter(picture)
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            for parent, child in edges:
+                self._draw_edge(painter, parent, child, bucket)
+            for node in nodes:
+                self._draw_single_node(painter, node, bucket)
+            painter.end()
+            self._tile_pictures[key] = picture
+        return picture
     
     def paintEvent(self, event):
-        """Draw the tree"""
+        """Draw the tiles that intersect the exposed area"""
         painter = QPainter(self)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         
@@ -210,77 +259,89 @@ class TreeCanvas(QWidget):
         painter.translate(self.pan_x, self.pan_y)
         
         if self.root is None:
-            painter.setPen(QColor("#6b7280"))
-            painter.setFont(QFont("Segoe UI", 14))
+            painter.setPen(self._empty_pen)
+            painter.setFont(self._empty_font)
             rect = QRectF(0, 0, self.width() / self.zoom_level, self.height() / self.zoom_level)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, 
                            "No tree data available\nCompress a file to see the tree")
             return
         
-        self._draw_node(painter, self.root)
+        if self._tile_items is None:
+            self._index_tiles()
+        
+        # Exposed rect in tree coordinates
+        exposed = QRectF(event.rect())
+        left = exposed.left() / self.zoom_level - self.pan_x
+        top = exposed.top() / self.zoom_level - self.pan_y
+        right = exposed.right() / self.zoom_level - self.pan_x
+        bottom = exposed.bottom() / self.zoom_level - self.pan_y
+        
+        size = self.TILE_SIZE
+        bucket = self._zoom_bucket()
+        for tx in range(int(left // size), int(right // size) + 1):
+            for ty in range(int(top // size), int(bottom // size) + 1):
+                tile = (tx, ty)
+                if tile not in self._tile_items:
+                    continue
+                # Items spill over tile edges; clip so neighbours are not drawn twice
+                painter.setClipRect(QRectF(tx * size, ty * size, size, size))
+                painter.drawPicture(0, 0, self._tile_picture(tile, bucket))
     
-    def _draw_node(self, painter, node):
-        """Recursively draw nodes and edges"""
-        if node is None:
-            return
-        
-        if node.left:
-            self._draw_edge(painter, node, node.left, "0")
-            self._draw_node(painter, node.left)
-        
-        if node.right:
-            self._draw_edge(painter, node, node.right, "1")
-            self._draw_node(painter, node.right)
-        
-        self._draw_single_node(painter, node)
-    
-    def _draw_edge(self, painter, parent, child, label):
+    def _draw_edge(self, painter, parent, child, bucket):
         """Draw an edge between parent and child nodes"""
-        pen = QPen(QColor("#4a4a6a"), 2)
-        painter.setPen(pen)
-        painter.drawLine(int(parent.x), int(parent.y + self.NODE_RADIUS),
-                        int(child.x), int(child.y - self.NODE_RADIUS))
+        painter.setPen(self._edge_pen)
+        parent_x, parent_y = self.node_x[parent], self.node_y[parent]
+        child_x, child_y = self.node_x[child], self.node_y[child]
+        painter.drawLine(int(parent_x), int(parent_y + self.NODE_RADIUS),
+                        int(child_x), int(child_y - self.NODE_RADIUS))
+        if not bucket:
+            return
         
-        mid_x = (parent.x + child.x) / 2
-        mid_y = (parent.y + child.y) / 2
+        mid_x = (parent_x + child_x) / 2
+        mid_y = (parent_y + child_y) / 2
         
-        painter.setFont(QFont("Segoe UI", 10, QFont.Weight.Bold))
-        painter.setPen(QColor("#8b5cf6"))
+        painter.setFont(self._label_font)
+        painter.setPen(self._bit_pen)
         
+        label = "0" if child == self.tree.left[parent] else "1"
         offset = -15 if label == "0" else 15
         painter.drawText(int(mid_x + offset - 5), int(mid_y), label)
     
-    def _draw_single_node(self, painter, node):
+    def _draw_single_node(self, painter, node, bucket):
         """Draw a single node"""
-        x, y = int(node.x), int(node.y)
+        x, y = int(self.node_x[node]), int(self.node_y[node])
         r = self.NODE_RADIUS
+        is_leaf = self.tree.is_leaf(node)
         
-        if node.is_leaf():
-            painter.setBrush(QBrush(QColor("#22c55e")))
-            painter.setPen(QPen(QColor("#16a34a"), 2))
+        if is_leaf:
+            painter.setBrush(self._leaf_brush)
+            painter.setPen(self._leaf_pen)
         else:
-            painter.setBrush(QBrush(QColor("#8b5cf6")))
-            painter.setPen(QPen(QColor("#7c3aed"), 2))
+            painter.setBrush(self._internal_brush)
+            painter.setPen(self._internal_pen)
         
         painter.drawEllipse(x - r, y - r, r * 2, r * 2)
+        if not bucket:
+            return
         
-        painter.setPen(QColor("#ffffff"))
-        painter.setFont(QFont("Segoe UI", 10, QFont.Weight.Bold))
+        painter.setPen(self._text_pen)
+        painter.setFont(self._label_font)
         
-        if node.is_leaf():
-            char_display = node.char if node.char and len(node.char) == 1 and node.char.isprintable() else "."
-            if node.char == ' ':
+        if is_leaf:
+            char = self.tree.labels[node]
+            char_display = char if char and len(char) == 1 and char.isprintable() else "."
+            if char == ' ':
                 char_display = "_"
-            elif node.char == '\n':
+            elif char == '\n':
                 char_display = "\\n"
-            elif node.char == '\t':
+            elif char == '\t':
                 char_display = "\\t"
             painter.drawText(x - r, y - r, r * 2, r * 2, 
                            Qt.AlignmentFlag.AlignCenter, char_display)
         else:
-            painter.setFont(QFont("Segoe UI", 8))
+            painter.setFont(self._freq_font)
             painter.drawText(x - r, y - r, r * 2, r * 2, 
-                           Qt.AlignmentFlag.AlignCenter, str(node.freq))
+                           Qt.AlignmentFlag.AlignCenter, str(self.tree.freqs[node]))
 
 
 class HuffmanTreeWindow(QWidget):
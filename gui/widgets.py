@@ -126,6 +126,23 @@ class StatsPanel(QFrame):
         grid.addWidget(self.time_label, 1, 2)
         grid.addWidget(self.time_value, 1, 3)
         
+        # Per-phase breakdown reported by the engine
+        self.phase_label = QLabel("Engine Phases")
+        self.phase_label.setObjectName("statsLabel")
+        self.phase_value = QLabel("—")
+        self.phase_value.setObjectName("statsValue")
+        self.phase_value.setWordWrap(True)
+        grid.addWidget(self.phase_label, 2, 0)
+        grid.addWidget(self.phase_value, 2, 1, 1, 3)
+        
+        # Entropy vs. achieved code length (compression only)
+        self.coding_label = QLabel("Bits per Byte")
+        self.coding_label.setObjectName("statsLabel")
+        self.coding_value = QLabel("—")
+        self.coding_value.setObjectName("statsValue")
+        grid.addWidget(self.coding_label, 3, 0)
+        grid.addWidget(self.coding_value, 3, 1, 1, 3)
+        
         layout.addLayout(grid)
     
     def format_size(self, size_bytes):
@@ -136,12 +153,38 @@ class StatsPanel(QFrame):
             size_bytes /= 1024
         return f"{size_bytes:.2f} TB"
     
-    def update_stats(self, original_size, result_size, time_taken, is_compression=True):
-        """Update the statistics display"""
+    def format_duration(self, nanoseconds):
+        """Format a nanosecond count with a readable unit"""
+        if nanoseconds >= 1_000_000_000:
+            return f"{nanoseconds / 1e9:.2f} s"
+        if nanoseconds >= 1_000_000:
+            return f"{nanoseconds / 1e6:.1f} ms"
+        return f"{nanoseconds / 1e3:.0f} µs"
+    
+    def update_stats(self, original_size, result_size, time_taken, is_compression=True, engine_stats=None):
+        """Update the statistics display; engine_stats is the engine's --stats=json report, if any"""
         self.original_value.setText(self.format_size(original_size))
         self.result_value.setText(self.format_size(result_size))
         self.time_value.setText(f"{time_taken:.3f}s")
         
+        # Phase times are summed over worker threads, so they can exceed the engine's wall time
+        has_phases = engine_stats is not None
+        if has_phases:
+            phases = [f"{name} {self.format_duration(ns)}"
+                      for name, ns in engine_stats['phases_ns'].items() if ns]
+            phases.append(f"engine total {self.format_duration(engine_stats['total_ns'])}")
+            self.phase_value.setText(" · ".join(phases))
+        self.phase_label.setVisible(has_phases)
+        self.phase_value.setVisible(has_phases)
+        
+        has_coding = has_phases and is_compression and original_size > 0
+        if has_coding:
+            self.coding_value.setText(
+                f"entropy {engine_stats['entropy']:.3f} · "
+                f"average code {engine_stats['average_code_length']:.3f}")
+        self.coding_label.setVisible(has_coding)
+        self.coding_value.setVisible(has_coding)
+        
         if is_compression:
             self.result_label.setText("Compressed Size")
             if original_size > 0:
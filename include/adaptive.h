@@ -0,0 +1,32 @@
+#ifndef ADAPTIVE_H
+#define ADAPTIVE_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include <stdio.h>
+#include "huffman.h"
+#include "sink.h"
+
+/*
+ * Adaptive container (CONTAINER_ADAPTIVE): one FGK bitstream right after
+ * the preamble, with no size field and no code table.  Encoder and decoder
+ * start from the same empty tree and update it after every symbol, so the
+ * input is read once and coded as it arrives.  Each encoder writes its
+ * own preamble; the decoders start after it and take its flags.
+ */
+int encodeAdaptive(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                   struct ByteSink* out);
+int decodeAdaptive(const unsigned char* in, size_t size, size_t pos, uint8_t flags,
+                   const struct HuffmanOptions* options, struct ByteSink* out);
+
+/*
+ * The same over streams: input is coded in whatever pieces read() returns
+ * and every piece is flushed to the output before the next read, so a
+ * live pipe or socket is passed through with bounded memory and latency.
+ * When a read comes back short the encoder also pads to a byte boundary
+ * behind a sync marker, so the reader can decode all of it immediately.
+ */
+int encodeAdaptiveStream(FILE* in, const struct HuffmanOptions* options, struct ByteSink* out);
+int decodeAdaptiveStream(FILE* in, uint8_t flags, const struct HuffmanOptions* options, struct ByteSink* out);
+
+#endif
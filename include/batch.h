@@ -0,0 +1,49 @@
+#ifndef BATCH_H
+#define BATCH_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include "huffman.h"
+
+typedef int (*BatchRun)(const char*, const char*, const struct HuffmanOptions*);
+
+struct BatchJob {
+    char* input;
+    char* output;
+    uint64_t size;       // input size, used to order the jobs
+    int status;
+    struct HuffmanStats stats;
+};
+
+/*
+ * A list of files to compress or decompress into one output directory,
+ * sorted largest first so the biggest files are not left until the end.
+ */
+struct Batch {
+    struct BatchJob* jobs;
+    size_t count;
+    size_t capacity;
+    uint64_t totalSize;
+};
+
+/*
+ * Collect jobs from `inputs`: plain files, directories (their regular
+ * files, not recursing) and @list files naming one path per line ("@-"
+ * reads the list from stdin).  Compressed outputs get a ".huff" suffix,
+ * which decompression strips again.
+ */
+int loadBatch(struct Batch* batch, int compress, const char* outputDir, char* inputs[], int count);
+
+/*
+ * Run every job on `workers` threads (0 = one per CPU).  Each job gets a
+ * copy of `options`; its progress counter tracks whole finished files and
+ * its cancel flag stops jobs that have not started yet.  Returns the
+ * number of failed jobs, not counting canceled ones; `total`, when not
+ * NULL, receives the merged stats of the jobs that succeeded.
+ */
+size_t runBatch(struct Batch* batch, BatchRun run, unsigned workers, const struct HuffmanOptions* options,
+                struct HuffmanStats* total);
+
+void freeBatch(struct Batch* batch);
+
+#endif
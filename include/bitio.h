@@ -0,0 +1,77 @@
+#ifndef BITIO_H
+#define BITIO_H
+
+#include <stdint.h>
+#include "sink.h"
+
+#define BITWRITER_BUFFER (1 << 16)
+
+// A code word with at most 32 bits, emitted MSB first
+struct CodeWord {
+    uint32_t code;
+    uint8_t length;
+};
+
+/*
+ * MSB-first bit writer.  Codes are shifted into a 64-bit accumulator and
+ * whole 32-bit words are moved into a local buffer that is handed to the
+ * sink in large pieces.
+ */
+struct BitWriter {
+    uint64_t acc;
+    unsigned bits;
+    size_t used;
+    struct ByteSink* out;
+    unsigned char buffer[BITWRITER_BUFFER];
+};
+
+static inline void bitWriterInit(struct BitWriter* w, struct ByteSink* out) {
+    w->acc = 0;
+    w->bits = 0;
+    w->used = 0;
+    w->out = out;
+}
+
+static inline void bitWriterPut(struct BitWriter* w, uint32_t code, unsigned length) {
+    w->acc = (w->acc << length) | code;
+    w->bits += length;
+    if (w->bits >= 32) {
+        w->bits -= 32;
+        uint32_t word = (uint32_t)(w->acc >> w->bits);
+        unsigned char* p = w->buffer + w->used;
+        p[0] = (unsigned char)(word >> 24);
+        p[1] = (unsigned char)(word >> 16);
+        p[2] = (unsigned char)(word >> 8);
+        p[3] = (unsigned char)word;
+        w->used += 4;
+        if (w->used == BITWRITER_BUFFER) {
+            sinkWrite(w->out, w->buffer, w->used);
+            w->used = 0;
+        }
+    }
+}
+
+// Hand every complete byte to the sink now, keeping the bits of an unfinished one
+static inline void bitWriterDrain(struct BitWriter* w) {
+    while (w->bits >= 8) {
+        w->bits -= 8;
+        w->buffer[w->used++] = (unsigned char)(w->acc >> w->bits);
+    }
+    sinkWrite(w->out, w->buffer, w->used);
+    w->used = 0;
+}
+
+// Pad the final partial byte with zero bits and hand everything to the sink
+static inline void bitWriterFinish(struct BitWriter* w) {
+    while (w->bits >= 8) {
+        w->bits -= 8;
+        w->buffer[w->used++] = (unsigned char)(w->acc >> w->bits);
+    }
+    if (w->bits)
+        w->buffer[w->used++] = (unsigned char)(w->acc << (8 - w->bits));
+    sinkWrite(w->out, w->buffer, w->used);
+    w->used = 0;
+    w->bits = 0;
+}
+
+#endif
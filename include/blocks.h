@@ -0,0 +1,21 @@
+#ifndef BLOCKS_H
+#define BLOCKS_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include <stdio.h>
+#include "huffman.h"
+#include "sink.h"
+
+unsigned resolveThreads(unsigned threads);
+int encodeBlocks(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                 struct ByteSink* out);
+// Decoders take the preamble's flags (FORMAT_FLAG_CHECKSUM)
+int decodeBlocks(const unsigned char* in, size_t size, size_t pos, uint8_t flags,
+                 const struct HuffmanOptions* options, struct ByteSink* out);
+
+// Block container over streams of unknown length (stdin, pipes)
+int encodeBlockStream(FILE* in, const struct HuffmanOptions* options, struct ByteSink* out);
+int decodeBlockStream(FILE* in, uint8_t flags, const struct HuffmanOptions* options, struct ByteSink* out);
+
+#endif
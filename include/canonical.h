@@ -0,0 +1,21 @@
+#ifndef CANONICAL_H
+#define CANONICAL_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include "decoder.h"
+#include "minheap.h"
+#include "sink.h"
+
+// Longest code the format allows; every table fits the two-level decoder
+#define MAX_CODE_LEN DECODE_MAX_CODE_LEN
+
+int storeCodeWords(const struct HuffmanTree* tree, int node, uint32_t code, int depth,
+                   uint8_t lengths[], uint32_t codes[]);
+uint64_t buildCodeLengths(const uint64_t freq[256], uint8_t lengths[256], unsigned maxLength);
+void assignCanonicalCodes(const uint8_t lengths[256], uint32_t codes[256]);
+void writeCodeLengths(struct ByteSink* out, const uint8_t lengths[256]);
+size_t codeLengthsSize(unsigned symbolCount);
+int readCodeLengths(const unsigned char* in, size_t size, size_t* pos, uint8_t lengths[256]);
+
+#endif
@@ -0,0 +1,25 @@
+#ifndef CHECKSUM_H
+#define CHECKSUM_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+/*
+ * XXH64 (seed 0) of the original data, carried by every file whose
+ * preamble has FORMAT_FLAG_CHECKSUM set.  Feed the data in any number of
+ * pieces between checksumInit() and checksumDigest(); the result is the
+ * same as checksumOf() over all of it at once.
+ */
+struct Checksum {
+    uint64_t lanes[4];
+    uint64_t total;
+    unsigned char pending[32];   // tail of the input not yet a whole stripe
+    unsigned pendingSize;
+};
+
+void checksumInit(struct Checksum* sum);
+void checksumUpdate(struct Checksum* sum, const void* data, size_t size);
+uint64_t checksumDigest(const struct Checksum* sum);
+uint64_t checksumOf(const void* data, size_t size);
+
+#endif
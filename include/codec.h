@@ -0,0 +1,60 @@
+#ifndef CODEC_H
+#define CODEC_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include "bitio.h"
+#include "checksum.h"
+#include "huffman.h"
+#include "sink.h"
+
+// Byte histogram of `in`, folding it into `sum` on the same pass unless that is NULL
+void countSymbols(const unsigned char* in, size_t size, uint64_t freq[256], struct Checksum* sum);
+
+/*
+ * One self-contained coded stream (codec byte, size, code table, bitstream);
+ * with options->context set the encoder may write an order-1 stream instead,
+ * and input the code would not shrink enough goes into a stored stream.
+ * Both directions add their counters and phase times to options->stats,
+ * report progress as a position within `in`, and stop on options->cancel.
+ * The encoder folds `in` into `sum`, if not NULL, while it counts it.
+ */
+int encodeStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options, struct Checksum* sum,
+                 struct ByteSink* out);
+
+int decodeStream(const unsigned char* in, size_t size, size_t* pos, const struct HuffmanOptions* options,
+                 struct ByteSink* out);
+
+/*
+ * The plain order-0 stream (coded or stored) of `in`, whose byte histogram
+ * `freq` the caller has already counted; the fallback of the dictionary and
+ * context encoders, so rejecting their stream does not count the input again.
+ */
+int encodeCountedStream(const unsigned char* in, size_t size, const uint64_t freq[256],
+                        const struct HuffmanOptions* options, struct ByteSink* out);
+
+/*
+ * A coded stream has to come out at least 1/STORED_MIN_SAVING (about 1.6%)
+ * smaller than its input, table included; otherwise the input is stored
+ * as it is, which costs nothing to encode and is a plain copy to decode.
+ */
+#define STORED_MIN_SAVING 64
+
+// Whether `codedBits` of table and bitstream save enough over storing `size` bytes
+int worthCoding(uint64_t size, uint64_t codedBits);
+
+/*
+ * A coded stream followed by the checksum of `in` (FORMAT_FLAG_CHECKSUM), and
+ * its reader: the stream and checksum run from *pos to `size`, and output
+ * that does not match the checksum fails with HUFF_ERR_CHECKSUM.
+ */
+int encodeCheckedStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                        struct ByteSink* out);
+int decodeCheckedStream(const unsigned char* in, size_t size, size_t* pos, const struct HuffmanOptions* options,
+                        struct ByteSink* out);
+
+// Bitstream of `in` coded with `codes`, padded to a whole byte; times the code phase
+int encodeSymbols(const struct CodeWord codes[256], const unsigned char* in, size_t size,
+                  const struct HuffmanOptions* options, struct ByteSink* out);
+
+#endif
@@ -0,0 +1,20 @@
+#ifndef CONTEXT_H
+#define CONTEXT_H
+
+#include <stddef.h>
+#include "checksum.h"
+#include "huffman.h"
+#include "sink.h"
+
+/*
+ * Order-1 coded stream (CODEC_CONTEXT): every byte is coded with the table
+ * chosen by the byte before it.  Contexts with similar statistics share a
+ * table, and a stream that would not come out smaller than the plain
+ * order-0 stream is written as one instead.
+ */
+int encodeContextStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                        struct Checksum* sum, struct ByteSink* out);
+int decodeContextStream(const unsigned char* in, size_t size, size_t* pos, const struct HuffmanOptions* options,
+                        struct ByteSink* out);
+
+#endif
@@ -0,0 +1,39 @@
+#ifndef DECODER_H
+#define DECODER_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include "huffman.h"
+#include "sink.h"
+
+// Bits resolved by the first-level lookup; longer codes use a second-level table
+#define DECODE_ROOT_BITS 11
+// Longest code the table decoder accepts (bounds the second-level table size)
+#define DECODE_MAX_CODE_LEN 24
+
+/*
+ * A leaf entry (subBits == 0) holds the symbol and its full code length.
+ * A link entry holds the offset of a second-level table indexed by the
+ * next subBits bits of the stream.
+ */
+struct DecodeEntry {
+    uint32_t value;
+    uint8_t length;
+    uint8_t subBits;
+};
+
+struct DecodeTable {
+    struct DecodeEntry* entries;
+    unsigned rootBits;
+    unsigned maxLength;
+};
+
+int buildDecodeTable(struct DecodeTable* table, const uint8_t lengths[256], const uint32_t codes[256]);
+void freeDecodeTable(struct DecodeTable* table);
+int decodeSymbols(const struct DecodeTable* table, const unsigned char* in, size_t size,
+                  size_t* pos, uint64_t count, const struct HuffmanOptions* options, struct ByteSink* out);
+int decodeContextSymbols(const struct DecodeTable* const tables[256], const unsigned char* in, size_t size,
+                         size_t* pos, uint64_t count, const struct HuffmanOptions* options,
+                         struct ByteSink* out);
+
+#endif
@@ -0,0 +1,40 @@
+#ifndef DICTIONARY_H
+#define DICTIONARY_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include "bitio.h"
+#include "decoder.h"
+#include "huffman.h"
+#include "sink.h"
+
+/*
+ * Dictionary file, written by huffmanTrainDictionary():
+ *   "HUFD" | u8 version | 3 reserved bytes | u32 id | code-length table
+ * The table covers all 256 byte values; the id is a hash of it, and is all
+ * a dictionary-coded stream (CODEC_DICTIONARY) records of its code.
+ */
+#define DICT_MAGIC "HUFD"
+#define DICT_MAGIC_SIZE 4
+#define DICT_VERSION 1
+#define DICT_HEADER_SIZE 12
+
+// A loaded dictionary: its codes and decode table are built once and shared read-only
+struct HuffmanDictionary {
+    uint32_t id;
+    uint8_t lengths[256];
+    struct CodeWord codes[256];
+    struct DecodeTable table;
+};
+
+/*
+ * Dictionary coded stream: u8 codec, varint original size, u32 id, bitstream.
+ * The encoder writes a plain stream instead when the dictionary's code
+ * would not come out smaller or cannot code every byte of the input.
+ */
+int encodeDictionaryStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                           struct Checksum* sum, struct ByteSink* out);
+int decodeDictionaryStream(const unsigned char* in, size_t size, size_t* pos, const struct HuffmanOptions* options,
+                           struct ByteSink* out);
+
+#endif
@@ -0,0 +1,54 @@
+#ifndef FILEIO_H
+#define FILEIO_H
+
+#include <stddef.h>
+#include <stdio.h>
+
+#define IO_BUFFER_SIZE (1 << 20)
+
+/*
+ * A whole input file in memory.  Regular files are memory-mapped; pipes,
+ * devices and platforms without mmap are read in IO_BUFFER_SIZE blocks.
+ */
+struct InputData {
+    const unsigned char* data;
+    size_t size;
+    void* mapping;
+    unsigned char* owned;
+};
+
+int openInput(const char* path, struct InputData* input);
+void closeInput(struct InputData* input);
+
+/*
+ * Streams for inputs that cannot be mapped or sized up front.  The path
+ * "-" names stdin or stdout (switched to binary mode where that matters);
+ * isStreamPath() is also true for FIFOs and devices.
+ */
+int isStdio(const char* path);
+int isStreamPath(const char* path);
+FILE* openInputStream(const char* path);
+FILE* openOutput(const char* path);
+int closeStream(FILE* file);
+int isRegularStream(FILE* file);
+
+/*
+ * One read from a stream of openInputStream() that returns as soon as any
+ * data is there rather than waiting for `len` bytes: the count, 0 at the
+ * end of the input or -1 on error.
+ */
+long readAvailable(FILE* file, unsigned char* buffer, size_t len);
+
+// Slurp the rest of `stream`, after `prefixLen` bytes the caller already read from it
+int readInputStream(FILE* stream, const unsigned char* prefix, size_t prefixLen, struct InputData* input);
+
+#ifndef _WIN32
+#define HAVE_POSITIONAL_WRITES 1
+#include <stdint.h>
+
+// Size `file` and write into it at absolute offsets; safe from several threads at once
+int resizeFile(FILE* file, uint64_t size);
+int writeAt(FILE* file, const void* data, size_t len, uint64_t offset);
+#endif
+
+#endif
@@ -0,0 +1,71 @@
+#ifndef FORMAT_H
+#define FORMAT_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include "sink.h"
+
+/*
+ * Every file written since format version 2 starts with an 8-byte preamble:
+ *   magic[4] | version | container | flags | reserved
+ * Files without the magic are read as the legacy (version 1) layout.
+ */
+#define FORMAT_MAGIC "\x89HUF"
+#define FORMAT_MAGIC_SIZE 4
+#define FORMAT_PREAMBLE_SIZE 8
+#define FORMAT_VERSION 2
+
+/*
+ * Preamble flags.  With FORMAT_FLAG_CHECKSUM every coded stream is followed
+ * by the u64 XXH64 checksum (see checksum.h) of the data it decodes to: the single
+ * stream of the file, each block (inside its payload, so payloadSize counts
+ * it) or the adaptive bitstream.  Readers reject flags they do not know.
+ */
+#define FORMAT_FLAG_CHECKSUM 1
+#define FORMAT_KNOWN_FLAGS FORMAT_FLAG_CHECKSUM
+#define FORMAT_CHECKSUM_SIZE 8
+
+// Container: how the codec streams are laid out in the file
+#define CONTAINER_SINGLE 0
+#define CONTAINER_BLOCKS 1
+#define CONTAINER_ADAPTIVE 2   // one adaptive Huffman bitstream, see adaptive.h
+
+/*
+ * Block container, after the preamble:
+ *   varint blockSize
+ *   per block: u32 rawSize, u32 payloadSize, coded stream of payloadSize bytes
+ *   end marker: u32 0, u32 0
+ *   index: per block u64 headerOffset, u32 payloadSize, u32 rawSize
+ *   footer: u64 indexOffset, u32 blockCount, "HBIX"
+ * All fixed-width integers are little-endian.
+ */
+#define BLOCK_HEADER_SIZE 8
+#define BLOCK_INDEX_ENTRY_SIZE 16
+#define BLOCK_FOOTER_SIZE 16
+#define BLOCK_FOOTER_MAGIC "HBIX"
+
+// Codec: first byte of every coded stream
+#define CODEC_HUFFMAN 0
+#define CODEC_CONTEXT 1     // order-1 tables, see context.h
+#define CODEC_DICTIONARY 2  // shared table from a dictionary file, see dictionary.h
+#define CODEC_STORED 3      // the input bytes as they are, for data coding would not shrink
+
+struct Preamble {
+    uint8_t version;
+    uint8_t container;
+    uint8_t flags;
+};
+
+void writePreamble(struct ByteSink* out, uint8_t container, uint8_t flags);
+int readPreamble(const unsigned char* in, size_t size, struct Preamble* preamble);
+int hasPreamble(const unsigned char* in, size_t size);
+
+void writeU32(struct ByteSink* out, uint32_t value);
+void writeU64(struct ByteSink* out, uint64_t value);
+uint32_t readU32(const unsigned char* in);
+uint64_t readU64(const unsigned char* in);
+
+void writeVarint(struct ByteSink* out, uint64_t value);
+int readVarint(const unsigned char* in, size_t size, size_t* pos, uint64_t* value);
+
+#endif
@@ -1,10 +1,137 @@
 #ifndef HUFFMAN_H
 #define HUFFMAN_H
 
-#define MAX_TREE_HT 256
+#include <stddef.h>
+#include <stdint.h>
 
-void compressFile(const char* inputFile, const char* outputFile);
-void decompressFile(const char* inputFile, const char* outputFile);
+#define MAX_TREE_HT 256
 
+#if defined(_WIN32) && defined(HUFFMAN_BUILD_DLL)
+#define HUFFMAN_API __declspec(dllexport)
+#else
+#define HUFFMAN_API
 #endif
 
+// Status codes returned by every library entry point
+#define HUFF_OK 0
+#define HUFF_ERR_IO -1
+#define HUFF_ERR_NOMEM -2
+#define HUFF_ERR_FORMAT -3
+#define HUFF_ERR_ARG -4
+#define HUFF_ERR_CANCELED -5
+#define HUFF_ERR_DICTIONARY -6
+#define HUFF_ERR_CHECKSUM -7
+#define HUFF_ERR_LIMIT -8
+
+#define HUFF_DEFAULT_BLOCK_SIZE (1 << 20)
+#define HUFF_MIN_BLOCK_SIZE (1 << 10)
+#define HUFF_MAX_BLOCK_SIZE (1u << 30)
+
+// Range of HuffmanOptions.maxCodeLength; limits up to 11 bits decode with one table lookup
+#define HUFF_MIN_CODE_LENGTH 8
+#define HUFF_MAX_CODE_LENGTH 24
+
+// Phases timed in HuffmanStats.phaseNs
+#define HUFF_PHASE_READ 0        // opening, mapping or reading the input
+#define HUFF_PHASE_HISTOGRAM 1   // counting bytes
+#define HUFF_PHASE_TABLE 2       // code lengths and canonical codes, or decode tables
+#define HUFF_PHASE_CODE 3        // encoding or decoding the bitstream
+#define HUFF_PHASE_WRITE 4       // writing the output
+#define HUFF_PHASE_COUNT 5
+
+/*
+ * Side-channel report of a call.  The histogram, code length figures and
+ * histogram phase are only filled in when compressing.  Phase times are
+ * summed over worker threads, so in block mode they can add up to more
+ * than totalNs.
+ */
+struct HuffmanStats {
+    uint64_t inputSize;
+    uint64_t outputSize;
+    uint64_t histogram[256];     // byte counts of the uncompressed data
+    uint64_t codedBits;          // bitstream length in bits, excluding headers and tables
+    double entropy;              // bits per byte of the histogram
+    double averageCodeLength;    // codedBits per uncompressed byte
+    uint64_t totalNs;            // wall-clock time of the whole call
+    uint64_t phaseNs[HUFF_PHASE_COUNT];
+    uint64_t limitLossBits;      // extra coded bits spent to honour maxCodeLength
+};
+
+struct HuffmanDictionary;
+
+// Tuning knobs; always start from huffmanDefaultOptions()
+struct HuffmanOptions {
+    unsigned threads;            // worker threads for block mode (both directions), 0 = one per CPU
+    size_t blockSize;            // bytes per block, 0 = single stream unless threads != 1
+    struct HuffmanStats* stats;  // filled in when not NULL
+    volatile uint64_t* progress; // input bytes processed so far, updated while the call runs
+    volatile int* cancel;        // set non-zero from any thread to stop with HUFF_ERR_CANCELED
+    unsigned maxCodeLength;      // longest code in bits when compressing, 0 = HUFF_MAX_CODE_LENGTH
+    int adaptive;                // compress in one pass with an adaptive code (no threads or blocks)
+    int context;                 // code each byte with a table picked by the byte before it
+    const struct HuffmanDictionary* dictionary; // shared code table, needed again to decompress
+    uint64_t maxOutputSize;      // fail with HUFF_ERR_LIMIT past this many output bytes, 0 = no limit
+};
+
+HUFFMAN_API void huffmanDefaultOptions(struct HuffmanOptions* options);
+
+HUFFMAN_API int compressFile(const char* inputFile, const char* outputFile);
+HUFFMAN_API int decompressFile(const char* inputFile, const char* outputFile);
+HUFFMAN_API int compressFileWithOptions(const char* inputFile, const char* outputFile,
+                                        const struct HuffmanOptions* options);
+HUFFMAN_API int decompressFileWithOptions(const char* inputFile, const char* outputFile,
+                                          const struct HuffmanOptions* options);
+
+/*
+ * Decode inputFile ("-" for stdin) without writing the output, checking
+ * its structure and checksums; stats->outputSize is the decoded size.
+ * options may be NULL.  Files written before checksums were added are only
+ * checked for structure.
+ */
+HUFFMAN_API int huffmanTestFile(const char* inputFile, const struct HuffmanOptions* options);
+
+// Memory-to-memory API; *output must be released with freeBuffer()
+HUFFMAN_API int compressBuffer(const unsigned char* input, size_t inputSize,
+                               unsigned char** output, size_t* outputSize);
+HUFFMAN_API int decompressBuffer(const unsigned char* input, size_t inputSize,
+                                 unsigned char** output, size_t* outputSize);
+HUFFMAN_API int compressBufferWithOptions(const unsigned char* input, size_t inputSize,
+                                          unsigned char** output, size_t* outputSize,
+                                          const struct HuffmanOptions* options);
+HUFFMAN_API int decompressBufferWithOptions(const unsigned char* input, size_t inputSize,
+                                            unsigned char** output, size_t* outputSize,
+                                            const struct HuffmanOptions* options);
+HUFFMAN_API void freeBuffer(unsigned char* buffer);
+
+/*
+ * Dictionaries: a code table trained once on sample files and shared by
+ * every stream compressed with it, so small inputs skip their own table.
+ * A loaded dictionary is read-only and may be used by any number of calls
+ * at once; release it with huffmanFreeDictionary().
+ */
+HUFFMAN_API int huffmanTrainDictionary(const char* const samples[], size_t count, const char* dictFile,
+                                       const struct HuffmanOptions* options);
+HUFFMAN_API int huffmanLoadDictionary(const char* dictFile, struct HuffmanDictionary** dictionary);
+HUFFMAN_API void huffmanFreeDictionary(struct HuffmanDictionary* dictionary);
+
+/*
+ * Built code tables are kept in a process-wide LRU cache shared by all
+ * calls, so jobs that keep producing the same histograms or code-length
+ * tables skip building them.  The counters cover the whole process.
+ */
+struct HuffmanCacheStats {
+    uint64_t hits;
+    uint64_t misses;
+    uint64_t evictions;
+    uint64_t entries;
+    uint64_t bytes;              // memory held by cached tables
+    uint64_t limit;
+};
+
+// Cap the cache's memory (default 8 MiB); 0 empties and disables it
+HUFFMAN_API void huffmanSetTableCacheLimit(size_t bytes);
+HUFFMAN_API void huffmanTableCacheStats(struct HuffmanCacheStats* stats);
+
+HUFFMAN_API const char* huffmanStrerror(int status);
+
+#endif
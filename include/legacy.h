@@ -0,0 +1,12 @@
+#ifndef LEGACY_H
+#define LEGACY_H
+
+#include <stddef.h>
+#include "huffman.h"
+#include "sink.h"
+
+// Version 1 files: native `long` size, 256 `int` frequencies, tree-ordered codes
+int decodeLegacyStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                       struct ByteSink* out);
+
+#endif
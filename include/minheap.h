@@ -1,25 +1,40 @@
 #ifndef MINHEAP_H
 #define MINHEAP_H
 
+#include <stdint.h>
+
+// A tree over n <= 256 symbols has n leaves and n - 1 internal nodes
+#define TREE_MAX_NODES 511
+#define NO_CHILD (-1)
+
 struct MinHeapNode {
-    char data;
+    unsigned char data;
     unsigned freq;
-    struct MinHeapNode *left, *right;
+    int16_t left, right;    // arena indices of the children, NO_CHILD in a leaf
+};
+
+/*
+ * Every node of one tree, in a fixed arena the caller owns (usually on
+ * its stack): leaves first in input order, then internal nodes as they
+ * are merged.  Nothing is allocated, so there is nothing to free.
+ */
+struct HuffmanTree {
+    struct MinHeapNode nodes[TREE_MAX_NODES];
+    unsigned count;
+    int root;
 };
 
 struct MinHeap {
     unsigned size;
-    unsigned capacity;
-    struct MinHeapNode **array;
+    const struct MinHeapNode* nodes;   // arena the heap's indices refer to
+    int16_t array[256];
 };
 
-struct MinHeapNode* newNode(char data, unsigned freq);
-struct MinHeap* createMinHeap(unsigned capacity);
-void insertMinHeap(struct MinHeap* minHeap, struct MinHeapNode* node);
-struct MinHeapNode* extractMin(struct MinHeap* minHeap);
+int newNode(struct HuffmanTree* tree, unsigned char data, unsigned freq);
+void insertMinHeap(struct MinHeap* minHeap, int node);
+int extractMin(struct MinHeap* minHeap);
 void buildMinHeap(struct MinHeap* minHeap);
-struct MinHeapNode* buildHuffmanTree(char data[], int freq[], int size);
-int isLeaf(struct MinHeapNode* root);
+int buildHuffmanTree(struct HuffmanTree* tree, const unsigned char data[], const int freq[], int size);
+int isLeaf(const struct MinHeapNode* node);
 
 #endif
-
@@ -0,0 +1,65 @@
+#ifndef SERVE_H
+#define SERVE_H
+
+#include <stdint.h>
+#include "huffman.h"
+
+/*
+ * Job protocol of `huffman serve`, over a Unix stream socket.  A client
+ * sends any number of requests on one connection and reads each response
+ * before sending the next; jobs from different connections run at once.
+ * All integers are little-endian.
+ *
+ * Request (SERVE_REQUEST_SIZE bytes, then the payload):
+ *   u8 operation ('c' or 'd') | u8 source | u8 flags | u8 maxCodeLength
+ *   u32 threads | u64 blockSize | u32 inputLength | u32 outputLength
+ *   input path or inline data (inputLength bytes) | output path (outputLength bytes)
+ *
+ * Response (SERVE_RESPONSE_SIZE bytes, then the message and the data):
+ *   i32 status | u32 messageLength | u64 dataLength
+ *   u64 inputSize, outputSize, codedBits, limitLossBits, totalNs
+ *   u64 phaseNs[HUFF_PHASE_COUNT] | u64 histogram[256]
+ *   f64 entropy, averageCodeLength
+ *   status message (messageLength bytes) | inline output (dataLength bytes)
+ */
+#define SERVE_REQUEST_SIZE 24
+#define SERVE_RESPONSE_SIZE (16 + 8 * (5 + HUFF_PHASE_COUNT + 256 + 2))
+
+#define SERVE_SOURCE_FILES 0    // input and output are paths the server opens
+#define SERVE_SOURCE_INLINE 1   // input is the data itself, output comes back in the response
+
+#define SERVE_FLAG_CONTEXT 1
+#define SERVE_FLAG_ADAPTIVE 2
+#define SERVE_FLAG_DICTIONARY 4 // code with the dictionary the server was started with
+
+/*
+ * Longest path and largest inline payload a request may carry; larger
+ * inputs go by path, so one request cannot pin a gigabyte of server memory.
+ */
+#define SERVE_MAX_PATH 4096
+#define SERVE_MAX_INLINE (64u << 20)
+
+/*
+ * Largest output an inline job may produce: a few bytes of coded stream
+ * can claim any decoded size, and the job fails with HUFF_ERR_LIMIT before
+ * its buffer grows past this.
+ */
+#define SERVE_MAX_INLINE_OUTPUT (256u << 20)
+
+/*
+ * Once a request starts arriving, all of it has to arrive within this
+ * time, and a response that the client does not read within it is
+ * abandoned; either way the connection is dropped.
+ */
+#define SERVE_IO_TIMEOUT_MS 10000
+
+/*
+ * Listen on `socketPath` and run jobs on `workers` threads (0 = one per
+ * CPU) until *options->cancel is set; running jobs are then canceled.
+ * A job is also canceled when its client hangs up before the response.
+ * A job asks for its own thread count, which is capped at `workers`.
+ * `options` supplies the dictionary for every job.
+ */
+int serveSocket(const char* socketPath, unsigned workers, const struct HuffmanOptions* options);
+
+#endif
@@ -0,0 +1,54 @@
+#ifndef SINK_H
+#define SINK_H
+
+#include <stdio.h>
+#include <stddef.h>
+#include <stdint.h>
+#include "checksum.h"
+
+/*
+ * Output sink shared by the encoder and decoder.
+ * A memory sink grows as needed; a file sink flushes to `file`
+ * whenever its buffer fills up, and a discard sink drops what it flushes.
+ */
+struct ByteSink {
+    unsigned char* data;
+    size_t size;
+    size_t capacity;
+    FILE* file;
+    uint64_t flushed;
+    uint64_t flushNs;    // time spent handing data to `file`
+    int error;           // HUFF_OK, or the status of the first failure (see sinkStatus)
+    uint64_t limit;      // most bytes the sink takes in all, 0 = no limit
+    int discard;
+    // Running checksum of the output, see sinkStartChecksum()
+    int checksumming;
+    size_t checked;      // bytes of `data` already folded into `checksum`
+    struct Checksum checksum;
+};
+
+void sinkInitMemory(struct ByteSink* sink, size_t initialCapacity);
+void sinkInitFile(struct ByteSink* sink, FILE* file, size_t bufferSize);
+void sinkInitDiscard(struct ByteSink* sink, size_t bufferSize);
+void sinkWrite(struct ByteSink* sink, const void* src, size_t len);
+void sinkPutByte(struct ByteSink* sink, unsigned char byte);
+unsigned char* sinkExtend(struct ByteSink* sink, size_t len);
+int sinkFlush(struct ByteSink* sink);
+uint64_t sinkTell(const struct ByteSink* sink);
+/*
+ * HUFF_ERR_NOMEM when a buffer could not grow, HUFF_ERR_IO when a write to
+ * `file` failed, HUFF_ERR_LIMIT when a write would have gone past `limit`.
+ */
+int sinkStatus(const struct ByteSink* sink);
+unsigned char* sinkDetach(struct ByteSink* sink, size_t* size);
+void sinkFree(struct ByteSink* sink);
+
+/*
+ * Checksum of everything written between sinkStartChecksum() and
+ * sinkChecksum(), folded in as the buffer is flushed so it also covers
+ * data that has already left a file sink.
+ */
+void sinkStartChecksum(struct ByteSink* sink);
+uint64_t sinkChecksum(struct ByteSink* sink);
+
+#endif
@@ -0,0 +1,23 @@
+#ifndef STATS_H
+#define STATS_H
+
+#include <stdint.h>
+#include "huffman.h"
+
+// Nanoseconds from a monotonic clock; only differences are meaningful
+uint64_t monotonicNs(void);
+
+// Add the counters and phase times of `src` (one block, one worker) into `dst`
+void mergeStats(struct HuffmanStats* dst, const struct HuffmanStats* src);
+
+// Derive entropy and average code length once the counters are complete
+void finishStats(struct HuffmanStats* stats);
+
+// Publish how much input has been processed, and poll for cancellation
+void setProgress(const struct HuffmanOptions* options, uint64_t done);
+int isCanceled(const struct HuffmanOptions* options);
+
+// Progress is published (and cancellation polled) about this often within one stream
+#define PROGRESS_INTERVAL (1 << 20)
+
+#endif
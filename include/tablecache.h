@@ -0,0 +1,29 @@
+#ifndef TABLECACHE_H
+#define TABLECACHE_H
+
+#include <stdint.h>
+#include "decoder.h"
+
+// Memory the cache may hold until huffmanSetTableCacheLimit() says otherwise
+#define TABLE_CACHE_DEFAULT_LIMIT (8u << 20)
+
+/*
+ * Process-wide LRU cache of built code tables, shared by every call and
+ * thread.  Encoder entries map a histogram and length limit to the code
+ * lengths and canonical codes built for it; decoder entries map a
+ * code-length table to its decode table.  Keys are hashed for lookup and
+ * compared in full, so a hit always returns the table a build would.
+ */
+
+// Same results as buildCodeLengths() followed by assignCanonicalCodes()
+uint64_t cachedCodeLengths(const uint64_t freq[256], uint8_t lengths[256], uint32_t codes[256],
+                           unsigned maxLength);
+
+/*
+ * Decode table for `lengths`, valid until the matching release even if it
+ * is evicted meanwhile.  Returns NULL with *status set on failure.
+ */
+const struct DecodeTable* acquireDecodeTable(const uint8_t lengths[256], int* status);
+void releaseDecodeTable(const struct DecodeTable* table);
+
+#endif
@@ -0,0 +1,459 @@
+#include <stdlib.h>
+#include <string.h>
+#include "adaptive.h"
+#include "bitio.h"
+#include "checksum.h"
+#include "fileio.h"
+#include "format.h"
+#include "stats.h"
+
+#define ADAPTIVE_EOF 256            // sent once, after the last byte
+#define ADAPTIVE_SYNC 257           // the rest of the current byte is padding
+#define ADAPTIVE_SYMBOL_BITS 9      // width of a symbol sent after the NYT code
+#define ADAPTIVE_NODES 513          // 256 byte leaves, the NYT leaf and 256 internal nodes
+#define ADAPTIVE_ROOT (ADAPTIVE_NODES - 1)
+#define ADAPTIVE_CHUNK (1 << 16)    // largest piece read from a stream at once
+
+#define NODE_INTERNAL -1
+#define NODE_NYT -2
+
+/*
+ * FGK tree.  Nodes are stored at their implicit number, so weights never
+ * decrease from the NYT ("not yet transmitted") leaf up to the root at
+ * the top index, and the two nodes for a new byte are taken from just
+ * below the NYT leaf.  Only indices from `nyt` upwards are in use.
+ */
+struct AdaptiveTree {
+    uint64_t weight[ADAPTIVE_NODES];
+    int16_t parent[ADAPTIVE_NODES];
+    int16_t left[ADAPTIVE_NODES];
+    int16_t right[ADAPTIVE_NODES];
+    int16_t symbol[ADAPTIVE_NODES];   // byte value, NODE_INTERNAL or NODE_NYT
+    int16_t leaf[256];                // node of each byte seen so far, or -1
+    int nyt;
+};
+
+static void treeInit(struct AdaptiveTree* t) {
+    t->nyt = ADAPTIVE_ROOT;
+    t->weight[ADAPTIVE_ROOT] = 0;
+    t->parent[ADAPTIVE_ROOT] = -1;
+    t->left[ADAPTIVE_ROOT] = t->right[ADAPTIVE_ROOT] = -1;
+    t->symbol[ADAPTIVE_ROOT] = NODE_NYT;
+    memset(t->leaf, 0xff, sizeof(t->leaf));
+}
+
+// Split the NYT leaf into a new NYT leaf (left) and a leaf for `byte` (right)
+static int treeAdd(struct AdaptiveTree* t, int byte) {
+    int node = t->nyt, leaf = node - 1, nyt = node - 2;
+    t->symbol[node] = NODE_INTERNAL;
+    t->left[node] = (int16_t)nyt;
+    t->right[node] = (int16_t)leaf;
+    for (int n = nyt; n <= leaf; n++) {
+        t->weight[n] = 0;
+        t->parent[n] = (int16_t)node;
+        t->left[n] = t->right[n] = -1;
+    }
+    t->symbol[leaf] = (int16_t)byte;
+    t->symbol[nyt] = NODE_NYT;
+    t->leaf[byte] = (int16_t)leaf;
+    t->nyt = nyt;
+    return leaf;
+}
+
+// Highest-numbered node with the same weight as `node`; weights are sorted by number
+static int blockLeader(const struct AdaptiveTree* t, int node) {
+    uint64_t weight = t->weight[node];
+    int lo = node, hi = ADAPTIVE_ROOT;
+    while (lo < hi) {
+        int mid = (lo + hi + 1) / 2;
+        if (t->weight[mid] == weight)
+            lo = mid;
+        else
+            hi = mid - 1;
+    }
+    return lo;
+}
+
+// Point the children (or the leaf lookup) of `node` back at it after a swap
+static void adopt(struct AdaptiveTree* t, int node) {
+    if (t->symbol[node] == NODE_INTERNAL) {
+        t->parent[t->left[node]] = (int16_t)node;
+        t->parent[t->right[node]] = (int16_t)node;
+    } else if (t->symbol[node] == NODE_NYT) {
+        t->nyt = node;
+    } else {
+        t->leaf[t->symbol[node]] = (int16_t)node;
+    }
+}
+
+// Exchange two subtrees of equal weight; each keeps its number and its parent
+static void treeSwap(struct AdaptiveTree* t, int a, int b) {
+    int16_t left = t->left[a], right = t->right[a], symbol = t->symbol[a];
+    t->left[a] = t->left[b];
+    t->right[a] = t->right[b];
+    t->symbol[a] = t->symbol[b];
+    t->left[b] = left;
+    t->right[b] = right;
+    t->symbol[b] = symbol;
+    adopt(t, a);
+    adopt(t, b);
+}
+
+// Count one more occurrence of the leaf `node`, keeping the sibling property
+static void treeUpdate(struct AdaptiveTree* t, int node) {
+    for (;;) {
+        int leader = blockLeader(t, node);
+        if (leader != node && leader != t->parent[node]) {
+            treeSwap(t, node, leader);
+            node = leader;
+        }
+        t->weight[node]++;
+        if (node == ADAPTIVE_ROOT)
+            return;
+        node = t->parent[node];
+    }
+}
+
+// Write the root-to-`node` path; returns its length in bits
+static unsigned putPath(struct BitWriter* w, const struct AdaptiveTree* t, int node) {
+    uint8_t path[ADAPTIVE_NODES];
+    unsigned depth = 0;
+    for (; node != ADAPTIVE_ROOT; node = t->parent[node])
+        path[depth++] = t->right[t->parent[node]] == node;
+    for (unsigned i = depth; i > 0;) {
+        unsigned n = i > 24 ? 24 : i;
+        uint32_t code = 0;
+        for (unsigned k = 0; k < n; k++)
+            code = (code << 1) | path[--i];
+        bitWriterPut(w, code, n);
+    }
+    return depth;
+}
+
+struct AdaptiveEncoder {
+    struct AdaptiveTree tree;
+    struct BitWriter writer;
+    uint64_t bits;
+};
+
+static struct AdaptiveEncoder* newEncoder(struct ByteSink* out) {
+    struct AdaptiveEncoder* enc = malloc(sizeof(*enc));
+    if (!enc)
+        return NULL;
+    treeInit(&enc->tree);
+    bitWriterInit(&enc->writer, out);
+    enc->bits = 0;
+    return enc;
+}
+
+// Bytes already in the tree are sent as their path; new bytes and markers as the NYT path and 9 raw bits
+static void encodeSymbol(struct AdaptiveEncoder* enc, int symbol) {
+    struct AdaptiveTree* t = &enc->tree;
+    int node = symbol < 256 ? t->leaf[symbol] : -1;
+    if (node >= 0) {
+        enc->bits += putPath(&enc->writer, t, node);
+    } else {
+        enc->bits += putPath(&enc->writer, t, t->nyt) + ADAPTIVE_SYMBOL_BITS;
+        bitWriterPut(&enc->writer, (uint32_t)symbol, ADAPTIVE_SYMBOL_BITS);
+        if (symbol >= ADAPTIVE_EOF)
+            return;
+        node = treeAdd(t, symbol);
+    }
+    treeUpdate(t, node);
+}
+
+static void encodeBytes(struct AdaptiveEncoder* enc, const unsigned char* in, size_t size,
+                        struct HuffmanStats* stats) {
+    for (size_t i = 0; i < size; i++) {
+        if (stats)
+            stats->histogram[in[i]]++;
+        encodeSymbol(enc, in[i]);
+    }
+}
+
+/*
+ * Pad to a byte boundary behind a sync symbol, so the reader can decode
+ * everything sent so far without waiting for the bits of the next byte.
+ */
+static void syncEncoder(struct AdaptiveEncoder* enc) {
+    encodeSymbol(enc, ADAPTIVE_SYNC);
+    unsigned padding = (8 - enc->writer.bits % 8) % 8;
+    bitWriterPut(&enc->writer, 0, padding);
+    enc->bits += padding;
+    bitWriterDrain(&enc->writer);
+}
+
+// End the bitstream and append the checksum of everything it codes
+static void finishEncoder(struct AdaptiveEncoder* enc, struct HuffmanStats* stats, const struct Checksum* sum) {
+    encodeSymbol(enc, ADAPTIVE_EOF);
+    bitWriterFinish(&enc->writer);
+    writeU64(enc->writer.out, checksumDigest(sum));
+    if (stats)
+        stats->codedBits += enc->bits;
+}
+
+// Push everything coded so far out of the process, not just into the sink
+static int flushOutput(struct ByteSink* out) {
+    if (sinkFlush(out) != 0)
+        return HUFF_ERR_IO;
+    if (out->file && fflush(out->file) != 0)
+        return HUFF_ERR_IO;
+    return HUFF_OK;
+}
+
+int encodeAdaptive(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                   struct ByteSink* out) {
+    struct HuffmanStats* stats = options->stats;
+    struct AdaptiveEncoder* enc = newEncoder(out);
+    if (!enc)
+        return HUFF_ERR_NOMEM;
+    writePreamble(out, CONTAINER_ADAPTIVE, FORMAT_FLAG_CHECKSUM);
+
+    uint64_t start = monotonicNs(), flushNs = out->flushNs;
+    struct Checksum sum;
+    checksumInit(&sum);
+    int status = HUFF_OK;
+    for (size_t i = 0; i < size;) {
+        size_t n = size - i > PROGRESS_INTERVAL ? PROGRESS_INTERVAL : size - i;
+        encodeBytes(enc, in + i, n, stats);
+        checksumUpdate(&sum, in + i, n);
+        i += n;
+        setProgress(options, i);
+        if (isCanceled(options)) {
+            status = HUFF_ERR_CANCELED;
+            break;
+        }
+    }
+    if (status == HUFF_OK)
+        finishEncoder(enc, stats, &sum);
+    free(enc);
+    if (stats)
+        stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - start - (out->flushNs - flushNs);
+    return status == HUFF_OK ? sinkStatus(out) : status;
+}
+
+int encodeAdaptiveStream(FILE* in, const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct HuffmanStats* stats = options->stats;
+    struct AdaptiveEncoder* enc = newEncoder(out);
+    unsigned char* buffer = malloc(ADAPTIVE_CHUNK);
+    if (!enc || !buffer) {
+        free(enc);
+        free(buffer);
+        return HUFF_ERR_NOMEM;
+    }
+    writePreamble(out, CONTAINER_ADAPTIVE, FORMAT_FLAG_CHECKSUM);
+
+    uint64_t consumed = 0, readNs = 0, codeNs = 0;
+    struct Checksum sum;
+    checksumInit(&sum);
+    int status = flushOutput(out);
+    while (status == HUFF_OK) {
+        uint64_t start = monotonicNs();
+        long n = readAvailable(in, buffer, ADAPTIVE_CHUNK);
+        uint64_t received = monotonicNs();
+        readNs += received - start;
+        if (n <= 0) {
+            status = n < 0 ? HUFF_ERR_IO : HUFF_OK;
+            break;
+        }
+        encodeBytes(enc, buffer, (size_t)n, stats);
+        checksumUpdate(&sum, buffer, (size_t)n);
+        // A short read means the writer has paused: let the reader see all of it now
+        if (n < ADAPTIVE_CHUNK)
+            syncEncoder(enc);
+        else
+            bitWriterDrain(&enc->writer);
+        codeNs += monotonicNs() - received;
+        consumed += (uint64_t)n;
+        setProgress(options, consumed);
+        if (isCanceled(options))
+            status = HUFF_ERR_CANCELED;
+        else
+            status = flushOutput(out);
+    }
+    if (status == HUFF_OK)
+        finishEncoder(enc, stats, &sum);
+    free(enc);
+    free(buffer);
+    if (stats) {
+        stats->inputSize = consumed;
+        stats->phaseNs[HUFF_PHASE_READ] += readNs;
+        stats->phaseNs[HUFF_PHASE_CODE] += codeNs;
+    }
+    return status == HUFF_OK ? sinkStatus(out) : status;
+}
+
+/*
+ * Bits for the decoder, from memory or refilled from a stream.  Positions
+ * are counted from the start of the file for progress reports.
+ */
+struct BitSource {
+    const unsigned char* data;
+    size_t size;
+    size_t pos;
+    FILE* file;                // refills `data` when not NULL
+    unsigned char* buffer;
+    uint64_t consumed;         // file bytes before `data`
+    uint64_t nextReport;
+    uint64_t readNs;
+    unsigned byte;
+    unsigned bits;             // unread bits left in `byte`
+};
+
+static int refill(struct BitSource* src, const struct HuffmanOptions* options, struct ByteSink* out) {
+    // A buffer that is not refilled ended before the end-of-stream symbol
+    if (!src->file)
+        return HUFF_ERR_FORMAT;
+    // Whatever was decoded so far goes out before waiting for more input
+    int status = flushOutput(out);
+    if (status != HUFF_OK)
+        return status;
+    if (isCanceled(options))
+        return HUFF_ERR_CANCELED;
+
+    uint64_t start = monotonicNs();
+    long n = readAvailable(src->file, src->buffer, ADAPTIVE_CHUNK);
+    src->readNs += monotonicNs() - start;
+    if (n <= 0)
+        return n < 0 ? HUFF_ERR_IO : HUFF_ERR_FORMAT;
+    src->consumed += src->size;
+    src->data = src->buffer;
+    src->size = (size_t)n;
+    src->pos = 0;
+    return HUFF_OK;
+}
+
+// Next bit (0 or 1), or a negative status
+static inline int readBit(struct BitSource* src, const struct HuffmanOptions* options, struct ByteSink* out) {
+    if (src->bits == 0) {
+        if (src->pos == src->size) {
+            int status = refill(src, options, out);
+            if (status != HUFF_OK)
+                return status;
+        }
+        src->byte = src->data[src->pos++];
+        src->bits = 8;
+    }
+    src->bits--;
+    return (src->byte >> src->bits) & 1;
+}
+
+static int decodeSymbols(struct BitSource* src, const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct AdaptiveTree tree;
+    struct AdaptiveTree* t = &tree;
+    treeInit(t);
+
+    for (;;) {
+        int node = ADAPTIVE_ROOT;
+        while (t->symbol[node] == NODE_INTERNAL) {
+            int bit = readBit(src, options, out);
+            if (bit < 0)
+                return bit;
+            node = bit ? t->right[node] : t->left[node];
+        }
+
+        int symbol = t->symbol[node];
+        if (symbol == NODE_NYT) {
+            symbol = 0;
+            for (int i = 0; i < ADAPTIVE_SYMBOL_BITS; i++) {
+                int bit = readBit(src, options, out);
+                if (bit < 0)
+                    return bit;
+                symbol = (symbol << 1) | bit;
+            }
+            if (symbol == ADAPTIVE_EOF)
+                return HUFF_OK;
+            if (symbol == ADAPTIVE_SYNC) {
+                src->bits = 0;
+                continue;
+            }
+            if (symbol > 255 || t->leaf[symbol] >= 0)
+                return HUFF_ERR_FORMAT;
+            node = treeAdd(t, symbol);
+        }
+        sinkPutByte(out, (unsigned char)symbol);
+        treeUpdate(t, node);
+
+        uint64_t position = src->consumed + src->pos;
+        if (position >= src->nextReport) {
+            src->nextReport = position + PROGRESS_INTERVAL;
+            setProgress(options, position);
+            if (isCanceled(options))
+                return HUFF_ERR_CANCELED;
+        }
+    }
+}
+
+/*
+ * After the end-of-stream symbol only the padding of its last byte may
+ * follow, then the checksum if the preamble announced one.  Checks it
+ * against the checksum of the output, started by the caller.
+ */
+static int checkEnd(struct BitSource* src, int checksum, struct ByteSink* out) {
+    unsigned char trailer[FORMAT_CHECKSUM_SIZE];
+    size_t want = checksum ? FORMAT_CHECKSUM_SIZE : 0, have = 0;
+    for (;;) {
+        size_t n = src->size - src->pos;
+        if (n > want - have)
+            return HUFF_ERR_FORMAT;
+        memcpy(trailer + have, src->data + src->pos, n);
+        have += n;
+        src->pos = src->size;
+        if (!src->file)
+            break;
+        long read = readAvailable(src->file, src->buffer, ADAPTIVE_CHUNK);
+        if (read < 0)
+            return HUFF_ERR_IO;
+        if (read == 0)
+            break;
+        src->consumed += src->size;
+        src->data = src->buffer;
+        src->size = (size_t)read;
+        src->pos = 0;
+    }
+    if (have != want)
+        return HUFF_ERR_FORMAT;
+    if (checksum && sinkChecksum(out) != readU64(trailer))
+        return HUFF_ERR_CHECKSUM;
+    return HUFF_OK;
+}
+
+int decodeAdaptive(const unsigned char* in, size_t size, size_t pos, uint8_t flags,
+                   const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct HuffmanStats* stats = options->stats;
+    if (pos > size)
+        return HUFF_ERR_FORMAT;
+    struct BitSource src = {in + pos, size - pos, 0, NULL, NULL, pos, 0, 0, 0, 0};
+
+    uint64_t start = monotonicNs(), flushNs = out->flushNs;
+    sinkStartChecksum(out);
+    int status = decodeSymbols(&src, options, out);
+    if (status == HUFF_OK)
+        status = checkEnd(&src, flags & FORMAT_FLAG_CHECKSUM, out);
+    if (stats)
+        stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - start - (out->flushNs - flushNs);
+    return status == HUFF_OK ? sinkStatus(out) : status;
+}
+
+int decodeAdaptiveStream(FILE* in, uint8_t flags, const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct HuffmanStats* stats = options->stats;
+    unsigned char* buffer = malloc(ADAPTIVE_CHUNK);
+    if (!buffer)
+        return HUFF_ERR_NOMEM;
+    struct BitSource src = {buffer, 0, 0, in, buffer, FORMAT_PREAMBLE_SIZE, 0, 0, 0, 0};
+
+    uint64_t start = monotonicNs(), flushNs = out->flushNs;
+    sinkStartChecksum(out);
+    int status = decodeSymbols(&src, options, out);
+    if (status == HUFF_OK)
+        status = checkEnd(&src, flags & FORMAT_FLAG_CHECKSUM, out);
+    free(buffer);
+    if (stats) {
+        stats->inputSize = src.consumed + src.size;
+        stats->phaseNs[HUFF_PHASE_READ] += src.readNs;
+        stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - start - src.readNs - (out->flushNs - flushNs);
+    }
+    if (status == HUFF_OK)
+        setProgress(options, src.consumed + src.size);
+    return status == HUFF_OK ? sinkStatus(out) : status;
+}
@@ -0,0 +1,292 @@
+#define _POSIX_C_SOURCE 200809L
+
+#include <dirent.h>
+#include <errno.h>
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+#include "batch.h"
+#include "blocks.h"
+#include "stats.h"
+
+#ifdef _WIN32
+#include <direct.h>
+#define makeDirectory(path) _mkdir(path)
+#define isSeparator(c) ((c) == '/' || (c) == '\\')
+#else
+#define makeDirectory(path) mkdir(path, 0777)
+#define isSeparator(c) ((c) == '/')
+#endif
+
+#define COMPRESSED_SUFFIX ".huff"
+#define DECOMPRESSED_SUFFIX ".out"
+
+static char* joinPath(const char* dir, const char* name, const char* suffix) {
+    size_t dirLen = strlen(dir), nameLen = strlen(name), suffixLen = strlen(suffix);
+    int separator = dirLen > 0 && !isSeparator(dir[dirLen - 1]);
+    char* path = malloc(dirLen + separator + nameLen + suffixLen + 1);
+    if (!path)
+        return NULL;
+    memcpy(path, dir, dirLen);
+    if (separator)
+        path[dirLen] = '/';
+    memcpy(path + dirLen + separator, name, nameLen);
+    memcpy(path + dirLen + separator + nameLen, suffix, suffixLen + 1);
+    return path;
+}
+
+static const char* baseName(const char* path) {
+    const char* base = path;
+    for (const char* p = path; *p; p++) {
+        if (isSeparator(*p))
+            base = p + 1;
+    }
+    return base;
+}
+
+// Output path for `input`: name plus ".huff" when compressing, minus it when decompressing
+static char* outputPath(const char* outputDir, const char* input, int compress) {
+    const char* name = baseName(input);
+    if (compress)
+        return joinPath(outputDir, name, COMPRESSED_SUFFIX);
+
+    size_t nameLen = strlen(name), suffixLen = strlen(COMPRESSED_SUFFIX);
+    if (nameLen <= suffixLen || strcmp(name + nameLen - suffixLen, COMPRESSED_SUFFIX) != 0)
+        return joinPath(outputDir, name, DECOMPRESSED_SUFFIX);
+    char* stem = malloc(nameLen - suffixLen + 1);
+    if (!stem)
+        return NULL;
+    memcpy(stem, name, nameLen - suffixLen);
+    stem[nameLen - suffixLen] = '\0';
+    char* path = joinPath(outputDir, stem, "");
+    free(stem);
+    return path;
+}
+
+static int addJob(struct Batch* batch, const char* input, uint64_t size, int compress, const char* outputDir) {
+    if (batch->count == batch->capacity) {
+        size_t capacity = batch->capacity ? batch->capacity * 2 : 64;
+        struct BatchJob* grown = realloc(batch->jobs, capacity * sizeof(*grown));
+        if (!grown)
+            return HUFF_ERR_NOMEM;
+        batch->jobs = grown;
+        batch->capacity = capacity;
+    }
+    struct BatchJob* job = &batch->jobs[batch->count];
+    memset(job, 0, sizeof(*job));
+    job->input = malloc(strlen(input) + 1);
+    job->output = outputPath(outputDir, input, compress);
+    if (!job->input || !job->output) {
+        free(job->input);
+        free(job->output);
+        return HUFF_ERR_NOMEM;
+    }
+    strcpy(job->input, input);
+    job->size = size;
+    batch->count++;
+    batch->totalSize += size;
+    return HUFF_OK;
+}
+
+// Regular files directly inside `dir`; subdirectories are skipped
+static int addDirectory(struct Batch* batch, const char* dir, int compress, const char* outputDir) {
+    DIR* handle = opendir(dir);
+    if (!handle) {
+        fprintf(stderr, "Error: Cannot read directory '%s'\n", dir);
+        return HUFF_ERR_IO;
+    }
+    int status = HUFF_OK;
+    struct dirent* entry;
+    while (status == HUFF_OK && (entry = readdir(handle)) != NULL) {
+        char* path = joinPath(dir, entry->d_name, "");
+        if (!path) {
+            status = HUFF_ERR_NOMEM;
+            break;
+        }
+        struct stat st;
+        if (stat(path, &st) == 0 && S_ISREG(st.st_mode))
+            status = addJob(batch, path, (uint64_t)st.st_size, compress, outputDir);
+        free(path);
+    }
+    closedir(handle);
+    return status;
+}
+
+// A path that cannot be opened still becomes a job, so it is reported with the other failures
+static int addPath(struct Batch* batch, const char* path, int compress, const char* outputDir) {
+    struct stat st;
+    if (stat(path, &st) != 0)
+        return addJob(batch, path, 0, compress, outputDir);
+    if (S_ISDIR(st.st_mode))
+        return addDirectory(batch, path, compress, outputDir);
+    return addJob(batch, path, S_ISREG(st.st_mode) ? (uint64_t)st.st_size : 0, compress, outputDir);
+}
+
+// One path per line; blank lines are ignored and trailing CR/LF stripped
+static int addList(struct Batch* batch, const char* listFile, int compress, const char* outputDir) {
+    FILE* list = strcmp(listFile, "-") == 0 ? stdin : fopen(listFile, "r");
+    if (!list) {
+        fprintf(stderr, "Error: Cannot open file list '%s'\n", listFile);
+        return HUFF_ERR_IO;
+    }
+    int status = HUFF_OK;
+    char line[4096];
+    while (status == HUFF_OK && fgets(line, sizeof(line), list)) {
+        size_t len = strcspn(line, "\r\n");
+        line[len] = '\0';
+        if (len > 0)
+            status = addPath(batch, line, compress, outputDir);
+    }
+    if (status == HUFF_OK && ferror(list))
+        status = HUFF_ERR_IO;
+    if (list != stdin)
+        fclose(list);
+    return status;
+}
+
+static int compareSize(const void* a, const void* b) {
+    const struct BatchJob* x = a;
+    const struct BatchJob* y = b;
+    if (x->size != y->size)
+        return x->size < y->size ? 1 : -1;
+    return strcmp(x->input, y->input);
+}
+
+static int compareOutput(const void* a, const void* b) {
+    const struct BatchJob* const* x = a;
+    const struct BatchJob* const* y = b;
+    return strcmp((*x)->output, (*y)->output);
+}
+
+// Two inputs with the same file name would silently overwrite each other's output
+static int checkOutputs(const struct Batch* batch) {
+    const struct BatchJob** sorted = malloc(batch->count * sizeof(*sorted));
+    if (!sorted)
+        return HUFF_ERR_NOMEM;
+    for (size_t i = 0; i < batch->count; i++)
+        sorted[i] = &batch->jobs[i];
+    qsort(sorted, batch->count, sizeof(*sorted), compareOutput);
+    int status = HUFF_OK;
+    for (size_t i = 1; i < batch->count; i++) {
+        if (strcmp(sorted[i - 1]->output, sorted[i]->output) == 0) {
+            fprintf(stderr, "Error: '%s' and '%s' would both be written to '%s'\n",
+                    sorted[i - 1]->input, sorted[i]->input, sorted[i]->output);
+            status = HUFF_ERR_ARG;
+            break;
+        }
+    }
+    free(sorted);
+    return status;
+}
+
+int loadBatch(struct Batch* batch, int compress, const char* outputDir, char* inputs[], int count) {
+    memset(batch, 0, sizeof(*batch));
+    if (makeDirectory(outputDir) != 0 && errno != EEXIST) {
+        fprintf(stderr, "Error: Cannot create output directory '%s'\n", outputDir);
+        return HUFF_ERR_IO;
+    }
+
+    int status = HUFF_OK;
+    for (int i = 0; i < count && status == HUFF_OK; i++) {
+        if (inputs[i][0] == '@')
+            status = addList(batch, inputs[i] + 1, compress, outputDir);
+        else
+            status = addPath(batch, inputs[i], compress, outputDir);
+    }
+    if (status == HUFF_OK && batch->count > 1) {
+        qsort(batch->jobs, batch->count, sizeof(*batch->jobs), compareSize);
+        status = checkOutputs(batch);
+    }
+    if (status != HUFF_OK)
+        freeBatch(batch);
+    return status;
+}
+
+struct BatchPool {
+    pthread_mutex_t lock;
+    struct Batch* batch;
+    size_t next;
+    uint64_t done;
+    BatchRun run;
+    const struct HuffmanOptions* options;
+};
+
+static void* batchWorker(void* arg) {
+    struct BatchPool* pool = arg;
+    struct HuffmanOptions options = *pool->options;
+    options.progress = NULL;
+
+    pthread_mutex_lock(&pool->lock);
+    while (pool->next < pool->batch->count) {
+        struct BatchJob* job = &pool->batch->jobs[pool->next++];
+        if (isCanceled(pool->options)) {
+            job->status = HUFF_ERR_CANCELED;
+            continue;
+        }
+        pthread_mutex_unlock(&pool->lock);
+
+        options.stats = &job->stats;
+        job->status = pool->run(job->input, job->output, &options);
+
+        pthread_mutex_lock(&pool->lock);
+        pool->done += job->size;
+        setProgress(pool->options, pool->done);
+    }
+    pthread_mutex_unlock(&pool->lock);
+    return NULL;
+}
+
+size_t runBatch(struct Batch* batch, BatchRun run, unsigned workers, const struct HuffmanOptions* options,
+                struct HuffmanStats* total) {
+    uint64_t start = monotonicNs();
+    struct BatchPool pool = {.batch = batch, .run = run, .options = options};
+    pthread_mutex_init(&pool.lock, NULL);
+    setProgress(options, 0);
+
+    workers = resolveThreads(workers);
+    if (workers > batch->count)
+        workers = batch->count ? (unsigned)batch->count : 1;
+    pthread_t* threads = malloc(workers * sizeof(*threads));
+    unsigned started = 0;
+    while (threads && started < workers && pthread_create(&threads[started], NULL, batchWorker, &pool) == 0)
+        started++;
+    // Without any helper threads the jobs still run, just one at a time
+    if (started == 0)
+        batchWorker(&pool);
+    for (unsigned i = 0; i < started; i++)
+        pthread_join(threads[i], NULL);
+    free(threads);
+    pthread_mutex_destroy(&pool.lock);
+
+    size_t failed = 0;
+    if (total)
+        memset(total, 0, sizeof(*total));
+    for (size_t i = 0; i < batch->count; i++) {
+        const struct BatchJob* job = &batch->jobs[i];
+        if (job->status != HUFF_OK) {
+            failed += job->status != HUFF_ERR_CANCELED;
+            continue;
+        }
+        if (total) {
+            total->inputSize += job->stats.inputSize;
+            total->outputSize += job->stats.outputSize;
+            mergeStats(total, &job->stats);
+        }
+    }
+    if (total) {
+        total->totalNs = monotonicNs() - start;
+        finishStats(total);
+    }
+    return failed;
+}
+
+void freeBatch(struct Batch* batch) {
+    for (size_t i = 0; i < batch->count; i++) {
+        free(batch->jobs[i].input);
+        free(batch->jobs[i].output);
+    }
+    free(batch->jobs);
+    memset(batch, 0, sizeof(*batch));
+}
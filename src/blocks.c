@@ -0,0 +1,776 @@
+#define _POSIX_C_SOURCE 200809L
+
+#include <pthread.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include "blocks.h"
+#include "codec.h"
+#include "format.h"
+#include "fileio.h"
+#include "stats.h"
+
+// Blocks in flight per worker; bounds memory while keeping every worker busy
+#define BLOCKS_PER_THREAD 4
+
+struct BlockJob {
+    const unsigned char* data;
+    size_t size;
+    struct ByteSink out;
+    int status;
+    int done;
+    struct HuffmanStats stats;
+    uint64_t inputEnd;    // input position just past this block, for progress
+    // Streaming only: the slot's own copy of its block, reused from block to block
+    unsigned char* buffer;
+    size_t bufferCapacity;
+    // Decompression only: where the decoded block goes, and whether its payload ends in a checksum
+    int checksum;
+    uint32_t rawSize;
+    uint64_t offset;
+    FILE* file;
+    unsigned char* region;
+};
+
+struct BlockEntry {
+    uint64_t offset;
+    uint32_t payloadSize;
+    uint32_t rawSize;
+};
+
+// Index entries collected while writing; grows because a stream's block count is unknown
+struct BlockIndex {
+    struct BlockEntry* entries;
+    size_t count;
+    size_t capacity;
+    uint64_t rawTotal;
+};
+
+// A stream read front to back, with the bytes it gave and the time spent waiting for them
+struct StreamReader {
+    FILE* file;
+    uint64_t consumed;
+    uint64_t readNs;
+};
+
+/*
+ * Where the compressor gets its blocks: consecutive slices of an input
+ * already in memory, or reads from `reader` into each job's own buffer,
+ * so a pipe never needs more than one block per job slot in memory.
+ */
+struct BlockSource {
+    const unsigned char* data;
+    size_t size;
+    size_t offset;
+    struct StreamReader* reader;
+    size_t blockSize;
+    int status;
+};
+
+typedef void (*BlockWork)(struct BlockJob* job, const struct HuffmanOptions* options);
+
+/*
+ * Fixed pool of workers fed through a ring of `window` job slots.  The
+ * submitting thread fills slots in block order and collects finished jobs
+ * in the same order, so output stays sequential while blocks are coded
+ * concurrently.
+ */
+struct BlockPool {
+    pthread_mutex_t lock;
+    pthread_cond_t ready;
+    pthread_cond_t finished;
+    struct BlockJob* jobs;
+    size_t window;
+    size_t submitted;
+    size_t taken;
+    int stopping;
+    BlockWork work;
+    const struct HuffmanOptions* options;
+    pthread_t* workers;
+    unsigned workerCount;
+};
+
+unsigned resolveThreads(unsigned threads) {
+    if (threads)
+        return threads;
+#ifdef _SC_NPROCESSORS_ONLN
+    long online = sysconf(_SC_NPROCESSORS_ONLN);
+    if (online > 0)
+        return (unsigned)online;
+#endif
+    return 1;
+}
+
+static void* blockWorker(void* arg) {
+    struct BlockPool* pool = arg;
+    pthread_mutex_lock(&pool->lock);
+    for (;;) {
+        while (pool->taken == pool->submitted && !pool->stopping)
+            pthread_cond_wait(&pool->ready, &pool->lock);
+        if (pool->taken == pool->submitted)
+            break;
+        struct BlockJob* job = &pool->jobs[pool->taken++ % pool->window];
+        pthread_mutex_unlock(&pool->lock);
+
+        pool->work(job, pool->options);
+
+        pthread_mutex_lock(&pool->lock);
+        job->done = 1;
+        pthread_cond_broadcast(&pool->finished);
+    }
+    pthread_mutex_unlock(&pool->lock);
+    return NULL;
+}
+
+static int startPool(struct BlockPool* pool, unsigned threads, BlockWork work,
+                     const struct HuffmanOptions* options) {
+    memset(pool, 0, sizeof(*pool));
+    pool->window = (size_t)threads * BLOCKS_PER_THREAD;
+    pool->work = work;
+    pool->options = options;
+    pool->jobs = calloc(pool->window, sizeof(struct BlockJob));
+    pool->workers = malloc(threads * sizeof(pthread_t));
+    if (!pool->jobs || !pool->workers) {
+        free(pool->jobs);
+        free(pool->workers);
+        return HUFF_ERR_NOMEM;
+    }
+    pthread_mutex_init(&pool->lock, NULL);
+    pthread_cond_init(&pool->ready, NULL);
+    pthread_cond_init(&pool->finished, NULL);
+    for (; pool->workerCount < threads; pool->workerCount++)
+        if (pthread_create(&pool->workers[pool->workerCount], NULL, blockWorker, pool) != 0)
+            break;
+    return pool->workerCount ? HUFF_OK : HUFF_ERR_NOMEM;
+}
+
+// Slot for block `index`; only valid once the job that used it before has been collected
+static struct BlockJob* poolSlot(struct BlockPool* pool, size_t index) {
+    return &pool->jobs[index % pool->window];
+}
+
+static void poolSubmit(struct BlockPool* pool) {
+    pthread_mutex_lock(&pool->lock);
+    pool->jobs[pool->submitted % pool->window].done = 0;
+    pool->submitted++;
+    pthread_cond_signal(&pool->ready);
+    pthread_mutex_unlock(&pool->lock);
+}
+
+static struct BlockJob* poolWait(struct BlockPool* pool, size_t index) {
+    struct BlockJob* job = poolSlot(pool, index);
+    pthread_mutex_lock(&pool->lock);
+    while (!job->done)
+        pthread_cond_wait(&pool->finished, &pool->lock);
+    pthread_mutex_unlock(&pool->lock);
+    return job;
+}
+
+static void stopPool(struct BlockPool* pool) {
+    pthread_mutex_lock(&pool->lock);
+    pool->stopping = 1;
+    pthread_cond_broadcast(&pool->ready);
+    pthread_mutex_unlock(&pool->lock);
+    for (unsigned i = 0; i < pool->workerCount; i++)
+        pthread_join(pool->workers[i], NULL);
+    pthread_cond_destroy(&pool->ready);
+    pthread_cond_destroy(&pool->finished);
+    pthread_mutex_destroy(&pool->lock);
+    free(pool->workers);
+    free(pool->jobs);
+}
+
+static size_t readStream(struct StreamReader* reader, void* buffer, size_t len) {
+    uint64_t start = monotonicNs();
+    size_t n = fread(buffer, 1, len, reader->file);
+    reader->readNs += monotonicNs() - start;
+    reader->consumed += n;
+    return n;
+}
+
+/*
+ * Options for coding one block: its counters go to the job, and progress
+ * is left to the collector, which knows where the block sits in the input.
+ */
+static struct HuffmanOptions blockOptions(const struct HuffmanOptions* options, struct HuffmanStats* stats) {
+    struct HuffmanOptions local = *options;
+    local.stats = stats;
+    local.progress = NULL;
+    return local;
+}
+
+// Make sure `job` owns a buffer of at least `size` bytes
+static int reserveBuffer(struct BlockJob* job, size_t size) {
+    if (job->bufferCapacity >= size)
+        return HUFF_OK;
+    unsigned char* buffer = realloc(job->buffer, size);
+    if (!buffer)
+        return HUFF_ERR_NOMEM;
+    job->buffer = buffer;
+    job->bufferCapacity = size;
+    return HUFF_OK;
+}
+
+// Point `job` at the next block; returns 0 at the end of the input or on error
+static int nextBlock(struct BlockSource* source, const struct HuffmanOptions* options, struct BlockJob* job) {
+    if (isCanceled(options)) {
+        source->status = HUFF_ERR_CANCELED;
+        return 0;
+    }
+    if (!source->reader) {
+        if (source->offset >= source->size)
+            return 0;
+        size_t left = source->size - source->offset;
+        job->data = source->data + source->offset;
+        job->size = left < source->blockSize ? left : source->blockSize;
+        source->offset += job->size;
+        return 1;
+    }
+
+    if (reserveBuffer(job, source->blockSize) != HUFF_OK) {
+        source->status = HUFF_ERR_NOMEM;
+        return 0;
+    }
+    job->data = job->buffer;
+    job->size = readStream(source->reader, job->buffer, source->blockSize);
+    if (ferror(source->reader->file)) {
+        source->status = HUFF_ERR_IO;
+        return 0;
+    }
+    return job->size != 0;
+}
+
+static void compressJob(struct BlockJob* job, const struct HuffmanOptions* options) {
+    struct HuffmanOptions local = blockOptions(options, &job->stats);
+    memset(&job->stats, 0, sizeof(job->stats));
+    sinkInitMemory(&job->out, job->size / 2 + 64);
+    job->status = job->out.error ? sinkStatus(&job->out)
+                                 : encodeCheckedStream(job->data, job->size, &local, &job->out);
+    if (job->status == HUFF_OK)
+        job->status = sinkStatus(&job->out);
+}
+
+// Append a finished block to the output and record it in the index, stats and progress
+static int writeBlock(struct ByteSink* out, struct BlockJob* job, struct BlockIndex* index,
+                      const struct HuffmanOptions* options) {
+    int status = job->status;
+    if (status == HUFF_OK && index->count == index->capacity) {
+        size_t capacity = index->capacity ? index->capacity * 2 : 64;
+        struct BlockEntry* entries = realloc(index->entries, capacity * sizeof(struct BlockEntry));
+        if (entries) {
+            index->entries = entries;
+            index->capacity = capacity;
+        } else {
+            status = HUFF_ERR_NOMEM;
+        }
+    }
+    if (status == HUFF_OK) {
+        struct BlockEntry* entry = &index->entries[index->count++];
+        entry->offset = sinkTell(out);
+        entry->payloadSize = (uint32_t)job->out.size;
+        entry->rawSize = (uint32_t)job->size;
+        writeU32(out, entry->rawSize);
+        writeU32(out, entry->payloadSize);
+        sinkWrite(out, job->out.data, job->out.size);
+        status = sinkStatus(out);
+        if (options->stats)
+            mergeStats(options->stats, &job->stats);
+        index->rawTotal += job->size;
+        setProgress(options, index->rawTotal);
+    }
+    sinkFree(&job->out);
+    return status;
+}
+
+static int compressParallel(struct BlockSource* source, unsigned threads, struct ByteSink* out,
+                            struct BlockIndex* index, const struct HuffmanOptions* options) {
+    struct BlockPool pool;
+    int status = startPool(&pool, threads, compressJob, options);
+    if (status != HUFF_OK)
+        return status;
+
+    size_t submitted = 0, collected = 0;
+    for (;;) {
+        if (submitted >= pool.window) {
+            int blockStatus = writeBlock(out, poolWait(&pool, collected), index, options);
+            if (status == HUFF_OK)
+                status = blockStatus;
+            collected++;
+        }
+        // Stop reading once something failed; the blocks in flight still drain below
+        if (status != HUFF_OK || !nextBlock(source, options, poolSlot(&pool, submitted)))
+            break;
+        poolSubmit(&pool);
+        submitted++;
+    }
+    for (; collected < submitted; collected++) {
+        int blockStatus = writeBlock(out, poolWait(&pool, collected), index, options);
+        if (status == HUFF_OK)
+            status = blockStatus;
+    }
+
+    for (size_t i = 0; i < pool.window; i++)
+        free(pool.jobs[i].buffer);
+    stopPool(&pool);
+    return status;
+}
+
+static int compressSerial(struct BlockSource* source, struct ByteSink* out, struct BlockIndex* index,
+                          const struct HuffmanOptions* options) {
+    struct BlockJob job;
+    memset(&job, 0, sizeof(job));
+    int status = HUFF_OK;
+    while (status == HUFF_OK && nextBlock(source, options, &job)) {
+        compressJob(&job, options);
+        status = writeBlock(out, &job, index, options);
+    }
+    free(job.buffer);
+    return status;
+}
+
+static int compressSource(struct BlockSource* source, unsigned threads, struct ByteSink* out,
+                          const struct HuffmanOptions* options) {
+    struct BlockIndex index = {NULL, 0, 0, 0};
+
+    writePreamble(out, CONTAINER_BLOCKS, FORMAT_FLAG_CHECKSUM);
+    writeVarint(out, source->blockSize);
+
+    int status = threads > 1 ? compressParallel(source, threads, out, &index, options)
+                             : compressSerial(source, out, &index, options);
+    if (status == HUFF_OK)
+        status = source->status;
+
+    if (status == HUFF_OK) {
+        writeU32(out, 0);
+        writeU32(out, 0);
+        uint64_t indexOffset = sinkTell(out);
+        for (size_t i = 0; i < index.count; i++) {
+            writeU64(out, index.entries[i].offset);
+            writeU32(out, index.entries[i].payloadSize);
+            writeU32(out, index.entries[i].rawSize);
+        }
+        writeU64(out, indexOffset);
+        writeU32(out, (uint32_t)index.count);
+        sinkWrite(out, BLOCK_FOOTER_MAGIC, 4);
+        status = sinkStatus(out);
+    }
+    free(index.entries);
+    return status;
+}
+
+static size_t optionBlockSize(const struct HuffmanOptions* options) {
+    return options->blockSize ? options->blockSize : HUFF_DEFAULT_BLOCK_SIZE;
+}
+
+int encodeBlocks(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                 struct ByteSink* out) {
+    struct BlockSource source = {in, size, 0, NULL, optionBlockSize(options), HUFF_OK};
+    if (source.blockSize < HUFF_MIN_BLOCK_SIZE || source.blockSize > HUFF_MAX_BLOCK_SIZE)
+        return HUFF_ERR_ARG;
+
+    size_t blockCount = (size + source.blockSize - 1) / source.blockSize;
+    unsigned threads = resolveThreads(options->threads);
+    if (threads > blockCount)
+        threads = (unsigned)(blockCount ? blockCount : 1);
+    return compressSource(&source, threads, out, options);
+}
+
+/*
+ * Compress a stream of unknown length one block at a time.  At most one
+ * block per job slot is held in memory, whatever the size of the input.
+ */
+int encodeBlockStream(FILE* in, const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct StreamReader reader = {in, 0, 0};
+    struct BlockSource source = {NULL, 0, 0, &reader, optionBlockSize(options), HUFF_OK};
+    if (source.blockSize < HUFF_MIN_BLOCK_SIZE || source.blockSize > HUFF_MAX_BLOCK_SIZE)
+        return HUFF_ERR_ARG;
+    int status = compressSource(&source, resolveThreads(options->threads), out, options);
+    if (options->stats) {
+        options->stats->inputSize = reader.consumed;
+        options->stats->phaseNs[HUFF_PHASE_READ] += reader.readNs;
+    }
+    return status;
+}
+
+// One block payload, with or without the checksum at its end
+static int decodePayload(const unsigned char* in, size_t size, int checksum, const struct HuffmanOptions* options,
+                         struct ByteSink* out) {
+    size_t pos = 0;
+    return checksum ? decodeCheckedStream(in, size, &pos, options, out) : decodeStream(in, size, &pos, options, out);
+}
+
+// Walk the blocks in file order; the index at the end is only needed for random access
+static int decodeSerial(const unsigned char* in, size_t size, size_t pos, uint64_t blockSize, int checksum,
+                        const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct HuffmanOptions local = blockOptions(options, options->stats);
+    for (;;) {
+        if (isCanceled(options))
+            return HUFF_ERR_CANCELED;
+        if (size - pos < BLOCK_HEADER_SIZE)
+            return HUFF_ERR_FORMAT;
+        uint32_t rawSize = readU32(in + pos);
+        uint32_t payloadSize = readU32(in + pos + 4);
+        pos += BLOCK_HEADER_SIZE;
+        if (rawSize == 0)
+            return payloadSize == 0 ? HUFF_OK : HUFF_ERR_FORMAT;
+        if (rawSize > blockSize || payloadSize > size - pos)
+            return HUFF_ERR_FORMAT;
+
+        uint64_t start = sinkTell(out);
+        int status = decodePayload(in + pos, payloadSize, checksum, &local, out);
+        if (status != HUFF_OK)
+            return status;
+        if (sinkTell(out) - start != rawSize)
+            return HUFF_ERR_FORMAT;
+        pos += payloadSize;
+        setProgress(options, pos);
+    }
+}
+
+/*
+ * Load the block index from the footer and check it against the block
+ * headers it points at.  The entries have to tile the data exactly, in
+ * file order, up to the end marker before the index: the block checksums
+ * do not cover the index, so a swapped or repeated entry would otherwise
+ * decode to wrong output without an error.  *total receives the
+ * decompressed size.
+ */
+static int readBlockIndex(const unsigned char* in, size_t size, size_t dataStart, uint64_t blockSize,
+                          struct BlockEntry** index, size_t* count, uint64_t* total) {
+    if (size - dataStart < BLOCK_FOOTER_SIZE)
+        return HUFF_ERR_FORMAT;
+    const unsigned char* footer = in + size - BLOCK_FOOTER_SIZE;
+    uint64_t indexOffset = readU64(footer);
+    uint32_t blockCount = readU32(footer + 8);
+    if (memcmp(footer + 12, BLOCK_FOOTER_MAGIC, 4) != 0 || indexOffset < dataStart ||
+        indexOffset > size - BLOCK_FOOTER_SIZE ||
+        (size - BLOCK_FOOTER_SIZE - indexOffset) / BLOCK_INDEX_ENTRY_SIZE != blockCount)
+        return HUFF_ERR_FORMAT;
+
+    struct BlockEntry* entries = malloc((blockCount ? blockCount : 1) * sizeof(struct BlockEntry));
+    if (!entries)
+        return HUFF_ERR_NOMEM;
+
+    uint64_t sum = 0, next = dataStart;
+    for (uint32_t i = 0; i < blockCount; i++) {
+        const unsigned char* p = in + indexOffset + (size_t)i * BLOCK_INDEX_ENTRY_SIZE;
+        struct BlockEntry* e = &entries[i];
+        e->offset = readU64(p);
+        e->payloadSize = readU32(p + 8);
+        e->rawSize = readU32(p + 12);
+        if (e->offset != next || indexOffset - e->offset < BLOCK_HEADER_SIZE + (uint64_t)e->payloadSize ||
+            readU32(in + e->offset) != e->rawSize || readU32(in + e->offset + 4) != e->payloadSize ||
+            e->rawSize == 0 || e->rawSize > blockSize) {
+            free(entries);
+            return HUFF_ERR_FORMAT;
+        }
+        next = e->offset + BLOCK_HEADER_SIZE + e->payloadSize;
+        sum += e->rawSize;
+    }
+    if (indexOffset - next != BLOCK_HEADER_SIZE || readU32(in + next) != 0 || readU32(in + next + 4) != 0) {
+        free(entries);
+        return HUFF_ERR_FORMAT;
+    }
+
+    *index = entries;
+    *count = blockCount;
+    *total = sum;
+    return HUFF_OK;
+}
+
+static void decompressJob(struct BlockJob* job, const struct HuffmanOptions* options) {
+    struct HuffmanOptions local = blockOptions(options, &job->stats);
+    memset(&job->stats, 0, sizeof(job->stats));
+    sinkInitMemory(&job->out, job->rawSize);
+    // A payload that decodes to more than its header's raw size is corrupt, however much it claims
+    job->out.limit = job->rawSize;
+    job->status = job->out.error ? sinkStatus(&job->out)
+                                 : decodePayload(job->data, job->size, job->checksum, &local, &job->out);
+    if (job->status == HUFF_OK)
+        job->status = sinkStatus(&job->out);
+    if (job->status == HUFF_ERR_LIMIT || (job->status == HUFF_OK && job->out.size != job->rawSize))
+        job->status = HUFF_ERR_FORMAT;
+    // Without a region or file the collector appends job->out in block order
+    if (job->status == HUFF_OK && !job->region && !job->file)
+        return;
+    if (job->status == HUFF_OK) {
+        if (job->region)
+            memcpy(job->region + job->offset, job->out.data, job->out.size);
+#ifdef HAVE_POSITIONAL_WRITES
+        else {
+            uint64_t start = monotonicNs();
+            job->status = writeAt(job->file, job->out.data, job->out.size, job->offset);
+            job->stats.phaseNs[HUFF_PHASE_WRITE] += monotonicNs() - start;
+        }
+#endif
+    }
+    sinkFree(&job->out);
+}
+
+// Wait for block `index` and, if it was decoded in memory, append it to the output
+static int collectDecoded(struct BlockPool* pool, size_t index, struct ByteSink* out) {
+    struct BlockJob* job = poolWait(pool, index);
+    int status = job->status;
+    if (pool->options->stats)
+        mergeStats(pool->options->stats, &job->stats);
+    if (status == HUFF_OK)
+        setProgress(pool->options, job->inputEnd);
+    if (job->region || job->file)
+        return status;
+    if (status == HUFF_OK) {
+        sinkWrite(out, job->out.data, job->out.size);
+        status = sinkStatus(out);
+    }
+    sinkFree(&job->out);
+    return status;
+}
+
+/*
+ * Decode every block on the pool straight into its final position: a
+ * region of a memory sink, or a positional write into the output file.
+ * Outputs that cannot be written at offsets (pipes, stdout) get the
+ * blocks appended in order as they finish instead.
+ */
+static int decodeParallel(const unsigned char* in, const struct BlockEntry* index, size_t blockCount,
+                          uint64_t total, unsigned threads, int checksum, const struct HuffmanOptions* options,
+                          struct ByteSink* out) {
+    unsigned char* region = NULL;
+    FILE* file = NULL;
+    uint64_t base = 0;
+    if (!out->file && !out->discard) {
+        if (total > SIZE_MAX)
+            return HUFF_ERR_NOMEM;
+        region = sinkExtend(out, (size_t)total);
+        if (!region)
+            return sinkStatus(out);
+    }
+#ifdef HAVE_POSITIONAL_WRITES
+    else if (out->file && isRegularStream(out->file)) {
+        if (sinkFlush(out) != 0)
+            return HUFF_ERR_IO;
+        base = sinkTell(out);
+        if (out->limit && total > out->limit - base)
+            return HUFF_ERR_LIMIT;
+        if (resizeFile(out->file, base + total) != HUFF_OK)
+            return HUFF_ERR_IO;
+        file = out->file;
+    }
+#endif
+
+    struct BlockPool pool;
+    int status = startPool(&pool, threads, decompressJob, options);
+    if (status != HUFF_OK)
+        return status;
+
+    uint64_t offset = base;
+    size_t submitted = 0, collected = 0;
+    for (; submitted < blockCount; submitted++) {
+        if (submitted >= pool.window) {
+            int blockStatus = collectDecoded(&pool, collected++, out);
+            if (status == HUFF_OK)
+                status = blockStatus;
+        }
+        if (status == HUFF_OK && isCanceled(options))
+            status = HUFF_ERR_CANCELED;
+        if (status != HUFF_OK)
+            break;
+        const struct BlockEntry* entry = &index[submitted];
+        struct BlockJob* job = poolSlot(&pool, submitted);
+        job->data = in + entry->offset + BLOCK_HEADER_SIZE;
+        job->size = entry->payloadSize;
+        job->inputEnd = entry->offset + BLOCK_HEADER_SIZE + entry->payloadSize;
+        job->checksum = checksum;
+        job->rawSize = entry->rawSize;
+        job->offset = region ? offset - base : offset;
+        job->file = file;
+        job->region = region;
+        offset += entry->rawSize;
+        poolSubmit(&pool);
+    }
+    for (; collected < submitted; collected++) {
+        int blockStatus = collectDecoded(&pool, collected, out);
+        if (status == HUFF_OK)
+            status = blockStatus;
+    }
+    stopPool(&pool);
+
+    // Positional writes bypassed the sink; account for them so sinkTell stays right
+    if (file)
+        out->flushed += total;
+    return status;
+}
+
+int decodeBlocks(const unsigned char* in, size_t size, size_t pos, uint8_t flags,
+                 const struct HuffmanOptions* options, struct ByteSink* out) {
+    int checksum = flags & FORMAT_FLAG_CHECKSUM;
+    uint64_t blockSize;
+    if (readVarint(in, size, &pos, &blockSize) != HUFF_OK ||
+        blockSize < HUFF_MIN_BLOCK_SIZE || blockSize > HUFF_MAX_BLOCK_SIZE)
+        return HUFF_ERR_FORMAT;
+
+    unsigned threads = resolveThreads(options->threads);
+    if (threads <= 1)
+        return decodeSerial(in, size, pos, blockSize, checksum, options, out);
+
+    struct BlockEntry* index;
+    size_t blockCount;
+    uint64_t total;
+    int status = readBlockIndex(in, size, pos, blockSize, &index, &blockCount, &total);
+    if (status != HUFF_OK)
+        return status;
+    if (threads > blockCount)
+        threads = (unsigned)(blockCount ? blockCount : 1);
+
+    status = threads > 1 ? decodeParallel(in, index, blockCount, total, threads, checksum, options, out)
+                         : decodeSerial(in, size, pos, blockSize, checksum, options, out);
+    free(index);
+    return status;
+}
+
+// LEB128, as readVarint, but pulled from a stream one byte at a time
+static int readStreamVarint(struct StreamReader* reader, uint64_t* value) {
+    uint64_t result = 0;
+    for (unsigned shift = 0; shift < 64; shift += 7) {
+        unsigned char c;
+        if (readStream(reader, &c, 1) != 1)
+            return ferror(reader->file) ? HUFF_ERR_IO : HUFF_ERR_FORMAT;
+        result |= (uint64_t)(c & 0x7f) << shift;
+        if (!(c & 0x80)) {
+            *value = result;
+            return HUFF_OK;
+        }
+    }
+    return HUFF_ERR_FORMAT;
+}
+
+/*
+ * Read the next block header and payload from `in` into the job's buffer.
+ * Returns 1 for a block, 0 at the end marker, or a negative status.
+ */
+static int readStreamBlock(struct StreamReader* reader, uint64_t blockSize, int checksum, struct BlockJob* job) {
+    unsigned char header[BLOCK_HEADER_SIZE];
+    if (readStream(reader, header, sizeof(header)) != sizeof(header))
+        return ferror(reader->file) ? HUFF_ERR_IO : HUFF_ERR_FORMAT;
+    uint32_t rawSize = readU32(header);
+    uint32_t payloadSize = readU32(header + 4);
+    if (rawSize == 0)
+        return payloadSize == 0 ? 0 : HUFF_ERR_FORMAT;
+    // Codes are at most 24 bits, so a payload beyond 3 bytes per symbol plus tables is corrupt
+    if (rawSize > blockSize || payloadSize > (uint64_t)rawSize * 3 + 1024)
+        return HUFF_ERR_FORMAT;
+    if (reserveBuffer(job, payloadSize) != HUFF_OK)
+        return HUFF_ERR_NOMEM;
+    if (readStream(reader, job->buffer, payloadSize) != payloadSize)
+        return ferror(reader->file) ? HUFF_ERR_IO : HUFF_ERR_FORMAT;
+
+    job->data = job->buffer;
+    job->size = payloadSize;
+    job->inputEnd = reader->consumed;
+    job->checksum = checksum;
+    job->rawSize = rawSize;
+    job->region = NULL;
+    job->file = NULL;
+    return 1;
+}
+
+static int decodeStreamSerial(struct StreamReader* reader, uint64_t blockSize, int checksum,
+                              const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct BlockJob job;
+    memset(&job, 0, sizeof(job));
+    int read;
+    int status = HUFF_OK;
+    while (status == HUFF_OK && (read = readStreamBlock(reader, blockSize, checksum, &job)) != 0) {
+        if (read < 0) {
+            status = read;
+            break;
+        }
+        decompressJob(&job, options);
+        if (options->stats)
+            mergeStats(options->stats, &job.stats);
+        status = job.status;
+        if (status == HUFF_OK)
+            setProgress(options, job.inputEnd);
+        if (status == HUFF_OK && isCanceled(options))
+            status = HUFF_ERR_CANCELED;
+        if (status == HUFF_OK) {
+            sinkWrite(out, job.out.data, job.out.size);
+            status = sinkStatus(out);
+        }
+        sinkFree(&job.out);
+    }
+    free(job.buffer);
+    return status;
+}
+
+static int decodeStreamParallel(struct StreamReader* reader, uint64_t blockSize, unsigned threads, int checksum,
+                                const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct BlockPool pool;
+    int status = startPool(&pool, threads, decompressJob, options);
+    if (status != HUFF_OK)
+        return status;
+
+    size_t submitted = 0, collected = 0;
+    for (;;) {
+        if (submitted >= pool.window) {
+            int blockStatus = collectDecoded(&pool, collected++, out);
+            if (status == HUFF_OK)
+                status = blockStatus;
+        }
+        if (status == HUFF_OK && isCanceled(options))
+            status = HUFF_ERR_CANCELED;
+        if (status != HUFF_OK)
+            break;
+        int read = readStreamBlock(reader, blockSize, checksum, poolSlot(&pool, submitted));
+        if (read <= 0) {
+            status = read;
+            break;
+        }
+        poolSubmit(&pool);
+        submitted++;
+    }
+    for (; collected < submitted; collected++) {
+        int blockStatus = collectDecoded(&pool, collected, out);
+        if (status == HUFF_OK)
+            status = blockStatus;
+    }
+
+    for (size_t i = 0; i < pool.window; i++)
+        free(pool.jobs[i].buffer);
+    stopPool(&pool);
+    return status;
+}
+
+/*
+ * Decode a block container from a stream positioned just after its
+ * preamble.  Blocks are read, decoded and written in order, so memory is
+ * bounded by the job window rather than by the size of the file.
+ */
+int decodeBlockStream(FILE* in, uint8_t flags, const struct HuffmanOptions* options, struct ByteSink* out) {
+    // The preamble has already been read by the caller
+    struct StreamReader reader = {in, FORMAT_PREAMBLE_SIZE, 0};
+    uint64_t blockSize;
+    int status = readStreamVarint(&reader, &blockSize);
+    if (status == HUFF_OK && (blockSize < HUFF_MIN_BLOCK_SIZE || blockSize > HUFF_MAX_BLOCK_SIZE))
+        status = HUFF_ERR_FORMAT;
+
+    if (status == HUFF_OK) {
+        int checksum = flags & FORMAT_FLAG_CHECKSUM;
+        unsigned threads = resolveThreads(options->threads);
+        status = threads > 1 ? decodeStreamParallel(&reader, blockSize, threads, checksum, options, out)
+                             : decodeStreamSerial(&reader, blockSize, checksum, options, out);
+    }
+
+    // The index and footer are only for random access; consume them so an upstream writer finishes cleanly
+    unsigned char rest[4096];
+    while (status == HUFF_OK && readStream(&reader, rest, sizeof(rest)) > 0)
+        ;
+    if (status == HUFF_OK && ferror(in))
+        status = HUFF_ERR_IO;
+    if (status == HUFF_OK)
+        setProgress(options, reader.consumed);
+    if (options->stats) {
+        options->stats->inputSize = reader.consumed;
+        options->stats->phaseNs[HUFF_PHASE_READ] += reader.readNs;
+    }
+    return status;
+}
@@ -0,0 +1,271 @@
+#include <limits.h>
+#include <stdlib.h>
+#include <string.h>
+#include "canonical.h"
+#include "huffman.h"
+
+// Symbol sets up to this size are listed byte by byte, larger ones as a bitmap
+#define SYMBOL_LIST_MAX 32
+#define LENGTH_FIELD_BITS 5
+
+// Record the depth and MSB-first code word of each leaf under `node`; returns the deepest level
+int storeCodeWords(const struct HuffmanTree* tree, int node, uint32_t code, int depth,
+                   uint8_t lengths[], uint32_t codes[]) {
+    const struct MinHeapNode* n = &tree->nodes[node];
+    if (isLeaf(n)) {
+        lengths[n->data] = (uint8_t)(depth > 255 ? 255 : depth);
+        codes[n->data] = code;
+        return depth;
+    }
+    int left = storeCodeWords(tree, n->left, code << 1, depth + 1, lengths, codes);
+    int right = storeCodeWords(tree, n->right, (code << 1) | 1, depth + 1, lengths, codes);
+    return left > right ? left : right;
+}
+
+struct RankedSymbol {
+    uint64_t weight;
+    int symbol;
+};
+
+static int compareRanked(const void* a, const void* b) {
+    const struct RankedSymbol* x = a;
+    const struct RankedSymbol* y = b;
+    if (x->weight != y->weight)
+        return x->weight < y->weight ? -1 : 1;
+    return x->symbol - y->symbol;
+}
+
+/*
+ * Optimal code lengths of at most `maxLength` bits by package-merge.  List
+ * j holds the leaves merged with pairs packaged from list j + 1; taking the
+ * 2n - 2 cheapest items of list 1 and expanding the packages back down
+ * gives each symbol one bit per list its leaf is chosen from.
+ */
+static void packageMerge(const uint64_t freq[256], unsigned maxLength, uint8_t lengths[256]) {
+    struct RankedSymbol leaves[256];
+    int n = 0;
+    for (int s = 0; s < 256; s++)
+        if (freq[s]) {
+            leaves[n].weight = freq[s];
+            leaves[n++].symbol = s;
+        }
+    qsort(leaves, n, sizeof(leaves[0]), compareRanked);
+
+    // Item weights of the list being built and the one below it; which items are leaves, per list
+    uint64_t lists[2][512];
+    uint8_t isLeaf[MAX_CODE_LEN][512];
+    int limit = 2 * n - 2, size = n;
+    uint64_t* below = lists[0];
+    for (int i = 0; i < n; i++) {
+        below[i] = leaves[i].weight;
+        isLeaf[maxLength - 1][i] = 1;
+    }
+    int sizes[MAX_CODE_LEN];
+    sizes[maxLength - 1] = n;
+
+    for (int j = (int)maxLength - 2; j >= 0; j--) {
+        uint64_t* current = lists[(maxLength - 1 - j) & 1];
+        int packages = size / 2, leaf = 0, package = 0;
+        size = 0;
+        while (size < limit && (leaf < n || package < packages)) {
+            uint64_t pair = package < packages ? below[2 * package] + below[2 * package + 1] : UINT64_MAX;
+            if (leaf < n && leaves[leaf].weight <= pair) {
+                current[size] = leaves[leaf++].weight;
+                isLeaf[j][size++] = 1;
+            } else {
+                current[size] = pair;
+                isLeaf[j][size++] = 0;
+                package++;
+            }
+        }
+        sizes[j] = size;
+        below = current;
+    }
+
+    // The chosen leaves of every list are always the lightest ones
+    uint8_t ranked[256] = {0};
+    int take = limit;
+    for (unsigned j = 0; j < maxLength && take > 0; j++) {
+        int chosen = 0;
+        for (int i = 0; i < take && i < sizes[j]; i++)
+            chosen += isLeaf[j][i];
+        for (int i = 0; i < chosen; i++)
+            ranked[i]++;
+        take = 2 * (take - chosen);
+    }
+
+    memset(lengths, 0, 256);
+    for (int i = 0; i < n; i++)
+        lengths[leaves[i].symbol] = ranked[i];
+}
+
+static uint64_t codedSize(const uint64_t freq[256], const uint8_t lengths[256]) {
+    uint64_t bits = 0;
+    for (int s = 0; s < 256; s++)
+        bits += freq[s] * lengths[s];
+    return bits;
+}
+
+/*
+ * Huffman code lengths for a histogram, at most `maxLength` bits each (0
+ * means MAX_CODE_LEN).  Counts are scaled so node weights fit the heap's
+ * 32-bit fields; a tree deeper than the limit is replaced by the optimal
+ * limited code.  Returns how many more bits the limited code spends than
+ * the unlimited one, 0 when the limit did not bite.
+ */
+uint64_t buildCodeLengths(const uint64_t freq[256], uint8_t lengths[256], unsigned maxLength) {
+    if (maxLength == 0 || maxLength > MAX_CODE_LEN)
+        maxLength = MAX_CODE_LEN;
+
+    uint64_t total = 0;
+    for (int i = 0; i < 256; i++)
+        total += freq[i];
+
+    unsigned shift = 0;
+    while ((total >> shift) > (uint64_t)INT_MAX - 256)
+        shift++;
+
+    unsigned char data[256];
+    int weights[256], count = 0;
+    for (int i = 0; i < 256; i++)
+        if (freq[i]) {
+            uint64_t w = freq[i] >> shift;
+            data[count] = (unsigned char)i;
+            weights[count++] = w ? (int)w : 1;
+        }
+
+    memset(lengths, 0, 256);
+    if (count == 0)
+        return 0;
+
+    uint32_t codes[256];
+    struct HuffmanTree tree;
+    int root = buildHuffmanTree(&tree, data, weights, count);
+    int depth = storeCodeWords(&tree, root, 0, 0, lengths, codes);
+
+    // A lone symbol still gets a one-bit code
+    if (depth == 0) {
+        lengths[tree.nodes[root].data] = 1;
+        return 0;
+    }
+    if (depth <= (int)maxLength)
+        return 0;
+
+    uint64_t unlimited = codedSize(freq, lengths);
+    packageMerge(freq, maxLength, lengths);
+    return codedSize(freq, lengths) - unlimited;
+}
+
+// Canonical codes: shorter codes first, equal lengths in symbol order
+void assignCanonicalCodes(const uint8_t lengths[256], uint32_t codes[256]) {
+    unsigned lengthCount[MAX_CODE_LEN + 1] = {0};
+    for (int s = 0; s < 256; s++)
+        if (lengths[s])
+            lengthCount[lengths[s]]++;
+
+    uint32_t next[MAX_CODE_LEN + 1];
+    uint32_t code = 0;
+    for (int len = 1; len <= MAX_CODE_LEN; len++) {
+        code = (code + lengthCount[len - 1]) << 1;
+        next[len] = code;
+    }
+    next[0] = 0;
+
+    for (int s = 0; s < 256; s++)
+        codes[s] = lengths[s] ? next[lengths[s]]++ : 0;
+}
+
+/*
+ * Code-length table layout:
+ *   u8 symbolCount - 1
+ *   symbol set: one byte per symbol if symbolCount <= 32, else a 32-byte bitmap
+ *   one 5-bit (length - 1) field per symbol in symbol order, MSB first
+ */
+void writeCodeLengths(struct ByteSink* out, const uint8_t lengths[256]) {
+    unsigned char symbols[256];
+    int count = 0;
+    for (int s = 0; s < 256; s++)
+        if (lengths[s])
+            symbols[count++] = (unsigned char)s;
+
+    sinkPutByte(out, (unsigned char)(count - 1));
+    if (count <= SYMBOL_LIST_MAX) {
+        sinkWrite(out, symbols, count);
+    } else {
+        unsigned char bitmap[32] = {0};
+        for (int i = 0; i < count; i++)
+            bitmap[symbols[i] >> 3] |= 0x80 >> (symbols[i] & 7);
+        sinkWrite(out, bitmap, sizeof(bitmap));
+    }
+
+    uint32_t acc = 0;
+    int bits = 0;
+    for (int i = 0; i < count; i++) {
+        acc = (acc << LENGTH_FIELD_BITS) | (uint32_t)(lengths[symbols[i]] - 1);
+        bits += LENGTH_FIELD_BITS;
+        while (bits >= 8) {
+            bits -= 8;
+            sinkPutByte(out, (unsigned char)(acc >> bits));
+        }
+    }
+    if (bits)
+        sinkPutByte(out, (unsigned char)(acc << (8 - bits)));
+}
+
+// Bytes writeCodeLengths() takes for a table of `symbolCount` symbols
+size_t codeLengthsSize(unsigned symbolCount) {
+    size_t symbolSet = symbolCount <= SYMBOL_LIST_MAX ? symbolCount : 32;
+    return 1 + symbolSet + (symbolCount * LENGTH_FIELD_BITS + 7) / 8;
+}
+
+int readCodeLengths(const unsigned char* in, size_t size, size_t* pos, uint8_t lengths[256]) {
+    size_t p = *pos;
+    if (p >= size)
+        return HUFF_ERR_FORMAT;
+    int count = in[p++] + 1;
+
+    unsigned char symbols[256];
+    if (count <= SYMBOL_LIST_MAX) {
+        if (size - p < (size_t)count)
+            return HUFF_ERR_FORMAT;
+        memcpy(symbols, in + p, count);
+        p += count;
+    } else {
+        if (size - p < 32)
+            return HUFF_ERR_FORMAT;
+        int found = 0;
+        for (int s = 0; s < 256; s++)
+            if (in[p + (s >> 3)] & (0x80 >> (s & 7))) {
+                if (found == count)
+                    return HUFF_ERR_FORMAT;
+                symbols[found++] = (unsigned char)s;
+            }
+        if (found != count)
+            return HUFF_ERR_FORMAT;
+        p += 32;
+    }
+
+    size_t fieldBytes = ((size_t)count * LENGTH_FIELD_BITS + 7) / 8;
+    if (size - p < fieldBytes)
+        return HUFF_ERR_FORMAT;
+
+    memset(lengths, 0, 256);
+    uint64_t kraft = 0;
+    for (int i = 0; i < count; i++) {
+        size_t bit = (size_t)i * LENGTH_FIELD_BITS;
+        unsigned window = ((unsigned)in[p + bit / 8] << 8) |
+                          (bit / 8 + 1 < fieldBytes ? in[p + bit / 8 + 1] : 0);
+        unsigned len = ((window >> (11 - bit % 8)) & 0x1f) + 1;
+        if (len > MAX_CODE_LEN || lengths[symbols[i]])
+            return HUFF_ERR_FORMAT;
+        lengths[symbols[i]] = (uint8_t)len;
+        kraft += (uint64_t)1 << (MAX_CODE_LEN - len);
+    }
+
+    // Anything but a complete prefix code means the table is corrupt
+    if (count > 1 && kraft != (uint64_t)1 << MAX_CODE_LEN)
+        return HUFF_ERR_FORMAT;
+
+    *pos = p + fieldBytes;
+    return HUFF_OK;
+}
@@ -0,0 +1,124 @@
+#include <string.h>
+#include "checksum.h"
+
+/*
+ * Four independent multiply-rotate lanes consume 32-byte stripes, so the
+ * hash runs at memory speed in portable C; a CRC-32 needs table lookups
+ * per byte or carry-less multiply instructions to come close.
+ */
+#define PRIME1 0x9e3779b185ebca87u
+#define PRIME2 0xc2b2ae3d27d4eb4fu
+#define PRIME3 0x165667b19e3779f9u
+#define PRIME4 0x85ebca77c2b2ae63u
+#define PRIME5 0x27d4eb2f165667c5u
+
+static uint64_t rotl(uint64_t x, int r) {
+    return (x << r) | (x >> (64 - r));
+}
+
+// Little-endian loads, whatever the host
+static uint64_t load64(const unsigned char* p) {
+    return (uint64_t)p[0] | (uint64_t)p[1] << 8 | (uint64_t)p[2] << 16 | (uint64_t)p[3] << 24 |
+           (uint64_t)p[4] << 32 | (uint64_t)p[5] << 40 | (uint64_t)p[6] << 48 | (uint64_t)p[7] << 56;
+}
+
+static uint32_t load32(const unsigned char* p) {
+    return (uint32_t)p[0] | (uint32_t)p[1] << 8 | (uint32_t)p[2] << 16 | (uint32_t)p[3] << 24;
+}
+
+static uint64_t round64(uint64_t lane, uint64_t input) {
+    lane += input * PRIME2;
+    return rotl(lane, 31) * PRIME1;
+}
+
+static uint64_t mergeLane(uint64_t hash, uint64_t lane) {
+    hash ^= round64(0, lane);
+    return hash * PRIME1 + PRIME4;
+}
+
+static const unsigned char* consumeStripes(uint64_t lanes[4], const unsigned char* p, size_t stripes) {
+    uint64_t v1 = lanes[0], v2 = lanes[1], v3 = lanes[2], v4 = lanes[3];
+    for (; stripes > 0; stripes--, p += 32) {
+        v1 = round64(v1, load64(p));
+        v2 = round64(v2, load64(p + 8));
+        v3 = round64(v3, load64(p + 16));
+        v4 = round64(v4, load64(p + 24));
+    }
+    lanes[0] = v1;
+    lanes[1] = v2;
+    lanes[2] = v3;
+    lanes[3] = v4;
+    return p;
+}
+
+void checksumInit(struct Checksum* sum) {
+    sum->lanes[0] = PRIME1 + PRIME2;
+    sum->lanes[1] = PRIME2;
+    sum->lanes[2] = 0;
+    sum->lanes[3] = 0 - PRIME1;
+    sum->total = 0;
+    sum->pendingSize = 0;
+}
+
+void checksumUpdate(struct Checksum* sum, const void* data, size_t size) {
+    const unsigned char* p = data;
+    sum->total += size;
+    if (sum->pendingSize) {
+        size_t n = 32 - sum->pendingSize < size ? 32 - sum->pendingSize : size;
+        memcpy(sum->pending + sum->pendingSize, p, n);
+        sum->pendingSize += (unsigned)n;
+        p += n;
+        size -= n;
+        if (sum->pendingSize < 32)
+            return;
+        consumeStripes(sum->lanes, sum->pending, 1);
+        sum->pendingSize = 0;
+    }
+    p = consumeStripes(sum->lanes, p, size / 32);
+    sum->pendingSize = (unsigned)(size % 32);
+    memcpy(sum->pending, p, sum->pendingSize);
+}
+
+uint64_t checksumDigest(const struct Checksum* sum) {
+    const uint64_t* v = sum->lanes;
+    uint64_t hash;
+    if (sum->total >= 32) {
+        hash = rotl(v[0], 1) + rotl(v[1], 7) + rotl(v[2], 12) + rotl(v[3], 18);
+        for (int i = 0; i < 4; i++)
+            hash = mergeLane(hash, v[i]);
+    } else {
+        hash = PRIME5;   // plus the seed, 0
+    }
+    hash += sum->total;
+
+    const unsigned char* p = sum->pending;
+    size_t left = sum->pendingSize;
+    for (; left >= 8; p += 8, left -= 8) {
+        hash ^= round64(0, load64(p));
+        hash = rotl(hash, 27) * PRIME1 + PRIME4;
+    }
+    if (left >= 4) {
+        hash ^= (uint64_t)load32(p) * PRIME1;
+        hash = rotl(hash, 23) * PRIME2 + PRIME3;
+        p += 4;
+        left -= 4;
+    }
+    for (; left > 0; p++, left--) {
+        hash ^= *p * PRIME5;
+        hash = rotl(hash, 11) * PRIME1;
+    }
+
+    hash ^= hash >> 33;
+    hash *= PRIME2;
+    hash ^= hash >> 29;
+    hash *= PRIME3;
+    hash ^= hash >> 32;
+    return hash;
+}
+
+uint64_t checksumOf(const void* data, size_t size) {
+    struct Checksum sum;
+    checksumInit(&sum);
+    checksumUpdate(&sum, data, size);
+    return checksumDigest(&sum);
+}
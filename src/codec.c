@@ -0,0 +1,288 @@
+#include <math.h>
+#include <stdlib.h>
+#include <string.h>
+#include "codec.h"
+#include "bitio.h"
+#include "canonical.h"
+#include "checksum.h"
+#include "context.h"
+#include "decoder.h"
+#include "dictionary.h"
+#include "format.h"
+#include "huffman.h"
+#include "stats.h"
+#include "tablecache.h"
+
+// Bytes counted (and hashed) at a time, small enough to still be in cache for the hash
+#define COUNT_SLICE ((size_t)64 << 10)
+
+// Byte histogram; four interleaved tables keep repeated bytes from stalling on one counter
+void countSymbols(const unsigned char* in, size_t size, uint64_t freq[256], struct Checksum* sum) {
+    uint32_t counts[4][256] = {{0}};
+    memset(freq, 0, 256 * sizeof(uint64_t));
+    size_t i = 0, folded = 0;
+    while (i < size) {
+        size_t start = i, end = size - i > COUNT_SLICE ? i + COUNT_SLICE : size;
+        for (; i + 4 <= end; i += 4) {
+            counts[0][in[i]]++;
+            counts[1][in[i + 1]]++;
+            counts[2][in[i + 2]]++;
+            counts[3][in[i + 3]]++;
+        }
+        for (; i < end; i++)
+            counts[0][in[i]]++;
+        if (sum)
+            checksumUpdate(sum, in + start, end - start);
+        // Flush before the 32-bit counters could overflow
+        if (i == size || i - folded >= ((size_t)1 << 31)) {
+            for (int s = 0; s < 256; s++) {
+                freq[s] += (uint64_t)counts[0][s] + counts[1][s] + counts[2][s] + counts[3][s];
+                counts[0][s] = counts[1][s] = counts[2][s] = counts[3][s] = 0;
+            }
+            folded = i;
+        }
+    }
+}
+
+int worthCoding(uint64_t size, uint64_t codedBits) {
+    return codedBits < 8 * (size - size / STORED_MIN_SAVING);
+}
+
+// Bits no Huffman code of `freq` can go below: the entropy plus the code-length table
+static uint64_t entropyBound(const uint64_t freq[256], size_t size, unsigned symbols) {
+    double bits = 0;
+    for (int s = 0; s < 256; s++)
+        if (freq[s])
+            bits += (double)freq[s] * log2((double)size / (double)freq[s]);
+    return (uint64_t)bits + 8 * (uint64_t)codeLengthsSize(symbols);
+}
+
+// Copy `size` bytes to `out` in progress intervals; progress counts from `base` within the caller's input
+static int copyStored(const unsigned char* in, size_t size, size_t base, const struct HuffmanOptions* options,
+                      struct ByteSink* out) {
+    uint64_t start = monotonicNs(), flushNs = out->flushNs;
+    for (size_t i = 0; i < size;) {
+        size_t n = size - i > PROGRESS_INTERVAL ? PROGRESS_INTERVAL : size - i;
+        sinkWrite(out, in + i, n);
+        i += n;
+        setProgress(options, base + i);
+        if (isCanceled(options))
+            return HUFF_ERR_CANCELED;
+    }
+    if (options->stats)
+        options->stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - start - (out->flushNs - flushNs);
+    return sinkStatus(out);
+}
+
+// Stored stream: u8 codec, varint original size, the original bytes
+static int encodeStoredStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                              struct ByteSink* out) {
+    sinkPutByte(out, CODEC_STORED);
+    writeVarint(out, size);
+    if (options->stats)
+        options->stats->codedBits += 8 * (uint64_t)size;
+    return copyStored(in, size, 0, options, out);
+}
+
+/*
+ * Coded stream: u8 codec, varint original size, code-length table, bitstream.
+ * A stream with a single distinct symbol carries no bitstream at all.
+ */
+int encodeStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options, struct Checksum* sum,
+                 struct ByteSink* out) {
+    if (options->maxCodeLength &&
+        (options->maxCodeLength < HUFF_MIN_CODE_LENGTH || options->maxCodeLength > HUFF_MAX_CODE_LENGTH))
+        return HUFF_ERR_ARG;
+    if (options->dictionary)
+        return encodeDictionaryStream(in, size, options, sum, out);
+    if (options->context)
+        return encodeContextStream(in, size, options, sum, out);
+
+    uint64_t start = monotonicNs();
+    uint64_t freq[256];
+    countSymbols(in, size, freq, sum);
+    if (options->stats)
+        options->stats->phaseNs[HUFF_PHASE_HISTOGRAM] += monotonicNs() - start;
+    return encodeCountedStream(in, size, freq, options, out);
+}
+
+int encodeCountedStream(const unsigned char* in, size_t size, const uint64_t freq[256],
+                        const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct HuffmanStats* stats = options->stats;
+    // Handle empty input case
+    if (size == 0) {
+        sinkPutByte(out, CODEC_HUFFMAN);
+        writeVarint(out, size);
+        return sinkStatus(out);
+    }
+
+    uint64_t counted = monotonicNs();
+    unsigned symbols = 0;
+    for (int s = 0; s < 256; s++)
+        symbols += freq[s] != 0;
+    if (stats)
+        for (int s = 0; s < 256; s++)
+            stats->histogram[s] += freq[s];
+
+    // Random or already compressed input fails even against the entropy, before any code is built
+    if (!worthCoding(size, entropyBound(freq, size, symbols)))
+        return encodeStoredStream(in, size, options, out);
+
+    uint8_t lengths[256];
+    uint32_t words[256];
+    uint64_t limitLoss = cachedCodeLengths(freq, lengths, words, options->maxCodeLength);
+    uint64_t payloadBits = 0;
+    if (symbols > 1)
+        for (int s = 0; s < 256; s++)
+            payloadBits += freq[s] * lengths[s];
+    uint64_t built = monotonicNs();
+    if (stats)
+        stats->phaseNs[HUFF_PHASE_TABLE] += built - counted;
+    if (!worthCoding(size, payloadBits + 8 * (uint64_t)codeLengthsSize(symbols)))
+        return encodeStoredStream(in, size, options, out);
+
+    sinkPutByte(out, CODEC_HUFFMAN);
+    writeVarint(out, size);
+    writeCodeLengths(out, lengths);
+    if (stats) {
+        stats->codedBits += payloadBits;
+        stats->limitLossBits += limitLoss;
+    }
+    if (symbols == 1)
+        return sinkStatus(out);
+
+    struct CodeWord codes[256];
+    for (int s = 0; s < 256; s++) {
+        codes[s].code = words[s];
+        codes[s].length = lengths[s];
+    }
+
+    return encodeSymbols(codes, in, size, options, out);
+}
+
+int encodeSymbols(const struct CodeWord codes[256], const unsigned char* in, size_t size,
+                  const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct BitWriter* writer = malloc(sizeof(struct BitWriter));
+    if (!writer)
+        return HUFF_ERR_NOMEM;
+    uint64_t start = monotonicNs(), flushNs = out->flushNs;
+    bitWriterInit(writer, out);
+    for (size_t i = 0; i < size;) {
+        size_t end = size - i > PROGRESS_INTERVAL ? i + PROGRESS_INTERVAL : size;
+        for (; i < end; i++) {
+            const struct CodeWord cw = codes[in[i]];
+            bitWriterPut(writer, cw.code, cw.length);
+        }
+        setProgress(options, i);
+        if (isCanceled(options)) {
+            free(writer);
+            return HUFF_ERR_CANCELED;
+        }
+    }
+    bitWriterFinish(writer);
+    free(writer);
+    // Flushes to a file sink during the loop are write time, not coding time
+    if (options->stats)
+        options->stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - start - (out->flushNs - flushNs);
+
+    return sinkStatus(out);
+}
+
+static int decodeStoredStream(const unsigned char* in, size_t size, size_t* pos,
+                              const struct HuffmanOptions* options, struct ByteSink* out) {
+    (*pos)++;
+    uint64_t originalSize;
+    if (readVarint(in, size, pos, &originalSize) != HUFF_OK || originalSize > size - *pos)
+        return HUFF_ERR_FORMAT;
+    size_t base = *pos;
+    *pos += (size_t)originalSize;
+    return copyStored(in + base, (size_t)originalSize, base, options, out);
+}
+
+int decodeStream(const unsigned char* in, size_t size, size_t* pos, const struct HuffmanOptions* options,
+                 struct ByteSink* out) {
+    struct HuffmanStats* stats = options->stats;
+    if (*pos < size && in[*pos] == CODEC_CONTEXT)
+        return decodeContextStream(in, size, pos, options, out);
+    if (*pos < size && in[*pos] == CODEC_DICTIONARY)
+        return decodeDictionaryStream(in, size, pos, options, out);
+    if (*pos < size && in[*pos] == CODEC_STORED)
+        return decodeStoredStream(in, size, pos, options, out);
+    if (*pos >= size || in[*pos] != CODEC_HUFFMAN)
+        return HUFF_ERR_FORMAT;
+    (*pos)++;
+
+    uint64_t originalSize;
+    if (readVarint(in, size, pos, &originalSize) != HUFF_OK)
+        return HUFF_ERR_FORMAT;
+
+    // Handle empty file case
+    if (originalSize == 0)
+        return HUFF_OK;
+
+    uint64_t start = monotonicNs();
+    uint8_t lengths[256];
+    int status = readCodeLengths(in, size, pos, lengths);
+    if (status != HUFF_OK)
+        return status;
+
+    int symbols = 0, last = 0;
+    for (int s = 0; s < 256; s++)
+        if (lengths[s]) {
+            symbols++;
+            last = s;
+        }
+
+    // Handle single unique character case; nothing bounds the run but the size field, so check as it goes
+    if (symbols == 1) {
+        unsigned char run[4096];
+        memset(run, last, sizeof(run));
+        for (uint64_t left = originalSize; left > 0 && !out->error;) {
+            size_t n = left < sizeof(run) ? (size_t)left : sizeof(run);
+            sinkWrite(out, run, n);
+            left -= n;
+            setProgress(options, *pos);
+            if (isCanceled(options))
+                return HUFF_ERR_CANCELED;
+        }
+        return sinkStatus(out);
+    }
+
+    const struct DecodeTable* table = acquireDecodeTable(lengths, &status);
+    if (!table)
+        return status;
+    uint64_t built = monotonicNs();
+    uint64_t flushNs = out->flushNs;
+    status = decodeSymbols(table, in, size, pos, originalSize, options, out);
+    releaseDecodeTable(table);
+    if (stats) {
+        stats->phaseNs[HUFF_PHASE_TABLE] += built - start;
+        stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - built - (out->flushNs - flushNs);
+    }
+    return status;
+}
+
+int encodeCheckedStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                        struct ByteSink* out) {
+    struct Checksum sum;
+    checksumInit(&sum);
+    int status = encodeStream(in, size, options, &sum, out);
+    if (status != HUFF_OK)
+        return status;
+    writeU64(out, checksumDigest(&sum));
+    return sinkStatus(out);
+}
+
+int decodeCheckedStream(const unsigned char* in, size_t size, size_t* pos, const struct HuffmanOptions* options,
+                        struct ByteSink* out) {
+    if (size - *pos < FORMAT_CHECKSUM_SIZE)
+        return HUFF_ERR_FORMAT;
+    size_t end = size - FORMAT_CHECKSUM_SIZE;
+    sinkStartChecksum(out);
+    int status = decodeStream(in, end, pos, options, out);
+    uint64_t checksum = sinkChecksum(out);
+    if (status == HUFF_OK && checksum != readU64(in + end))
+        status = HUFF_ERR_CHECKSUM;
+    *pos = size;
+    return status;
+}
@@ -0,0 +1,368 @@
+#include <math.h>
+#include <stdlib.h>
+#include <string.h>
+#include "context.h"
+#include "bitio.h"
+#include "canonical.h"
+#include "codec.h"
+#include "decoder.h"
+#include "format.h"
+#include "stats.h"
+#include "tablecache.h"
+
+// Counts below this take x * log2(x) from a table while clustering
+#define XLOGX_TABLE_SIZE 4096
+
+/*
+ * Pair counts and clustering state for one stream.  counts[c] starts as
+ * the histogram of the bytes that follow byte c; merging cluster b into a
+ * adds row b into row a, so an active row always holds its whole cluster.
+ */
+struct ContextModel {
+    uint64_t counts[256][256];
+    double delta[256][256];      // estimated bits saved (< 0) by merging clusters a < b
+    double cost[256];            // estimated bits of each active cluster, table included
+    double xlogx[XLOGX_TABLE_SIZE];
+    uint8_t cluster[256];        // cluster of every context, named by its lowest context
+    uint8_t active[256];
+    uint8_t used[256];           // context occurs in the stream
+};
+
+static double xlogx(const struct ContextModel* m, uint64_t x) {
+    return x < XLOGX_TABLE_SIZE ? m->xlogx[x] : (double)x * log2((double)x);
+}
+
+// Entropy of the histogram (never less than the one bit per byte a Huffman code needs) plus its table
+static double clusterCost(const struct ContextModel* m, const uint64_t h[256]) {
+    uint64_t total = 0;
+    unsigned symbols = 0;
+    double sum = 0;
+    for (int s = 0; s < 256; s++)
+        if (h[s]) {
+            total += h[s];
+            symbols++;
+            sum += xlogx(m, h[s]);
+        }
+    if (total == 0)
+        return 0;
+    double bits = xlogx(m, total) - sum;
+    if (bits < (double)total)
+        bits = (double)total;
+    return bits + 8.0 * (double)codeLengthsSize(symbols);
+}
+
+static double mergeDelta(const struct ContextModel* m, int a, int b) {
+    uint64_t merged[256];
+    for (int s = 0; s < 256; s++)
+        merged[s] = m->counts[a][s] + m->counts[b][s];
+    return clusterCost(m, merged) - m->cost[a] - m->cost[b];
+}
+
+/*
+ * Greedy agglomerative clustering: keep merging the pair of clusters whose
+ * shared table is estimated to save the most bits, until no merge saves
+ * any.  Returns the number of clusters left.
+ */
+static int clusterContexts(struct ContextModel* m) {
+    for (int x = 0; x < XLOGX_TABLE_SIZE; x++)
+        m->xlogx[x] = x ? x * log2(x) : 0;
+
+    int clusters = 0;
+    for (int c = 0; c < 256; c++) {
+        m->cluster[c] = (uint8_t)c;
+        m->active[c] = m->used[c];
+        if (m->active[c]) {
+            m->cost[c] = clusterCost(m, m->counts[c]);
+            clusters++;
+        }
+    }
+    for (int a = 0; a < 256; a++)
+        for (int b = a + 1; b < 256; b++)
+            if (m->active[a] && m->active[b])
+                m->delta[a][b] = mergeDelta(m, a, b);
+
+    while (clusters > 1) {
+        double best = 0;
+        int bestA = -1, bestB = -1;
+        for (int a = 0; a < 256; a++) {
+            if (!m->active[a])
+                continue;
+            for (int b = a + 1; b < 256; b++)
+                if (m->active[b] && m->delta[a][b] < best) {
+                    best = m->delta[a][b];
+                    bestA = a;
+                    bestB = b;
+                }
+        }
+        if (bestA < 0)
+            break;
+
+        for (int s = 0; s < 256; s++)
+            m->counts[bestA][s] += m->counts[bestB][s];
+        m->cost[bestA] += m->cost[bestB] + best;
+        m->active[bestB] = 0;
+        clusters--;
+        for (int c = 0; c < 256; c++)
+            if (m->cluster[c] == bestB)
+                m->cluster[c] = (uint8_t)bestA;
+        for (int x = 0; x < 256; x++) {
+            if (!m->active[x] || x == bestA)
+                continue;
+            if (x < bestA)
+                m->delta[x][bestA] = mergeDelta(m, x, bestA);
+            else
+                m->delta[bestA][x] = mergeDelta(m, bestA, x);
+        }
+    }
+    return clusters;
+}
+
+static unsigned indexBits(unsigned tableCount) {
+    unsigned bits = 0;
+    while ((1u << bits) < tableCount)
+        bits++;
+    return bits;
+}
+
+static uint64_t codedBits(const uint64_t freq[256], const uint8_t lengths[256]) {
+    uint64_t bits = 0;
+    for (int s = 0; s < 256; s++)
+        bits += freq[s] * lengths[s];
+    return bits;
+}
+
+static unsigned symbolCount(const uint8_t lengths[256]) {
+    unsigned count = 0;
+    for (int s = 0; s < 256; s++)
+        count += lengths[s] != 0;
+    return count;
+}
+
+/*
+ * Context stream layout, after the codec byte and the varint original size:
+ *   u8 tableCount - 1
+ *   32-byte bitmap of the contexts that occur (context 0 precedes the first byte)
+ *   per context in the bitmap, its table index in ceil(log2(tableCount)) bits, MSB first
+ *   tableCount code-length tables (see writeCodeLengths)
+ *   bitstream, each byte coded with its context's table
+ */
+int encodeContextStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                        struct Checksum* sum, struct ByteSink* out) {
+    struct HuffmanOptions plain = *options;
+    plain.context = 0;
+    if (size == 0)
+        return encodeStream(in, size, &plain, sum, out);
+
+    struct HuffmanStats* stats = options->stats;
+    struct ContextModel* m = malloc(sizeof(*m));
+    if (!m)
+        return HUFF_ERR_NOMEM;
+    uint64_t start = monotonicNs();
+    memset(m->counts, 0, sizeof(m->counts));
+    memset(m->used, 0, sizeof(m->used));
+    unsigned previous = 0;
+    for (size_t i = 0; i < size;) {
+        size_t start = i, end = size - i > PROGRESS_INTERVAL ? i + PROGRESS_INTERVAL : size;
+        for (; i < end; i++) {
+            m->counts[previous][in[i]]++;
+            previous = in[i];
+        }
+        if (sum)
+            checksumUpdate(sum, in + start, end - start);
+        if (isCanceled(options)) {
+            free(m);
+            return HUFF_ERR_CANCELED;
+        }
+    }
+    uint64_t freq[256] = {0};
+    for (int c = 0; c < 256; c++)
+        for (int s = 0; s < 256; s++) {
+            freq[s] += m->counts[c][s];
+            m->used[c] |= m->counts[c][s] != 0;
+        }
+    uint64_t counted = monotonicNs();
+
+    // The order-0 stream to beat; a single repeated byte costs no bits at all
+    uint8_t plainLengths[256];
+    uint32_t plainCodes[256];
+    cachedCodeLengths(freq, plainLengths, plainCodes, options->maxCodeLength);
+    unsigned plainSymbols = symbolCount(plainLengths);
+    uint64_t plainBits = plainSymbols > 1 ? codedBits(freq, plainLengths) : 0;
+    plainBits += 8 * (uint64_t)codeLengthsSize(plainSymbols);
+
+    unsigned tableCount = (unsigned)clusterContexts(m);
+    unsigned usedCount = 0;
+    uint8_t tableOf[256] = {0};
+    uint8_t (*lengths)[256] = malloc(tableCount * sizeof(*lengths));
+    struct CodeWord (*words)[256] = malloc(tableCount * sizeof(*words));
+    if (!lengths || !words) {
+        free(lengths);
+        free(words);
+        free(m);
+        return HUFF_ERR_NOMEM;
+    }
+    uint64_t payloadBits = 0, headerBytes = 1 + 32, limitLoss = 0;
+    for (int c = 0, t = 0; c < 256; c++) {
+        usedCount += m->used[c];
+        if (!m->active[c])
+            continue;
+        tableOf[c] = (uint8_t)t;
+        limitLoss += buildCodeLengths(m->counts[c], lengths[t], options->maxCodeLength);
+        payloadBits += codedBits(m->counts[c], lengths[t]);
+        headerBytes += codeLengthsSize(symbolCount(lengths[t]));
+        t++;
+    }
+    headerBytes += ((uint64_t)usedCount * indexBits(tableCount) + 7) / 8;
+    uint64_t built = monotonicNs();
+    if (stats) {
+        stats->phaseNs[HUFF_PHASE_HISTOGRAM] += counted - start;
+        stats->phaseNs[HUFF_PHASE_TABLE] += built - counted;
+    }
+
+    // The plain stream also decides whether the input is stored instead
+    uint64_t contextBits = payloadBits + 8 * headerBytes;
+    if (contextBits >= plainBits || !worthCoding(size, contextBits)) {
+        free(lengths);
+        free(words);
+        free(m);
+        return encodeCountedStream(in, size, freq, &plain, out);
+    }
+
+    sinkPutByte(out, CODEC_CONTEXT);
+    writeVarint(out, size);
+    sinkPutByte(out, (unsigned char)(tableCount - 1));
+    unsigned char bitmap[32] = {0};
+    for (int c = 0; c < 256; c++)
+        if (m->used[c])
+            bitmap[c >> 3] |= 0x80 >> (c & 7);
+    sinkWrite(out, bitmap, sizeof(bitmap));
+    struct BitWriter* writer = malloc(sizeof(struct BitWriter));
+    if (!writer) {
+        free(lengths);
+        free(words);
+        free(m);
+        return HUFF_ERR_NOMEM;
+    }
+    bitWriterInit(writer, out);
+    unsigned width = indexBits(tableCount);
+    const struct CodeWord* contextWords[256];
+    for (int c = 0; c < 256; c++) {
+        uint8_t table = tableOf[m->cluster[c]];
+        contextWords[c] = words[m->used[c] ? table : 0];
+        if (m->used[c] && width)
+            bitWriterPut(writer, table, width);
+    }
+    bitWriterFinish(writer);
+    for (unsigned t = 0; t < tableCount; t++) {
+        uint32_t codes[256];
+        writeCodeLengths(out, lengths[t]);
+        assignCanonicalCodes(lengths[t], codes);
+        for (int s = 0; s < 256; s++) {
+            words[t][s].code = codes[s];
+            words[t][s].length = lengths[t][s];
+        }
+    }
+
+    uint64_t flushNs = out->flushNs, coding = monotonicNs();
+    int status = HUFF_OK;
+    previous = 0;
+    for (size_t i = 0; i < size && status == HUFF_OK;) {
+        size_t end = size - i > PROGRESS_INTERVAL ? i + PROGRESS_INTERVAL : size;
+        for (; i < end; i++) {
+            const struct CodeWord cw = contextWords[previous][in[i]];
+            bitWriterPut(writer, cw.code, cw.length);
+            previous = in[i];
+        }
+        setProgress(options, i);
+        if (isCanceled(options))
+            status = HUFF_ERR_CANCELED;
+    }
+    if (status == HUFF_OK)
+        bitWriterFinish(writer);
+    if (stats) {
+        for (int s = 0; s < 256; s++)
+            stats->histogram[s] += freq[s];
+        stats->codedBits += payloadBits;
+        stats->limitLossBits += limitLoss;
+        stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - coding - (out->flushNs - flushNs);
+    }
+    free(writer);
+    free(lengths);
+    free(words);
+    free(m);
+    if (status != HUFF_OK)
+        return status;
+    return sinkStatus(out);
+}
+
+int decodeContextStream(const unsigned char* in, size_t size, size_t* pos, const struct HuffmanOptions* options,
+                        struct ByteSink* out) {
+    struct HuffmanStats* stats = options->stats;
+    if (*pos >= size || in[*pos] != CODEC_CONTEXT)
+        return HUFF_ERR_FORMAT;
+    (*pos)++;
+
+    uint64_t originalSize;
+    if (readVarint(in, size, pos, &originalSize) != HUFF_OK)
+        return HUFF_ERR_FORMAT;
+    if (originalSize == 0)
+        return HUFF_OK;
+
+    uint64_t start = monotonicNs();
+    size_t p = *pos;
+    if (size - p < 1 + 32)
+        return HUFF_ERR_FORMAT;
+    unsigned tableCount = in[p++] + 1u;
+    const unsigned char* bitmap = in + p;
+    p += 32;
+    unsigned usedCount = 0;
+    for (int c = 0; c < 256; c++)
+        usedCount += (bitmap[c >> 3] >> (7 - (c & 7))) & 1;
+    unsigned width = indexBits(tableCount);
+    size_t mapBytes = ((size_t)usedCount * width + 7) / 8;
+    if (size - p < mapBytes)
+        return HUFF_ERR_FORMAT;
+
+    uint8_t tableOf[256] = {0};
+    size_t bit = 0;
+    for (int c = 0; c < 256; c++) {
+        if (!((bitmap[c >> 3] >> (7 - (c & 7))) & 1))
+            continue;
+        unsigned index = 0;
+        for (unsigned i = 0; i < width; i++, bit++)
+            index = (index << 1) | ((in[p + bit / 8] >> (7 - bit % 8)) & 1);
+        if (index >= tableCount)
+            return HUFF_ERR_FORMAT;
+        tableOf[c] = (uint8_t)index;
+    }
+    p += mapBytes;
+
+    const struct DecodeTable** tables = calloc(tableCount, sizeof(*tables));
+    if (!tables)
+        return HUFF_ERR_NOMEM;
+    int status = HUFF_OK;
+    for (unsigned t = 0; t < tableCount && status == HUFF_OK; t++) {
+        uint8_t lengths[256];
+        status = readCodeLengths(in, size, &p, lengths);
+        if (status == HUFF_OK && !(tables[t] = acquireDecodeTable(lengths, &status)))
+            break;
+    }
+
+    if (status == HUFF_OK) {
+        const struct DecodeTable* contextTables[256];
+        for (int c = 0; c < 256; c++)
+            contextTables[c] = tables[tableOf[c]];
+        uint64_t ready = monotonicNs();
+        uint64_t flushNs = out->flushNs;
+        *pos = p;
+        status = decodeContextSymbols(contextTables, in, size, pos, originalSize, options, out);
+        if (stats) {
+            stats->phaseNs[HUFF_PHASE_TABLE] += ready - start;
+            stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - ready - (out->flushNs - flushNs);
+        }
+    }
+    for (unsigned t = 0; t < tableCount; t++)
+        releaseDecodeTable(tables[t]);
+    free(tables);
+    return status;
+}
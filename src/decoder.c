@@ -0,0 +1,198 @@
+#include <stdlib.h>
+#include <string.h>
+#include "decoder.h"
+#include "huffman.h"
+#include "stats.h"
+
+#define DECODE_CHUNK (1 << 16)
+
+int buildDecodeTable(struct DecodeTable* table, const uint8_t lengths[256], const uint32_t codes[256]) {
+    unsigned maxLength = 0;
+    for (int s = 0; s < 256; s++)
+        if (lengths[s] > maxLength)
+            maxLength = lengths[s];
+    if (maxLength == 0 || maxLength > DECODE_MAX_CODE_LEN)
+        return HUFF_ERR_FORMAT;
+
+    unsigned rootBits = maxLength < DECODE_ROOT_BITS ? maxLength : DECODE_ROOT_BITS;
+    size_t rootSize = (size_t)1 << rootBits;
+
+    // Size each second-level table by the longest code sharing its prefix
+    uint8_t subBits[1 << DECODE_ROOT_BITS] = {0};
+    for (int s = 0; s < 256; s++) {
+        unsigned len = lengths[s];
+        if (len > rootBits) {
+            uint32_t prefix = codes[s] >> (len - rootBits);
+            if (len - rootBits > subBits[prefix])
+                subBits[prefix] = (uint8_t)(len - rootBits);
+        }
+    }
+
+    size_t total = rootSize;
+    size_t offsets[1 << DECODE_ROOT_BITS];
+    for (size_t p = 0; p < rootSize; p++) {
+        offsets[p] = total;
+        if (subBits[p])
+            total += (size_t)1 << subBits[p];
+    }
+    struct DecodeEntry* entries = calloc(total, sizeof(struct DecodeEntry));
+    if (!entries)
+        return HUFF_ERR_NOMEM;
+
+    for (size_t p = 0; p < rootSize; p++)
+        if (subBits[p]) {
+            entries[p].value = (uint32_t)offsets[p];
+            entries[p].subBits = subBits[p];
+        }
+
+    for (int s = 0; s < 256; s++) {
+        unsigned len = lengths[s];
+        if (!len)
+            continue;
+        uint32_t code = codes[s];
+        struct DecodeEntry leaf = { (uint32_t)s, (uint8_t)len, 0 };
+        size_t first, span;
+        if (len <= rootBits) {
+            first = (size_t)code << (rootBits - len);
+            span = (size_t)1 << (rootBits - len);
+        } else {
+            uint32_t prefix = code >> (len - rootBits);
+            unsigned extra = len - rootBits;
+            uint32_t suffix = code & ((1u << extra) - 1);
+            first = offsets[prefix] + ((size_t)suffix << (subBits[prefix] - extra));
+            span = (size_t)1 << (subBits[prefix] - extra);
+        }
+        if (first + span > total || (len <= rootBits && first + span > rootSize)) {
+            free(entries);
+            return HUFF_ERR_FORMAT;
+        }
+        for (size_t i = 0; i < span; i++)
+            entries[first + i] = leaf;
+    }
+
+    table->entries = entries;
+    table->rootBits = rootBits;
+    table->maxLength = maxLength;
+    return HUFF_OK;
+}
+
+void freeDecodeTable(struct DecodeTable* table) {
+    free(table->entries);
+    table->entries = NULL;
+}
+
+// Top up the left-aligned bit buffer to at least 57 bits, or to the end of the input
+static inline void refillBits(const unsigned char* in, size_t size, size_t* pos, uint64_t* bitBuf,
+                              unsigned* bitCount) {
+    size_t p = *pos;
+    if (p + 8 <= size) {
+        uint64_t word = 0;
+        for (int i = 0; i < 8; i++)
+            word = (word << 8) | in[p + i];
+        *bitBuf |= word >> *bitCount;
+        unsigned bytes = (63 - *bitCount) >> 3;
+        p += bytes;
+        *bitCount += bytes * 8;
+    } else {
+        while (*bitCount <= 56 && p < size) {
+            *bitBuf |= (uint64_t)in[p++] << (56 - *bitCount);
+            *bitCount += 8;
+        }
+    }
+    *pos = p;
+}
+
+static inline struct DecodeEntry lookupEntry(const struct DecodeTable* table, uint64_t bitBuf) {
+    struct DecodeEntry e = table->entries[bitBuf >> (64 - table->rootBits)];
+    if (e.subBits)
+        e = table->entries[e.value + ((bitBuf << table->rootBits) >> (64 - e.subBits))];
+    return e;
+}
+
+/*
+ * Decode `count` symbols starting at in[*pos].  Bits are kept left-aligned
+ * in a 64-bit buffer so each symbol costs one (rarely two) table lookups.
+ * Progress and cancellation are checked once per output chunk.
+ */
+int decodeSymbols(const struct DecodeTable* table, const unsigned char* in, size_t size,
+                  size_t* pos, uint64_t count, const struct HuffmanOptions* options, struct ByteSink* out) {
+    const unsigned maxLength = table->maxLength;
+    unsigned char chunk[DECODE_CHUNK];
+    size_t filled = 0;
+    size_t p = *pos;
+    uint64_t bitBuf = 0;
+    unsigned bitCount = 0;
+
+    while (count > 0) {
+        if (bitCount < maxLength)
+            refillBits(in, size, &p, &bitBuf, &bitCount);
+
+        struct DecodeEntry e = lookupEntry(table, bitBuf);
+        if (e.length == 0 || e.length > bitCount)
+            return HUFF_ERR_FORMAT;
+
+        bitBuf <<= e.length;
+        bitCount -= e.length;
+        chunk[filled++] = (unsigned char)e.value;
+        count--;
+
+        if (filled == DECODE_CHUNK) {
+            sinkWrite(out, chunk, filled);
+            filled = 0;
+            setProgress(options, p);
+            if (isCanceled(options))
+                return HUFF_ERR_CANCELED;
+        }
+    }
+    sinkWrite(out, chunk, filled);
+
+    // Report the position just past the last byte that held code bits
+    *pos = p - bitCount / 8;
+    return sinkStatus(out);
+}
+
+/*
+ * Order-1 variant of decodeSymbols: each symbol is looked up in the table
+ * of the context named by the symbol before it (0 for the first one).
+ */
+int decodeContextSymbols(const struct DecodeTable* const tables[256], const unsigned char* in, size_t size,
+                         size_t* pos, uint64_t count, const struct HuffmanOptions* options,
+                         struct ByteSink* out) {
+    unsigned maxLength = 0;
+    for (int c = 0; c < 256; c++)
+        if (tables[c]->maxLength > maxLength)
+            maxLength = tables[c]->maxLength;
+    unsigned char chunk[DECODE_CHUNK];
+    size_t filled = 0;
+    size_t p = *pos;
+    uint64_t bitBuf = 0;
+    unsigned bitCount = 0;
+    unsigned char previous = 0;
+
+    while (count > 0) {
+        if (bitCount < maxLength)
+            refillBits(in, size, &p, &bitBuf, &bitCount);
+
+        struct DecodeEntry e = lookupEntry(tables[previous], bitBuf);
+        if (e.length == 0 || e.length > bitCount)
+            return HUFF_ERR_FORMAT;
+
+        bitBuf <<= e.length;
+        bitCount -= e.length;
+        previous = (unsigned char)e.value;
+        chunk[filled++] = previous;
+        count--;
+
+        if (filled == DECODE_CHUNK) {
+            sinkWrite(out, chunk, filled);
+            filled = 0;
+            setProgress(options, p);
+            if (isCanceled(options))
+                return HUFF_ERR_CANCELED;
+        }
+    }
+    sinkWrite(out, chunk, filled);
+
+    *pos = p - bitCount / 8;
+    return sinkStatus(out);
+}
@@ -0,0 +1,237 @@
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include "dictionary.h"
+#include "canonical.h"
+#include "codec.h"
+#include "context.h"
+#include "fileio.h"
+#include "format.h"
+#include "stats.h"
+#include "tablecache.h"
+
+// FNV-1a over the code lengths: equal tables get equal ids
+static uint32_t tableId(const uint8_t lengths[256]) {
+    uint32_t hash = 2166136261u;
+    for (int s = 0; s < 256; s++) {
+        hash ^= lengths[s];
+        hash *= 16777619u;
+    }
+    return hash;
+}
+
+/*
+ * One code for every sample: their byte counts are summed and every byte
+ * value gets one extra count, so inputs with bytes the samples never
+ * contained can still use the dictionary.
+ */
+int huffmanTrainDictionary(const char* const samples[], size_t count, const char* dictFile,
+                           const struct HuffmanOptions* options) {
+    struct HuffmanOptions defaults;
+    if (!options) {
+        huffmanDefaultOptions(&defaults);
+        options = &defaults;
+    }
+    if (!dictFile || (count && !samples))
+        return HUFF_ERR_ARG;
+    if (options->maxCodeLength &&
+        (options->maxCodeLength < HUFF_MIN_CODE_LENGTH || options->maxCodeLength > HUFF_MAX_CODE_LENGTH))
+        return HUFF_ERR_ARG;
+
+    struct HuffmanStats* stats = options->stats;
+    uint64_t start = monotonicNs();
+    if (stats)
+        memset(stats, 0, sizeof(*stats));
+    uint64_t freq[256], total[256] = {0}, inputSize = 0;
+    for (size_t i = 0; i < count; i++) {
+        struct InputData input;
+        int status = openInput(samples[i], &input);
+        if (status != HUFF_OK)
+            return status;
+        countSymbols(input.data, input.size, freq, NULL);
+        inputSize += input.size;
+        closeInput(&input);
+        for (int s = 0; s < 256; s++)
+            total[s] += freq[s];
+        setProgress(options, inputSize);
+        if (isCanceled(options))
+            return HUFF_ERR_CANCELED;
+    }
+    if (stats) {
+        memcpy(stats->histogram, total, sizeof(total));
+        stats->inputSize = inputSize;
+    }
+
+    uint8_t lengths[256];
+    for (int s = 0; s < 256; s++)
+        total[s]++;
+    buildCodeLengths(total, lengths, options->maxCodeLength);
+
+    struct ByteSink sink;
+    sinkInitMemory(&sink, DICT_HEADER_SIZE + 256);
+    unsigned char header[DICT_HEADER_SIZE - 4] = {0};
+    memcpy(header, DICT_MAGIC, DICT_MAGIC_SIZE);
+    header[DICT_MAGIC_SIZE] = DICT_VERSION;
+    sinkWrite(&sink, header, sizeof(header));
+    writeU32(&sink, tableId(lengths));
+    writeCodeLengths(&sink, lengths);
+
+    int status = sinkStatus(&sink);
+    FILE* file = status == HUFF_OK ? fopen(dictFile, "wb") : NULL;
+    if (status == HUFF_OK && !file)
+        status = HUFF_ERR_IO;
+    if (file) {
+        if (fwrite(sink.data, 1, sink.size, file) != sink.size)
+            status = HUFF_ERR_IO;
+        if (fclose(file) != 0 && status == HUFF_OK)
+            status = HUFF_ERR_IO;
+        if (status != HUFF_OK)
+            remove(dictFile);
+    }
+    if (stats) {
+        stats->outputSize = sink.size;
+        stats->totalNs = monotonicNs() - start;
+        finishStats(stats);
+    }
+    sinkFree(&sink);
+    return status;
+}
+
+int huffmanLoadDictionary(const char* dictFile, struct HuffmanDictionary** dictionary) {
+    if (!dictFile || !dictionary)
+        return HUFF_ERR_ARG;
+    *dictionary = NULL;
+    struct InputData input;
+    int status = openInput(dictFile, &input);
+    if (status != HUFF_OK)
+        return status;
+
+    struct HuffmanDictionary* dict = calloc(1, sizeof(*dict));
+    if (!dict) {
+        closeInput(&input);
+        return HUFF_ERR_NOMEM;
+    }
+    const unsigned char* in = input.data;
+    size_t pos = DICT_HEADER_SIZE;
+    if (input.size < DICT_HEADER_SIZE || memcmp(in, DICT_MAGIC, DICT_MAGIC_SIZE) != 0 ||
+        in[DICT_MAGIC_SIZE] != DICT_VERSION)
+        status = HUFF_ERR_FORMAT;
+    if (status == HUFF_OK)
+        status = readCodeLengths(in, input.size, &pos, dict->lengths);
+    if (status == HUFF_OK && (pos != input.size || readU32(in + 8) != tableId(dict->lengths)))
+        status = HUFF_ERR_FORMAT;
+    closeInput(&input);
+
+    if (status == HUFF_OK) {
+        uint32_t codes[256];
+        assignCanonicalCodes(dict->lengths, codes);
+        for (int s = 0; s < 256; s++) {
+            dict->codes[s].code = codes[s];
+            dict->codes[s].length = dict->lengths[s];
+        }
+        dict->id = tableId(dict->lengths);
+        status = buildDecodeTable(&dict->table, dict->lengths, codes);
+    }
+    if (status != HUFF_OK) {
+        free(dict);
+        return status;
+    }
+    *dictionary = dict;
+    return HUFF_OK;
+}
+
+void huffmanFreeDictionary(struct HuffmanDictionary* dictionary) {
+    if (!dictionary)
+        return;
+    freeDecodeTable(&dictionary->table);
+    free(dictionary);
+}
+
+int encodeDictionaryStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                           struct Checksum* sum, struct ByteSink* out) {
+    const struct HuffmanDictionary* dict = options->dictionary;
+    struct HuffmanOptions plain = *options;
+    plain.dictionary = NULL;
+    if (size == 0)
+        return encodeStream(in, size, &plain, sum, out);
+
+    struct HuffmanStats* stats = options->stats;
+    uint64_t start = monotonicNs();
+    uint64_t freq[256];
+    countSymbols(in, size, freq, sum);
+
+    uint64_t dictBits = 8 * 4;
+    unsigned symbols = 0;
+    int covered = 1;
+    double entropyBits = 0;
+    for (int s = 0; s < 256; s++) {
+        if (!freq[s])
+            continue;
+        symbols++;
+        dictBits += freq[s] * dict->lengths[s];
+        covered &= dict->lengths[s] != 0;
+        entropyBits += (double)freq[s] * log2((double)size / (double)freq[s]);
+    }
+
+    /*
+     * The plain stream to beat is its own code plus the table it carries.
+     * No Huffman code beats the entropy, so the plain code only has to be
+     * built when the dictionary does not already win against that bound.
+     * A dictionary code not worth it over storing the input is never used.
+     */
+    uint64_t tableBits = 8 * (uint64_t)codeLengthsSize(symbols);
+    int usable = covered && symbols > 1 && worthCoding(size, dictBits);
+    int useDictionary = usable && (double)dictBits < entropyBits + (double)tableBits;
+    if (usable && !useDictionary) {
+        // Cached, so a fallback to the plain stream does not build the code twice
+        uint8_t lengths[256];
+        uint32_t codes[256];
+        cachedCodeLengths(freq, lengths, codes, options->maxCodeLength);
+        uint64_t plainBits = tableBits;
+        for (int s = 0; s < 256; s++)
+            plainBits += freq[s] * lengths[s];
+        useDictionary = dictBits < plainBits;
+    }
+    if (stats)
+        stats->phaseNs[HUFF_PHASE_HISTOGRAM] += monotonicNs() - start;
+    // The context encoder counts byte pairs of its own; a plain stream reuses the histogram
+    if (!useDictionary)
+        return plain.context ? encodeContextStream(in, size, &plain, NULL, out)
+                             : encodeCountedStream(in, size, freq, &plain, out);
+
+    if (stats) {
+        for (int s = 0; s < 256; s++) {
+            stats->histogram[s] += freq[s];
+            stats->codedBits += freq[s] * dict->lengths[s];
+        }
+    }
+    sinkPutByte(out, CODEC_DICTIONARY);
+    writeVarint(out, size);
+    writeU32(out, dict->id);
+    return encodeSymbols(dict->codes, in, size, options, out);
+}
+
+int decodeDictionaryStream(const unsigned char* in, size_t size, size_t* pos, const struct HuffmanOptions* options,
+                           struct ByteSink* out) {
+    if (*pos >= size || in[*pos] != CODEC_DICTIONARY)
+        return HUFF_ERR_FORMAT;
+    (*pos)++;
+
+    uint64_t originalSize;
+    if (readVarint(in, size, pos, &originalSize) != HUFF_OK || size - *pos < 4)
+        return HUFF_ERR_FORMAT;
+    uint32_t id = readU32(in + *pos);
+    *pos += 4;
+    const struct HuffmanDictionary* dict = options->dictionary;
+    if (!dict || dict->id != id)
+        return HUFF_ERR_DICTIONARY;
+    if (originalSize == 0)
+        return HUFF_OK;
+
+    uint64_t start = monotonicNs(), flushNs = out->flushNs;
+    int status = decodeSymbols(&dict->table, in, size, pos, originalSize, options, out);
+    if (options->stats)
+        options->stats->phaseNs[HUFF_PHASE_CODE] += monotonicNs() - start - (out->flushNs - flushNs);
+    return status;
+}
@@ -0,0 +1,233 @@
+#define _POSIX_C_SOURCE 200809L
+
+#include <errno.h>
+#include <limits.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+#include "fileio.h"
+#include "huffman.h"
+
+#ifdef _WIN32
+#include <fcntl.h>
+#include <io.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <unistd.h>
+#endif
+
+/*
+ * Append blocks from readBlock until EOF, after `prefixLen` bytes the
+ * caller already consumed; used for anything that cannot be mapped.
+ */
+static int readBlocks(struct InputData* input, void* handle,
+                      long (*readBlock)(void*, unsigned char*, size_t),
+                      const unsigned char* prefix, size_t prefixLen) {
+    size_t capacity = IO_BUFFER_SIZE, size = prefixLen;
+    while (capacity < prefixLen)
+        capacity *= 2;
+    unsigned char* data = malloc(capacity);
+    if (!data)
+        return HUFF_ERR_NOMEM;
+    if (prefixLen)
+        memcpy(data, prefix, prefixLen);
+
+    for (;;) {
+        if (capacity - size < IO_BUFFER_SIZE) {
+            unsigned char* grown = realloc(data, capacity * 2);
+            if (!grown) {
+                free(data);
+                return HUFF_ERR_NOMEM;
+            }
+            data = grown;
+            capacity *= 2;
+        }
+        long n = readBlock(handle, data + size, IO_BUFFER_SIZE);
+        if (n < 0) {
+            free(data);
+            return HUFF_ERR_IO;
+        }
+        if (n == 0)
+            break;
+        size += (size_t)n;
+    }
+
+    input->data = input->owned = data;
+    input->size = size;
+    return HUFF_OK;
+}
+
+static long readStdio(void* handle, unsigned char* buffer, size_t len) {
+    FILE* file = handle;
+    size_t n = fread(buffer, 1, len, file);
+    return (n == 0 && ferror(file)) ? -1 : (long)n;
+}
+
+int isStdio(const char* path) {
+    return strcmp(path, "-") == 0;
+}
+
+int isStreamPath(const char* path) {
+    if (isStdio(path))
+        return 1;
+    struct stat st;
+    return stat(path, &st) == 0 && !S_ISREG(st.st_mode);
+}
+
+FILE* openInputStream(const char* path) {
+    FILE* file = stdin;
+    if (!isStdio(path)) {
+        file = fopen(path, "rb");
+        if (!file)
+            return NULL;
+    }
+#ifdef _WIN32
+    if (file == stdin)
+        _setmode(_fileno(stdin), _O_BINARY);
+#endif
+    // No read-ahead, so readAvailable() can follow the stdio reads of a header
+    setvbuf(file, NULL, _IONBF, 0);
+    return file;
+}
+
+long readAvailable(FILE* file, unsigned char* buffer, size_t len) {
+#ifdef _WIN32
+    int n = _read(_fileno(file), buffer, len > INT_MAX ? INT_MAX : (unsigned)len);
+#else
+    ssize_t n;
+    do
+        n = read(fileno(file), buffer, len);
+    while (n < 0 && errno == EINTR);
+#endif
+    return n < 0 ? -1 : (long)n;
+}
+
+FILE* openOutput(const char* path) {
+    if (!isStdio(path)) {
+        FILE* file = fopen(path, "wb");
+        if (!file)
+            return NULL;
+        // The sink already hands over megabyte-sized writes
+        setvbuf(file, NULL, _IONBF, 0);
+        return file;
+    }
+#ifdef _WIN32
+    _setmode(_fileno(stdout), _O_BINARY);
+#endif
+    return stdout;
+}
+
+// Regular files we opened ourselves: stdout may be in append mode or not start at offset 0
+int isRegularStream(FILE* file) {
+    struct stat st;
+    return file != stdout && fstat(fileno(file), &st) == 0 && S_ISREG(st.st_mode);
+}
+
+// Close a stream from openInputStream/openOutput, leaving stdin and stdout open
+int closeStream(FILE* file) {
+    if (file == stdin)
+        return 0;
+    if (file == stdout)
+        return fflush(file);
+    return fclose(file);
+}
+
+int readInputStream(FILE* stream, const unsigned char* prefix, size_t prefixLen, struct InputData* input) {
+    input->mapping = NULL;
+    input->owned = NULL;
+    return readBlocks(input, stream, readStdio, prefix, prefixLen);
+}
+
+#ifdef _WIN32
+
+int openInput(const char* path, struct InputData* input) {
+    input->mapping = NULL;
+    input->owned = NULL;
+    FILE* file = fopen(path, "rb");
+    if (!file)
+        return HUFF_ERR_IO;
+    int status = readBlocks(input, file, readStdio, NULL, 0);
+    fclose(file);
+    return status;
+}
+
+void closeInput(struct InputData* input) {
+    free(input->owned);
+    input->owned = NULL;
+}
+
+#else
+
+static long readFd(void* handle, unsigned char* buffer, size_t len) {
+    int fd = *(int*)handle;
+    size_t total = 0;
+    while (total < len) {
+        ssize_t n = read(fd, buffer + total, len - total);
+        if (n < 0)
+            return -1;
+        if (n == 0)
+            break;
+        total += (size_t)n;
+    }
+    return (long)total;
+}
+
+int openInput(const char* path, struct InputData* input) {
+    input->mapping = NULL;
+    input->owned = NULL;
+    int fd = open(path, O_RDONLY);
+    if (fd < 0)
+        return HUFF_ERR_IO;
+
+    struct stat st;
+    if (fstat(fd, &st) == 0 && S_ISREG(st.st_mode)) {
+        input->size = (size_t)st.st_size;
+        if (input->size == 0) {
+            input->data = (const unsigned char*)"";
+            close(fd);
+            return HUFF_OK;
+        }
+        void* mapping = mmap(NULL, input->size, PROT_READ, MAP_PRIVATE, fd, 0);
+        if (mapping != MAP_FAILED) {
+            posix_madvise(mapping, input->size, POSIX_MADV_SEQUENTIAL);
+            input->mapping = mapping;
+            input->data = mapping;
+            close(fd);
+            return HUFF_OK;
+        }
+    }
+
+    int status = readBlocks(input, &fd, readFd, NULL, 0);
+    close(fd);
+    return status;
+}
+
+int resizeFile(FILE* file, uint64_t size) {
+    return ftruncate(fileno(file), (off_t)size) == 0 ? HUFF_OK : HUFF_ERR_IO;
+}
+
+int writeAt(FILE* file, const void* data, size_t len, uint64_t offset) {
+    int fd = fileno(file);
+    const unsigned char* p = data;
+    while (len > 0) {
+        ssize_t n = pwrite(fd, p, len, (off_t)offset);
+        if (n <= 0)
+            return HUFF_ERR_IO;
+        p += n;
+        len -= (size_t)n;
+        offset += (uint64_t)n;
+    }
+    return HUFF_OK;
+}
+
+void closeInput(struct InputData* input) {
+    if (input->mapping)
+        munmap(input->mapping, input->size);
+    free(input->owned);
+    input->mapping = NULL;
+    input->owned = NULL;
+}
+
+#endif
@@ -0,0 +1,77 @@
+#include <string.h>
+#include "format.h"
+#include "huffman.h"
+
+void writePreamble(struct ByteSink* out, uint8_t container, uint8_t flags) {
+    unsigned char preamble[FORMAT_PREAMBLE_SIZE] = {0};
+    memcpy(preamble, FORMAT_MAGIC, FORMAT_MAGIC_SIZE);
+    preamble[4] = FORMAT_VERSION;
+    preamble[5] = container;
+    preamble[6] = flags;
+    sinkWrite(out, preamble, sizeof(preamble));
+}
+
+int hasPreamble(const unsigned char* in, size_t size) {
+    return size >= FORMAT_PREAMBLE_SIZE && memcmp(in, FORMAT_MAGIC, FORMAT_MAGIC_SIZE) == 0;
+}
+
+int readPreamble(const unsigned char* in, size_t size, struct Preamble* preamble) {
+    if (!hasPreamble(in, size))
+        return HUFF_ERR_FORMAT;
+    preamble->version = in[4];
+    preamble->container = in[5];
+    preamble->flags = in[6];
+    if (preamble->version != FORMAT_VERSION || preamble->container > CONTAINER_ADAPTIVE ||
+        (preamble->flags & ~FORMAT_KNOWN_FLAGS))
+        return HUFF_ERR_FORMAT;
+    return HUFF_OK;
+}
+
+void writeU32(struct ByteSink* out, uint32_t value) {
+    unsigned char bytes[4];
+    for (int i = 0; i < 4; i++)
+        bytes[i] = (unsigned char)(value >> (8 * i));
+    sinkWrite(out, bytes, sizeof(bytes));
+}
+
+void writeU64(struct ByteSink* out, uint64_t value) {
+    writeU32(out, (uint32_t)value);
+    writeU32(out, (uint32_t)(value >> 32));
+}
+
+uint32_t readU32(const unsigned char* in) {
+    return (uint32_t)in[0] | ((uint32_t)in[1] << 8) | ((uint32_t)in[2] << 16) | ((uint32_t)in[3] << 24);
+}
+
+uint64_t readU64(const unsigned char* in) {
+    return (uint64_t)readU32(in) | ((uint64_t)readU32(in + 4) << 32);
+}
+
+// Unsigned LEB128: seven bits per byte, high bit set on all but the last
+void writeVarint(struct ByteSink* out, uint64_t value) {
+    unsigned char bytes[10];
+    int n = 0;
+    do {
+        bytes[n] = value & 0x7f;
+        value >>= 7;
+        if (value)
+            bytes[n] |= 0x80;
+        n++;
+    } while (value);
+    sinkWrite(out, bytes, n);
+}
+
+int readVarint(const unsigned char* in, size_t size, size_t* pos, uint64_t* value) {
+    uint64_t result = 0;
+    for (int shift = 0; shift < 64; shift += 7) {
+        if (*pos >= size)
+            return HUFF_ERR_FORMAT;
+        unsigned char byte = in[(*pos)++];
+        result |= (uint64_t)(byte & 0x7f) << shift;
+        if (!(byte & 0x80)) {
+            *value = result;
+            return HUFF_OK;
+        }
+    }
+    return HUFF_ERR_FORMAT;
+}
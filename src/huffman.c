@@ -2,180 +2,286 @@
 #include <stdlib.h>
 #include <string.h>
 #include "huffman.h"
-#include "minheap.h"
+#include "adaptive.h"
+#include "blocks.h"
+#include "codec.h"
+#include "format.h"
+#include "fileio.h"
+#include "legacy.h"
+#include "sink.h"
+#include "stats.h"
 
-static void storeCodes(struct MinHeapNode* root, int arr[], int top, char* codes[]) {
-    if (root->left) {
-        arr[top] = 0;
-        storeCodes(root->left, arr, top + 1, codes);
-    }
-    if (root->right) {
-        arr[top] = 1;
-        storeCodes(root->right, arr, top + 1, codes);
-    }
-    if (isLeaf(root)) {
-        // Handle edge case: single node tree (top == 0)
-        // Assign a default code of "0" when there's only one unique character
-        if (top == 0) {
-            codes[(unsigned char)root->data] = malloc(2);
-            codes[(unsigned char)root->data][0] = '0';
-            codes[(unsigned char)root->data][1] = '\0';
-        } else {
-            codes[(unsigned char)root->data] = malloc(top + 1);
-            for (int i = 0; i < top; i++)
-                codes[(unsigned char)root->data][i] = arr[i] + '0';
-            codes[(unsigned char)root->data][top] = '\0';
-        }
-    }
+void huffmanDefaultOptions(struct HuffmanOptions* options) {
+    options->threads = 1;
+    options->blockSize = 0;
+    options->stats = NULL;
+    options->progress = NULL;
+    options->cancel = NULL;
+    options->maxCodeLength = 0;
+    options->adaptive = 0;
+    options->context = 0;
+    options->dictionary = NULL;
+    options->maxOutputSize = 0;
 }
 
-static void writeHeader(FILE* out, int freq[], long originalSize) {
-    // Write original file size first (for proper decompression)
-    fwrite(&originalSize, sizeof(long), 1, out);
-    fwrite(freq, sizeof(int), 256, out);
+static int encodeFile(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                      struct ByteSink* out) {
+    if (options->adaptive)
+        return encodeAdaptive(in, size, options, out);
+    if (options->blockSize || options->threads != 1)
+        return encodeBlocks(in, size, options, out);
+    writePreamble(out, CONTAINER_SINGLE, FORMAT_FLAG_CHECKSUM);
+    return encodeCheckedStream(in, size, options, out);
 }
 
-static long readHeader(FILE* in, int freq[]) {
-    long originalSize;
-    fread(&originalSize, sizeof(long), 1, in);
-    fread(freq, sizeof(int), 256, in);
-    return originalSize;
+static int decodeFile(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                      struct ByteSink* out) {
+    if (!hasPreamble(in, size))
+        return decodeLegacyStream(in, size, options, out);
+
+    struct Preamble preamble;
+    int status = readPreamble(in, size, &preamble);
+    if (status != HUFF_OK)
+        return status;
+    size_t pos = FORMAT_PREAMBLE_SIZE;
+    if (preamble.container == CONTAINER_BLOCKS)
+        return decodeBlocks(in, size, pos, preamble.flags, options, out);
+    if (preamble.container == CONTAINER_ADAPTIVE)
+        return decodeAdaptive(in, size, pos, preamble.flags, options, out);
+    if (preamble.flags & FORMAT_FLAG_CHECKSUM)
+        return decodeCheckedStream(in, size, &pos, options, out);
+    return decodeStream(in, size, &pos, options, out);
 }
 
-void compressFile(const char* inputFile, const char* outputFile) {
-    FILE* in = fopen(inputFile, "rb");
-    if (!in) {
-        fprintf(stderr, "Error: Cannot open input file '%s'\n", inputFile);
-        return;
-    }
-    
-    FILE* out = fopen(outputFile, "wb");
-    if (!out) {
-        fprintf(stderr, "Error: Cannot create output file '%s'\n", outputFile);
-        fclose(in);
-        return;
-    }
+// Compress from a stream without knowing its length up front
+static int encodeFileStream(FILE* in, const struct HuffmanOptions* options, struct ByteSink* out) {
+    if (options->adaptive)
+        return encodeAdaptiveStream(in, options, out);
+    return encodeBlockStream(in, options, out);
+}
+
+/*
+ * Decode from a stream: block and adaptive containers are decoded as they
+ * arrive, while single streams and legacy files are read in full first.
+ */
+static int decodeFileStream(FILE* in, const struct HuffmanOptions* options, struct ByteSink* out) {
+    struct HuffmanStats* stats = options->stats;
+    uint64_t start = monotonicNs();
+    unsigned char head[FORMAT_PREAMBLE_SIZE];
+    size_t n = fread(head, 1, sizeof(head), in);
+    if (ferror(in))
+        return HUFF_ERR_IO;
 
-    // Calculate original file size
-    fseek(in, 0, SEEK_END);
-    long originalSize = ftell(in);
-    rewind(in);
-
-    // Handle empty file case
-    if (originalSize == 0) {
-        int freq[256] = {0};
-        writeHeader(out, freq, 0);
-        fclose(in);
-        fclose(out);
-        return;
+    struct Preamble preamble;
+    if (hasPreamble(head, n) && readPreamble(head, n, &preamble) == HUFF_OK &&
+        preamble.container != CONTAINER_SINGLE) {
+        if (stats)
+            stats->phaseNs[HUFF_PHASE_READ] += monotonicNs() - start;
+        if (preamble.container == CONTAINER_ADAPTIVE)
+            return decodeAdaptiveStream(in, preamble.flags, options, out);
+        return decodeBlockStream(in, preamble.flags, options, out);
     }
 
-    int freq[256] = {0};
-    int c;
-    while ((c = fgetc(in)) != EOF)
-        freq[c]++;
-
-    char data[256];
-    int freqArr[256], size = 0;
-    for (int i = 0; i < 256; i++)
-        if (freq[i]) {
-            data[size] = (char)i;
-            freqArr[size++] = freq[i];
+    struct InputData input;
+    int status = readInputStream(in, head, n, &input);
+    if (status == HUFF_OK) {
+        if (stats) {
+            stats->inputSize = input.size;
+            stats->phaseNs[HUFF_PHASE_READ] += monotonicNs() - start;
         }
+        status = decodeFile(input.data, input.size, options, out);
+    }
+    closeInput(&input);
+    return status;
+}
 
-    struct MinHeapNode* root = buildHuffmanTree(data, freqArr, size);
-
-    char* codes[256] = {0};
-    int arr[MAX_TREE_HT];
-    storeCodes(root, arr, 0, codes);
+typedef int (*FileCodec)(const unsigned char*, size_t, const struct HuffmanOptions*, struct ByteSink*);
+typedef int (*StreamCodec)(FILE*, const struct HuffmanOptions*, struct ByteSink*);
 
-    writeHeader(out, freq, originalSize);
+/*
+ * Run `codec` over a mapped input file, or `streamCodec` when the input is
+ * "-" (stdin) or another stream; an output of "-" writes to stdout, and a
+ * NULL output runs the codec for its status alone, discarding the output.
+ */
+static int processFile(const char* inputFile, const char* outputFile, const struct HuffmanOptions* options,
+                       FileCodec codec, StreamCodec streamCodec) {
+    struct HuffmanOptions defaults;
+    if (!options) {
+        huffmanDefaultOptions(&defaults);
+        options = &defaults;
+    }
 
-    rewind(in);
-    unsigned char buffer = 0;
-    int bits = 0;
+    struct HuffmanStats* stats = options->stats;
+    uint64_t start = monotonicNs();
+    if (stats)
+        memset(stats, 0, sizeof(*stats));
+    setProgress(options, 0);
 
-    while ((c = fgetc(in)) != EOF) {
-        for (char* p = codes[c]; *p; p++) {
-            buffer = (buffer << 1) | (*p - '0');
-            if (++bits == 8) {
-                fwrite(&buffer, 1, 1, out);
-                buffer = bits = 0;
-            }
+    struct InputData input;
+    FILE* stream = NULL;
+    int status = HUFF_OK;
+    if (isStreamPath(inputFile)) {
+        stream = openInputStream(inputFile);
+        if (!stream)
+            return HUFF_ERR_IO;
+    } else {
+        status = openInput(inputFile, &input);
+        if (status != HUFF_OK)
+            return status;
+        if (stats) {
+            stats->inputSize = input.size;
+            stats->phaseNs[HUFF_PHASE_READ] += monotonicNs() - start;
         }
     }
-    if (bits) {
-        buffer <<= (8 - bits);
-        fwrite(&buffer, 1, 1, out);
+
+    FILE* out = outputFile ? openOutput(outputFile) : NULL;
+    if (outputFile && !out) {
+        if (stream)
+            closeStream(stream);
+        else
+            closeInput(&input);
+        return HUFF_ERR_IO;
     }
 
-    // Free allocated codes
-    for (int i = 0; i < 256; i++) {
-        if (codes[i]) free(codes[i]);
+    // Never delete devices or FIFOs that happen to be named as the output
+    int removable = out && isRegularStream(out);
+
+    struct ByteSink sink;
+    if (out)
+        sinkInitFile(&sink, out, IO_BUFFER_SIZE);
+    else
+        sinkInitDiscard(&sink, IO_BUFFER_SIZE);
+    sink.limit = options->maxOutputSize;
+    if (sink.error)
+        status = sinkStatus(&sink);
+    else if (stream)
+        status = streamCodec(stream, options, &sink);
+    else
+        status = codec(input.data, input.size, options, &sink);
+    if (status == HUFF_OK && !stream)
+        setProgress(options, input.size);
+    if (sinkFlush(&sink) != 0 && status == HUFF_OK)
+        status = HUFF_ERR_IO;
+    uint64_t closing = monotonicNs();
+    if (out && closeStream(out) != 0 && status == HUFF_OK)
+        status = HUFF_ERR_IO;
+    uint64_t closed = monotonicNs();
+    if (stream)
+        closeStream(stream);
+    else
+        closeInput(&input);
+    if (stats) {
+        stats->outputSize = sinkTell(&sink);
+        stats->phaseNs[HUFF_PHASE_WRITE] += sink.flushNs + (closed - closing);
+        stats->totalNs = monotonicNs() - start;
+        finishStats(stats);
     }
+    sinkFree(&sink);
 
-    fclose(in);
-    fclose(out);
+    // A failed or canceled run leaves no partial output behind
+    if (status != HUFF_OK && removable)
+        remove(outputFile);
+    return status;
 }
 
-void decompressFile(const char* inputFile, const char* outputFile) {
-    FILE* in = fopen(inputFile, "rb");
-    if (!in) {
-        fprintf(stderr, "Error: Cannot open input file '%s'\n", inputFile);
-        return;
-    }
-    
-    FILE* out = fopen(outputFile, "wb");
-    if (!out) {
-        fprintf(stderr, "Error: Cannot create output file '%s'\n", outputFile);
-        fclose(in);
-        return;
+static int processBuffer(const unsigned char* input, size_t inputSize, unsigned char** output,
+                         size_t* outputSize, const struct HuffmanOptions* options, FileCodec codec) {
+    if (!output || !outputSize || (!input && inputSize))
+        return HUFF_ERR_ARG;
+    struct HuffmanOptions defaults;
+    if (!options) {
+        huffmanDefaultOptions(&defaults);
+        options = &defaults;
     }
 
-    int freq[256];
-    long originalSize = readHeader(in, freq);
+    struct HuffmanStats* stats = options->stats;
+    uint64_t start = monotonicNs();
+    if (stats) {
+        memset(stats, 0, sizeof(*stats));
+        stats->inputSize = inputSize;
+    }
+    setProgress(options, 0);
 
-    // Handle empty file case
-    if (originalSize == 0) {
-        fclose(in);
-        fclose(out);
-        return;
+    struct ByteSink sink;
+    sinkInitMemory(&sink, inputSize + 64);
+    sink.limit = options->maxOutputSize;
+    int status = sink.error ? sinkStatus(&sink) : codec(input, inputSize, options, &sink);
+    if (status == HUFF_OK)
+        setProgress(options, inputSize);
+    if (status == HUFF_OK)
+        status = sinkStatus(&sink);
+    if (status != HUFF_OK) {
+        sinkFree(&sink);
+        return status;
+    }
+    *output = sinkDetach(&sink, outputSize);
+    if (stats) {
+        stats->outputSize = *outputSize;
+        stats->totalNs = monotonicNs() - start;
+        finishStats(stats);
     }
+    return HUFF_OK;
+}
 
-    char data[256];
-    int freqArr[256], size = 0;
-    for (int i = 0; i < 256; i++)
-        if (freq[i]) {
-            data[size] = (char)i;
-            freqArr[size++] = freq[i];
-        }
+int compressFile(const char* inputFile, const char* outputFile) {
+    return processFile(inputFile, outputFile, NULL, encodeFile, encodeFileStream);
+}
 
-    struct MinHeapNode* root = buildHuffmanTree(data, freqArr, size);
-    
-    // Handle single unique character case
-    if (isLeaf(root)) {
-        for (long i = 0; i < originalSize; i++) {
-            fputc(root->data, out);
-        }
-        fclose(in);
-        fclose(out);
-        return;
-    }
-    
-    struct MinHeapNode* cur = root;
-    long bytesWritten = 0;
-
-    int byte;
-    while ((byte = fgetc(in)) != EOF && bytesWritten < originalSize) {
-        for (int i = 7; i >= 0 && bytesWritten < originalSize; i--) {
-            cur = ((byte >> i) & 1) ? cur->right : cur->left;
-            if (isLeaf(cur)) {
-                fputc(cur->data, out);
-                bytesWritten++;
-                cur = root;
-            }
-        }
+int compressFileWithOptions(const char* inputFile, const char* outputFile,
+                            const struct HuffmanOptions* options) {
+    return processFile(inputFile, outputFile, options, encodeFile, encodeFileStream);
+}
+
+int decompressFile(const char* inputFile, const char* outputFile) {
+    return processFile(inputFile, outputFile, NULL, decodeFile, decodeFileStream);
+}
+
+int decompressFileWithOptions(const char* inputFile, const char* outputFile,
+                              const struct HuffmanOptions* options) {
+    return processFile(inputFile, outputFile, options, decodeFile, decodeFileStream);
+}
+
+int huffmanTestFile(const char* inputFile, const struct HuffmanOptions* options) {
+    return processFile(inputFile, NULL, options, decodeFile, decodeFileStream);
+}
+
+int compressBuffer(const unsigned char* input, size_t inputSize,
+                   unsigned char** output, size_t* outputSize) {
+    return processBuffer(input, inputSize, output, outputSize, NULL, encodeFile);
+}
+
+int compressBufferWithOptions(const unsigned char* input, size_t inputSize,
+                              unsigned char** output, size_t* outputSize,
+                              const struct HuffmanOptions* options) {
+    return processBuffer(input, inputSize, output, outputSize, options, encodeFile);
+}
+
+int decompressBuffer(const unsigned char* input, size_t inputSize,
+                     unsigned char** output, size_t* outputSize) {
+    return processBuffer(input, inputSize, output, outputSize, NULL, decodeFile);
+}
+
+int decompressBufferWithOptions(const unsigned char* input, size_t inputSize,
+                                unsigned char** output, size_t* outputSize,
+                                const struct HuffmanOptions* options) {
+    return processBuffer(input, inputSize, output, outputSize, options, decodeFile);
+}
+
+void freeBuffer(unsigned char* buffer) {
+    free(buffer);
+}
+
+const char* huffmanStrerror(int status) {
+    switch (status) {
+    case HUFF_OK: return "Success";
+    case HUFF_ERR_IO: return "I/O error";
+    case HUFF_ERR_NOMEM: return "Out of memory";
+    case HUFF_ERR_FORMAT: return "Invalid or corrupt compressed data";
+    case HUFF_ERR_ARG: return "Invalid argument";
+    case HUFF_ERR_CANCELED: return "Canceled";
+    case HUFF_ERR_DICTIONARY: return "Compressed with a dictionary that was not supplied";
+    case HUFF_ERR_CHECKSUM: return "Checksum mismatch: the decompressed data is corrupt";
+    case HUFF_ERR_LIMIT: return "Output exceeds the size limit";
+    default: return "Unknown error";
     }
-    fclose(in);
-    fclose(out);
 }
@@ -0,0 +1,87 @@
+#include <string.h>
+#include "legacy.h"
+#include "canonical.h"
+#include "decoder.h"
+#include "huffman.h"
+#include "minheap.h"
+#include "stats.h"
+
+static size_t readHeader(const unsigned char* in, size_t size, int freq[], long* originalSize) {
+    size_t headerSize = sizeof(long) + sizeof(int) * 256;
+    if (size < headerSize)
+        return 0;
+    memcpy(originalSize, in, sizeof(long));
+    memcpy(freq, in + sizeof(long), sizeof(int) * 256);
+    return headerSize;
+}
+
+int decodeLegacyStream(const unsigned char* in, size_t size, const struct HuffmanOptions* options,
+                       struct ByteSink* out) {
+    int freq[256];
+    long originalSize;
+    size_t pos = readHeader(in, size, freq, &originalSize);
+    if (pos == 0 || originalSize < 0)
+        return HUFF_ERR_FORMAT;
+
+    // Handle empty file case
+    if (originalSize == 0)
+        return HUFF_OK;
+
+    unsigned char data[256];
+    int freqArr[256], count = 0;
+    for (int i = 0; i < 256; i++)
+        if (freq[i]) {
+            data[count] = (unsigned char)i;
+            freqArr[count++] = freq[i];
+        }
+    if (count == 0)
+        return HUFF_ERR_FORMAT;
+
+    struct HuffmanTree tree;
+    int root = buildHuffmanTree(&tree, data, freqArr, count);
+    const struct MinHeapNode* nodes = tree.nodes;
+
+    // Handle single unique character case
+    if (isLeaf(&nodes[root])) {
+        unsigned char run[4096];
+        memset(run, nodes[root].data, sizeof(run));
+        for (long left = originalSize; left > 0 && !out->error;) {
+            size_t n = left < (long)sizeof(run) ? (size_t)left : sizeof(run);
+            sinkWrite(out, run, n);
+            left -= (long)n;
+            setProgress(options, pos);
+            if (isCanceled(options))
+                return HUFF_ERR_CANCELED;
+        }
+        return sinkStatus(out);
+    }
+
+    uint8_t lengths[256] = {0};
+    uint32_t codes[256] = {0};
+    if (storeCodeWords(&tree, root, 0, 0, lengths, codes) <= DECODE_MAX_CODE_LEN) {
+        struct DecodeTable table;
+        int status = buildDecodeTable(&table, lengths, codes);
+        if (status != HUFF_OK)
+            return status;
+        status = decodeSymbols(&table, in, size, &pos, (uint64_t)originalSize, options, out);
+        freeDecodeTable(&table);
+        return status;
+    }
+
+    // Trees deeper than the table decoder supports are walked bit by bit
+    int cur = root;
+    long bytesWritten = 0;
+
+    for (; pos < size && bytesWritten < originalSize; pos++) {
+        int byte = in[pos];
+        for (int i = 7; i >= 0 && bytesWritten < originalSize; i--) {
+            cur = ((byte >> i) & 1) ? nodes[cur].right : nodes[cur].left;
+            if (isLeaf(&nodes[cur])) {
+                sinkPutByte(out, nodes[cur].data);
+                bytesWritten++;
+                cur = root;
+            }
+        }
+    }
+    return sinkStatus(out);
+}
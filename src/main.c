@@ -1,22 +1,473 @@
+#define _POSIX_C_SOURCE 200809L
+
+#include <errno.h>
+#include <inttypes.h>
+#include <pthread.h>
+#include <signal.h>
 #include <stdio.h>
+#include <stdlib.h>
 #include <string.h>
+#include <sys/stat.h>
+#include <time.h>
+#ifdef _WIN32
+#include <windows.h>
+#include <psapi.h>
+#elif !defined(__linux__)
+#include <sys/resource.h>
+#endif
+#include "batch.h"
 #include "huffman.h"
+#include "serve.h"
 
-int main(int argc, char* argv[]) {
-    if (argc != 4) {
-        printf("Usage:\n");
-        printf("  %s compress <input> <output>\n", argv[0]);
-        printf("  %s decompress <input> <output>\n", argv[0]);
+// How often --progress reports
+#define PROGRESS_PERIOD_MS 200
+
+// Most worker threads -t accepts
+#define MAX_THREADS 1024
+
+// Set by Ctrl-C and handed to the engine as its cancel flag
+static volatile int interrupted;
+
+static void onInterrupt(int sig) {
+    interrupted = 1;
+    // A second Ctrl-C kills the process outright
+    signal(sig, SIG_DFL);
+}
+
+/*
+ * Background thread for --progress: prints "progress <done> <total>" to
+ * stderr every PROGRESS_PERIOD_MS, where done counts input bytes processed
+ * and total is the input size (0 when reading a pipe).
+ */
+struct ProgressReporter {
+    pthread_t thread;
+    pthread_mutex_t lock;
+    pthread_cond_t wake;
+    int stop;
+    volatile uint64_t done;
+    uint64_t total;
+};
+
+static void* reportProgress(void* arg) {
+    struct ProgressReporter* reporter = arg;
+    pthread_mutex_lock(&reporter->lock);
+    while (!reporter->stop) {
+        struct timespec deadline;
+        timespec_get(&deadline, TIME_UTC);
+        deadline.tv_nsec += PROGRESS_PERIOD_MS * 1000000L;
+        if (deadline.tv_nsec >= 1000000000L) {
+            deadline.tv_sec++;
+            deadline.tv_nsec -= 1000000000L;
+        }
+        pthread_cond_timedwait(&reporter->wake, &reporter->lock, &deadline);
+        fprintf(stderr, "progress %" PRIu64 " %" PRIu64 "\n", reporter->done, reporter->total);
+    }
+    pthread_mutex_unlock(&reporter->lock);
+    return NULL;
+}
+
+// Size of a regular input file, or 0 for stdin and other streams
+static uint64_t inputSize(const char* inputFile) {
+    struct stat st;
+    return strcmp(inputFile, "-") != 0 && stat(inputFile, &st) == 0 && S_ISREG(st.st_mode)
+           ? (uint64_t)st.st_size : 0;
+}
+
+static int startProgress(struct ProgressReporter* reporter, uint64_t total) {
+    reporter->stop = 0;
+    reporter->done = 0;
+    reporter->total = total;
+    pthread_mutex_init(&reporter->lock, NULL);
+    pthread_cond_init(&reporter->wake, NULL);
+    return pthread_create(&reporter->thread, NULL, reportProgress, reporter);
+}
+
+static void stopProgress(struct ProgressReporter* reporter) {
+    pthread_mutex_lock(&reporter->lock);
+    reporter->stop = 1;
+    pthread_cond_signal(&reporter->wake);
+    pthread_mutex_unlock(&reporter->lock);
+    pthread_join(reporter->thread, NULL);
+    pthread_cond_destroy(&reporter->wake);
+    pthread_mutex_destroy(&reporter->lock);
+}
+
+static void printUsage(const char* program) {
+    printf("Usage:\n");
+    printf("  %s [options] compress <input> <output>\n", program);
+    printf("  %s [options] decompress <input> <output>\n", program);
+    printf("  %s [options] batch compress|decompress <output-dir> <input>...\n", program);
+    printf("  %s [options] train <dict-file> <sample>...\n", program);
+    printf("  %s [options] serve <socket>\n", program);
+    printf("  %s [options] test <input>...\n", program);
+    printf("\nUse - as <input> or <output> for stdin or stdout.\n");
+    printf("Batch inputs are files, directories (not recursed) or @list files with one\n");
+    printf("path per line (@- reads the list from stdin).\n");
+    printf("Train builds one code table from the sample files for use with --dict.\n");
+    printf("Serve runs compress and decompress jobs sent over a Unix socket on -j workers\n");
+    printf("(with --dict, for the jobs that ask for it) until Ctrl-C.\n");
+    printf("Test decodes each input without writing it and checks its checksums.\n");
+    printf("\nOptions:\n");
+    printf("  -t, --threads N      code blocks on N threads (0 = one per CPU)\n");
+    printf("  -b, --block-size N   block size in bytes, K/M suffixes allowed (default 1M)\n");
+    printf("  --max-code-len N     cap code lengths at N bits (8-24, default 24); 11 or less\n");
+    printf("                       decodes with a single table lookup per symbol\n");
+    printf("  --context            order-1 mode: a code table per preceding byte, similar\n");
+    printf("                       contexts sharing one (used only where it comes out smaller)\n");
+    printf("  --adaptive           compress in a single pass with an adaptive code: no\n");
+    printf("                       table or size up front, output flushed as input arrives\n");
+    printf("                       (for live pipes and growing logs; ignores -t and -b)\n");
+    printf("  --dict FILE          code with the table in a trained dictionary, storing only\n");
+    printf("                       its id (small files); decompress needs the same FILE\n");
+    printf("  --table-cache N      memory for reusing built code tables across files and\n");
+    printf("                       blocks, K/M suffixes allowed (default 8M, 0 = off)\n");
+    printf("  -j, --jobs N         batch: files processed at once, serve: jobs run at once\n");
+    printf("                       (default 0 = one per CPU)\n");
+    printf("  --stats=json         print sizes, histogram and per-phase timings as JSON\n");
+    printf("                       (to stdout, or stderr when <output> is -)\n");
+    printf("  --progress           print \"progress <done> <total>\" lines to stderr\n");
+    printf("\nCtrl-C stops the job and removes the partial output.\n");
+}
+
+/*
+ * Peak resident set size of this process in KB, or 0 if unknown.  Linux
+ * reads VmHWM because ru_maxrss also counts the parent's memory at the
+ * time of fork, which would swamp small runs launched from a script.
+ */
+static uint64_t peakRssKb(void) {
+#if defined(__linux__)
+    FILE* status = fopen("/proc/self/status", "r");
+    char line[256];
+    unsigned long long kb = 0;
+    while (status && fgets(line, sizeof(line), status)) {
+        if (sscanf(line, "VmHWM: %llu", &kb) == 1)
+            break;
+    }
+    if (status)
+        fclose(status);
+    return kb;
+#elif defined(_WIN32)
+    PROCESS_MEMORY_COUNTERS counters;
+    if (GetProcessMemoryInfo(GetCurrentProcess(), &counters, sizeof(counters)))
+        return counters.PeakWorkingSetSize / 1024;
+    return 0;
+#else
+    struct rusage usage;
+    if (getrusage(RUSAGE_SELF, &usage) != 0)
+        return 0;
+#ifdef __APPLE__
+    return (uint64_t)usage.ru_maxrss / 1024;
+#else
+    return (uint64_t)usage.ru_maxrss;
+#endif
+#endif
+}
+
+// One JSON object per run; phase times are nanoseconds, summed over worker threads
+static void printStatsJson(FILE* file, const char* operation, const struct HuffmanStats* stats) {
+    static const char* const phases[HUFF_PHASE_COUNT] = {"read", "histogram", "table", "code", "write"};
+
+    fprintf(file, "{\"operation\": \"%s\", ", operation);
+    fprintf(file, "\"input_size\": %" PRIu64 ", \"output_size\": %" PRIu64 ", ",
+            stats->inputSize, stats->outputSize);
+    fprintf(file, "\"entropy\": %.6f, \"average_code_length\": %.6f, \"coded_bits\": %" PRIu64 ", ",
+            stats->entropy, stats->averageCodeLength, stats->codedBits);
+    fprintf(file, "\"limit_loss_bits\": %" PRIu64 ", ", stats->limitLossBits);
+    struct HuffmanCacheStats cache;
+    huffmanTableCacheStats(&cache);
+    fprintf(file, "\"table_cache\": {\"hits\": %" PRIu64 ", \"misses\": %" PRIu64 ", \"evictions\": %" PRIu64
+            ", \"entries\": %" PRIu64 ", \"bytes\": %" PRIu64 "}, ",
+            cache.hits, cache.misses, cache.evictions, cache.entries, cache.bytes);
+    fprintf(file, "\"total_ns\": %" PRIu64 ", \"peak_rss_kb\": %" PRIu64 ", \"phases_ns\": {",
+            stats->totalNs, peakRssKb());
+    for (int p = 0; p < HUFF_PHASE_COUNT; p++)
+        fprintf(file, "%s\"%s\": %" PRIu64, p ? ", " : "", phases[p], stats->phaseNs[p]);
+    fprintf(file, "}, \"histogram\": [");
+    for (int s = 0; s < 256; s++)
+        fprintf(file, "%s%" PRIu64, s ? ", " : "", stats->histogram[s]);
+    fprintf(file, "]}\n");
+}
+
+// Aggregate throughput on stderr, then every file that failed
+static void printBatchSummary(const char* operation, const struct Batch* batch, size_t failed,
+                              const struct HuffmanStats* total) {
+    size_t canceled = 0;
+    for (size_t i = 0; i < batch->count; i++)
+        canceled += batch->jobs[i].status == HUFF_ERR_CANCELED;
+    double seconds = total->totalNs / 1e9;
+    fprintf(stderr, "%s: %zu files, %zu failed, %zu canceled, %.2f MB -> %.2f MB in %.2f s (%.1f MB/s)\n",
+            operation, batch->count, failed, canceled, total->inputSize / 1e6, total->outputSize / 1e6,
+            seconds, seconds > 0 ? total->inputSize / 1e6 / seconds : 0.0);
+    for (size_t i = 0; i < batch->count; i++) {
+        const struct BatchJob* job = &batch->jobs[i];
+        if (job->status != HUFF_OK && job->status != HUFF_ERR_CANCELED)
+            fprintf(stderr, "Failed: %s: %s\n", job->input, huffmanStrerror(job->status));
+    }
+}
+
+/*
+ * Decode every input without writing anything, printing "<input>: OK" and
+ * the decoded size for each good one; returns how many failed, or -1 when
+ * interrupted.
+ */
+static int testFiles(char* const inputs[], int count, const struct HuffmanOptions* options, int progress) {
+    struct HuffmanOptions local = *options;
+    struct HuffmanStats stats;
+    struct ProgressReporter reporter;
+    local.stats = &stats;
+    int failed = 0;
+    for (int i = 0; i < count; i++) {
+        local.progress = NULL;
+        if (progress && startProgress(&reporter, inputSize(inputs[i])) == 0)
+            local.progress = &reporter.done;
+        int status = huffmanTestFile(inputs[i], &local);
+        if (local.progress)
+            stopProgress(&reporter);
+        if (status == HUFF_ERR_CANCELED)
+            return -1;
+        if (status != HUFF_OK) {
+            printf("%s: FAILED (%s)\n", inputs[i], huffmanStrerror(status));
+            failed++;
+            continue;
+        }
+        printf("%s: OK (%" PRIu64 " bytes)\n", inputs[i], stats.outputSize);
+        if (options->stats)
+            printStatsJson(stdout, "test", &stats);
+    }
+    return failed;
+}
+
+// Parse a plain decimal count no larger than `max`
+static int parseCount(const char* text, unsigned max, unsigned* value) {
+    char* end;
+    if (*text < '0' || *text > '9')
+        return -1;
+    errno = 0;
+    unsigned long n = strtoul(text, &end, 10);
+    if (*end != '\0' || errno == ERANGE || n > max)
+        return -1;
+    *value = (unsigned)n;
+    return 0;
+}
+
+// Parse a byte count with an optional K, M or G suffix
+static int parseSize(const char* text, size_t* value) {
+    char* end;
+    unsigned long long n = strtoull(text, &end, 10);
+    if (end == text)
+        return -1;
+    switch (*end) {
+    case 'k': case 'K': n <<= 10; end++; break;
+    case 'm': case 'M': n <<= 20; end++; break;
+    case 'g': case 'G': n <<= 30; end++; break;
+    default: break;
+    }
+    if (*end != '\0')
+        return -1;
+    *value = (size_t)n;
+    return 0;
+}
+
+/*
+ * Match `-s VALUE`, `--long VALUE` or `--long=VALUE` at argv[*i];
+ * returns the value (advancing *i past it) or NULL.
+ */
+static const char* optionValue(int argc, char* argv[], int* i, const char* shortName, const char* longName) {
+    const char* arg = argv[*i];
+    size_t longLen = strlen(longName);
+    if (strncmp(arg, longName, longLen) == 0 && arg[longLen] == '=')
+        return arg + longLen + 1;
+    if (strcmp(arg, shortName) == 0 || strcmp(arg, longName) == 0) {
+        if (*i + 1 >= argc)
+            return NULL;
+        return argv[++*i];
+    }
+    return NULL;
+}
+
+// Parse the command line into `positional` (room for argc entries) and run it; returns the exit status
+static int runCommand(int argc, char* argv[], char** positional) {
+    struct HuffmanOptions options;
+    struct HuffmanStats stats;
+    struct ProgressReporter reporter;
+    int progress = 0;
+    unsigned jobs = 0;
+    const char* dictFile = NULL;
+    huffmanDefaultOptions(&options);
+
+    int count = 0;
+    for (int i = 1; i < argc; i++) {
+        const char* value;
+        size_t size;
+        if (argv[i][0] != '-' || argv[i][1] == '\0') {
+            positional[count++] = argv[i];
+        } else if ((value = optionValue(argc, argv, &i, "-t", "--threads"))) {
+            if (parseCount(value, MAX_THREADS, &options.threads) != 0) {
+                fprintf(stderr, "Error: Thread count must be a number from 0 to %d\n", MAX_THREADS);
+                return 1;
+            }
+        } else if ((value = optionValue(argc, argv, &i, "-b", "--block-size"))) {
+            if (parseSize(value, &size) != 0 || size < HUFF_MIN_BLOCK_SIZE || size > HUFF_MAX_BLOCK_SIZE) {
+                fprintf(stderr, "Error: Block size must be between 1K and 1G\n");
+                return 1;
+            }
+            options.blockSize = size;
+        } else if ((value = optionValue(argc, argv, &i, "--max-code-len", "--max-code-len"))) {
+            if (parseSize(value, &size) != 0 || size < HUFF_MIN_CODE_LENGTH || size > HUFF_MAX_CODE_LENGTH) {
+                fprintf(stderr, "Error: Maximum code length must be between %d and %d\n",
+                        HUFF_MIN_CODE_LENGTH, HUFF_MAX_CODE_LENGTH);
+                return 1;
+            }
+            options.maxCodeLength = (unsigned)size;
+        } else if ((value = optionValue(argc, argv, &i, "--table-cache", "--table-cache"))) {
+            if (parseSize(value, &size) != 0) {
+                fprintf(stderr, "Error: Invalid table cache size '%s'\n", value);
+                return 1;
+            }
+            huffmanSetTableCacheLimit(size);
+        } else if ((value = optionValue(argc, argv, &i, "-j", "--jobs"))) {
+            if (parseSize(value, &size) != 0) {
+                fprintf(stderr, "Error: Invalid job count '%s'\n", value);
+                return 1;
+            }
+            jobs = (unsigned)size;
+        } else if ((value = optionValue(argc, argv, &i, "--stats", "--stats"))) {
+            if (strcmp(value, "json") != 0) {
+                fprintf(stderr, "Error: Unknown stats format '%s' (expected json)\n", value);
+                return 1;
+            }
+            options.stats = &stats;
+        } else if ((value = optionValue(argc, argv, &i, "--dict", "--dict"))) {
+            dictFile = value;
+        } else if (strcmp(argv[i], "--context") == 0) {
+            options.context = 1;
+        } else if (strcmp(argv[i], "--adaptive") == 0) {
+            options.adaptive = 1;
+        } else if (strcmp(argv[i], "--progress") == 0) {
+            progress = 1;
+        } else {
+            fprintf(stderr, "Error: Unknown option '%s'\n", argv[i]);
+            printUsage(argv[0]);
+            return 1;
+        }
+    }
+
+    signal(SIGINT, onInterrupt);
+    options.cancel = &interrupted;
+
+    if (count > 0 && strcmp(positional[0], "train") == 0) {
+        if (count < 3) {
+            printUsage(argv[0]);
+            return 1;
+        }
+        uint64_t total = 0;
+        for (int i = 2; i < count; i++)
+            total += inputSize(positional[i]);
+        if (progress && startProgress(&reporter, total) == 0)
+            options.progress = &reporter.done;
+        int status = huffmanTrainDictionary((const char* const*)positional + 2, (size_t)(count - 2),
+                                            positional[1], &options);
+        if (options.progress)
+            stopProgress(&reporter);
+        if (status != HUFF_OK)
+            fprintf(stderr, "Error: Cannot train dictionary '%s': %s\n", positional[1], huffmanStrerror(status));
+        else if (options.stats)
+            printStatsJson(stdout, "train", &stats);
+        if (status == HUFF_ERR_CANCELED)
+            return 130;
+        return status == HUFF_OK ? 0 : 1;
+    }
+
+    int isBatch = count > 0 && strcmp(positional[0], "batch") == 0;
+    int isServe = count > 0 && strcmp(positional[0], "serve") == 0;
+    int isTest = count > 0 && strcmp(positional[0], "test") == 0;
+    if (isServe ? count != 2 : isTest ? count < 2 : isBatch ? count < 4 : count != 3) {
+        printUsage(argv[0]);
         return 1;
     }
+    const char* operation = positional[isBatch];
 
-    if (strcmp(argv[1], "compress") == 0)
-        compressFile(argv[2], argv[3]);
-    else if (strcmp(argv[1], "decompress") == 0)
-        decompressFile(argv[2], argv[3]);
-    else
+    BatchRun run = NULL;
+    if (isServe)
+        signal(SIGTERM, onInterrupt);
+    else if (strcmp(operation, "compress") == 0)
+        run = compressFileWithOptions;
+    else if (strcmp(operation, "decompress") == 0)
+        run = decompressFileWithOptions;
+    else if (!isTest) {
         printf("Invalid option\n");
+        return 1;
+    }
 
-    return 0;
+    // Loaded once and shared by every file and worker thread
+    struct HuffmanDictionary* dictionary = NULL;
+    if (dictFile) {
+        int status = huffmanLoadDictionary(dictFile, &dictionary);
+        if (status != HUFF_OK) {
+            fprintf(stderr, "Error: Cannot load dictionary '%s': %s\n", dictFile, huffmanStrerror(status));
+            return 1;
+        }
+        options.dictionary = dictionary;
+    }
+
+    if (isTest) {
+        int failed = testFiles(positional + 1, count - 1, &options, progress);
+        huffmanFreeDictionary(dictionary);
+        if (failed < 0)
+            return 130;
+        return failed ? 1 : 0;
+    }
+
+    if (isServe) {
+        int status = serveSocket(positional[1], jobs, &options);
+        huffmanFreeDictionary(dictionary);
+        return status == HUFF_OK ? 0 : 1;
+    }
+
+    if (isBatch) {
+        struct Batch batch;
+        if (loadBatch(&batch, run == compressFileWithOptions, positional[2], positional + 3, count - 3) != HUFF_OK) {
+            huffmanFreeDictionary(dictionary);
+            return 1;
+        }
+        if (progress && startProgress(&reporter, batch.totalSize) == 0)
+            options.progress = &reporter.done;
+        size_t failed = runBatch(&batch, run, jobs, &options, &stats);
+        if (options.progress)
+            stopProgress(&reporter);
+        printBatchSummary(operation, &batch, failed, &stats);
+        if (options.stats)
+            printStatsJson(stdout, operation, &stats);
+        freeBatch(&batch);
+        huffmanFreeDictionary(dictionary);
+        if (interrupted)
+            return 130;
+        return failed ? 1 : 0;
+    }
+
+    if (progress && startProgress(&reporter, inputSize(positional[1])) == 0)
+        options.progress = &reporter.done;
+
+    int status = run(positional[1], positional[2], &options);
+
+    if (options.progress)
+        stopProgress(&reporter);
+    if (status != HUFF_OK)
+        fprintf(stderr, "Error: Cannot %s '%s' into '%s': %s\n", operation, positional[1], positional[2],
+                huffmanStrerror(status));
+    else if (options.stats)
+        printStatsJson(strcmp(positional[2], "-") == 0 ? stderr : stdout, operation, &stats);
+    huffmanFreeDictionary(dictionary);
+    if (status == HUFF_ERR_CANCELED)
+        return 130;
+    return status == HUFF_OK ? 0 : 1;
 }
 
+int main(int argc, char* argv[]) {
+    char** positional = malloc(argc * sizeof(*positional));
+    if (!positional)
+        return 1;
+    int status = runCommand(argc, argv, positional);
+    free(positional);
+    return status;
+}
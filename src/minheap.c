@@ -1,27 +1,21 @@
-#include <stdio.h>
-#include <stdlib.h>
 #include "minheap.h"
 
-static void swap(struct MinHeapNode** a, struct MinHeapNode** b) {
-    struct MinHeapNode* t = *a;
+static void swap(int16_t* a, int16_t* b) {
+    int16_t t = *a;
     *a = *b;
     *b = t;
 }
 
-struct MinHeapNode* newNode(char data, unsigned freq) {
-    struct MinHeapNode* node = malloc(sizeof(struct MinHeapNode));
-    node->data = data;
-    node->freq = freq;
-    node->left = node->right = NULL;
-    return node;
+static unsigned weight(const struct MinHeap* heap, unsigned i) {
+    return heap->nodes[heap->array[i]].freq;
 }
 
-struct MinHeap* createMinHeap(unsigned capacity) {
-    struct MinHeap* heap = malloc(sizeof(struct MinHeap));
-    heap->size = 0;
-    heap->capacity = capacity;
-    heap->array = malloc(capacity * sizeof(struct MinHeapNode*));
-    return heap;
+int newNode(struct HuffmanTree* tree, unsigned char data, unsigned freq) {
+    struct MinHeapNode* node = &tree->nodes[tree->count];
+    node->data = data;
+    node->freq = freq;
+    node->left = node->right = NO_CHILD;
+    return (int)tree->count++;
 }
 
 static void minHeapify(struct MinHeap* heap, int idx) {
@@ -29,9 +23,9 @@ static void minHeapify(struct MinHeap* heap, int idx) {
     int l = 2 * idx + 1;
     int r = 2 * idx + 2;
 
-    if (l < (int)heap->size && heap->array[l]->freq < heap->array[smallest]->freq)
+    if (l < (int)heap->size && weight(heap, l) < weight(heap, smallest))
         smallest = l;
-    if (r < (int)heap->size && heap->array[r]->freq < heap->array[smallest]->freq)
+    if (r < (int)heap->size && weight(heap, r) < weight(heap, smallest))
         smallest = r;
 
     if (smallest != idx) {
@@ -41,49 +35,53 @@ static void minHeapify(struct MinHeap* heap, int idx) {
 }
 
 void buildMinHeap(struct MinHeap* heap) {
-    for (int i = (heap->size - 1) / 2; i >= 0; i--)
+    for (int i = ((int)heap->size - 1) / 2; i >= 0; i--)
         minHeapify(heap, i);
 }
 
-void insertMinHeap(struct MinHeap* heap, struct MinHeapNode* node) {
+void insertMinHeap(struct MinHeap* heap, int node) {
     int i = heap->size++;
-    while (i && node->freq < heap->array[(i - 1) / 2]->freq) {
+    unsigned freq = heap->nodes[node].freq;
+    while (i && freq < weight(heap, (i - 1) / 2)) {
         heap->array[i] = heap->array[(i - 1) / 2];
         i = (i - 1) / 2;
     }
-    heap->array[i] = node;
+    heap->array[i] = (int16_t)node;
 }
 
-struct MinHeapNode* extractMin(struct MinHeap* heap) {
-    struct MinHeapNode* temp = heap->array[0];
+int extractMin(struct MinHeap* heap) {
+    int temp = heap->array[0];
     heap->array[0] = heap->array[--heap->size];
     minHeapify(heap, 0);
     return temp;
 }
 
-int isLeaf(struct MinHeapNode* root) {
-    return !(root->left) && !(root->right);
+int isLeaf(const struct MinHeapNode* node) {
+    return node->left == NO_CHILD && node->right == NO_CHILD;
 }
 
-struct MinHeapNode* buildHuffmanTree(char data[], int freq[], int size) {
-    struct MinHeap* heap = createMinHeap(size);
+// Build the tree of `size` (1 to 256) symbols into `tree`; returns the root's index
+int buildHuffmanTree(struct HuffmanTree* tree, const unsigned char data[], const int freq[], int size) {
+    struct MinHeap heap;
+    heap.nodes = tree->nodes;
+    tree->count = 0;
 
     for (int i = 0; i < size; i++)
-        heap->array[i] = newNode(data[i], freq[i]);
+        heap.array[i] = (int16_t)newNode(tree, data[i], freq[i]);
 
-    heap->size = size;
-    buildMinHeap(heap);
+    heap.size = size;
+    buildMinHeap(&heap);
 
-    while (heap->size > 1) {
-        struct MinHeapNode* left = extractMin(heap);
-        struct MinHeapNode* right = extractMin(heap);
+    while (heap.size > 1) {
+        int left = extractMin(&heap);
+        int right = extractMin(&heap);
 
-        struct MinHeapNode* top = newNode('$', left->freq + right->freq);
-        top->left = left;
-        top->right = right;
+        int top = newNode(tree, '$', tree->nodes[left].freq + tree->nodes[right].freq);
+        tree->nodes[top].left = (int16_t)left;
+        tree->nodes[top].right = (int16_t)right;
 
-        insertMinHeap(heap, top);
+        insertMinHeap(&heap, top);
     }
-    return extractMin(heap);
+    tree->root = extractMin(&heap);
+    return tree->root;
 }
-
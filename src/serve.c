@@ -0,0 +1,440 @@
+#define _POSIX_C_SOURCE 200809L
+
+#include <stdio.h>
+#include "serve.h"
+
+#ifdef _WIN32
+
+int serveSocket(const char* socketPath, unsigned workers, const struct HuffmanOptions* options) {
+    (void)socketPath;
+    (void)workers;
+    (void)options;
+    fprintf(stderr, "Error: serve needs Unix domain sockets, which this build does not support\n");
+    return HUFF_ERR_ARG;
+}
+
+#else
+
+#include <errno.h>
+#include <fcntl.h>
+#include <poll.h>
+#include <pthread.h>
+#include <signal.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/socket.h>
+#include <sys/stat.h>
+#include <sys/time.h>
+#include <sys/un.h>
+#include <unistd.h>
+#include "blocks.h"
+#include "format.h"
+#include "sink.h"
+#include "stats.h"
+
+// How often the accept loop checks the cancel flag
+#define SERVE_POLL_MS 200
+
+/*
+ * Connections move between two sets: idle ones are polled by the accept
+ * loop, and one that becomes readable is queued for a worker, which runs
+ * a single job on it and hands it back.  A client that keeps a connection
+ * open between jobs therefore never ties up a worker.  The accept loop
+ * also watches the connection of every running job, and cancels the job
+ * when its client hangs up.
+ */
+struct Server;
+
+struct ServeJob {
+    struct Server* server;
+    int fd;                      // connection being served, or -1 while the worker waits
+    volatile int canceled;       // the job's cancel flag
+};
+
+struct Server {
+    pthread_mutex_t lock;
+    pthread_cond_t ready;
+    int stop;
+    int wake[2];                 // written by workers when a connection goes back to idle
+    int* idle;
+    size_t idleCount;
+    int* queue;
+    size_t queueHead;
+    size_t queueCount;
+    size_t connections;          // open client connections, wherever they are
+    size_t capacity;             // of both idle and queue
+    unsigned workers;            // also the most threads one job may use
+    struct ServeJob* jobs;       // one per worker
+    const struct HuffmanOptions* options;
+};
+
+/*
+ * Read `size` bytes before `deadline` (monotonicNs() time).  Polls in short
+ * slices so a stalled client neither holds the worker past its deadline nor
+ * keeps it from seeing the cancel flag at shutdown.
+ */
+static int readFully(int fd, void* data, size_t size, uint64_t deadline, const struct HuffmanOptions* options) {
+    unsigned char* p = data;
+    while (size > 0) {
+        uint64_t now = monotonicNs();
+        if (now >= deadline || isCanceled(options))
+            return -1;
+        uint64_t leftMs = (deadline - now) / 1000000 + 1;
+        struct pollfd readable = {fd, POLLIN, 0};
+        int ready = poll(&readable, 1, leftMs < SERVE_POLL_MS ? (int)leftMs : SERVE_POLL_MS);
+        if (ready < 0 && errno != EINTR)
+            return -1;
+        if (ready <= 0)
+            continue;
+        ssize_t n = read(fd, p, size);
+        if (n < 0 && errno == EINTR)
+            continue;
+        if (n <= 0)
+            return -1;
+        p += n;
+        size -= (size_t)n;
+    }
+    return 0;
+}
+
+// Writes give up after SERVE_IO_TIMEOUT_MS without progress (SO_SNDTIMEO, set on accept)
+static int writeFully(int fd, const void* data, size_t size) {
+    const unsigned char* p = data;
+    while (size > 0) {
+        ssize_t n = write(fd, p, size);
+        if (n < 0 && errno == EINTR)
+            continue;
+        if (n <= 0)
+            return -1;
+        p += n;
+        size -= (size_t)n;
+    }
+    return 0;
+}
+
+static void writeDouble(struct ByteSink* out, double value) {
+    uint64_t bits;
+    memcpy(&bits, &value, sizeof(bits));
+    writeU64(out, bits);
+}
+
+static int sendResponse(int fd, int status, const struct HuffmanStats* stats, const unsigned char* data,
+                        size_t dataLength) {
+    const char* message = status == HUFF_OK ? "" : huffmanStrerror(status);
+    struct ByteSink header;
+    sinkInitMemory(&header, SERVE_RESPONSE_SIZE + strlen(message));
+    writeU32(&header, (uint32_t)status);
+    writeU32(&header, (uint32_t)strlen(message));
+    writeU64(&header, dataLength);
+    writeU64(&header, stats->inputSize);
+    writeU64(&header, stats->outputSize);
+    writeU64(&header, stats->codedBits);
+    writeU64(&header, stats->limitLossBits);
+    writeU64(&header, stats->totalNs);
+    for (int p = 0; p < HUFF_PHASE_COUNT; p++)
+        writeU64(&header, stats->phaseNs[p]);
+    for (int s = 0; s < 256; s++)
+        writeU64(&header, stats->histogram[s]);
+    writeDouble(&header, stats->entropy);
+    writeDouble(&header, stats->averageCodeLength);
+    sinkWrite(&header, message, strlen(message));
+
+    int result = header.error ? -1 : writeFully(fd, header.data, header.size);
+    if (result == 0 && dataLength)
+        result = writeFully(fd, data, dataLength);
+    sinkFree(&header);
+    return result;
+}
+
+/*
+ * Read one request from `fd`, run it and send the response.  Returns 0 to
+ * keep the connection, or -1 when the client has gone or broke framing.
+ */
+static int serveRequest(int fd, const struct HuffmanOptions* defaults, unsigned maxThreads, volatile int* cancel) {
+    struct HuffmanOptions options = *defaults;
+    options.cancel = cancel;
+    unsigned char request[SERVE_REQUEST_SIZE];
+    uint64_t deadline = monotonicNs() + (uint64_t)SERVE_IO_TIMEOUT_MS * 1000000;
+    if (readFully(fd, request, sizeof(request), deadline, &options) != 0)
+        return -1;
+    unsigned operation = request[0], source = request[1], flags = request[2];
+    uint32_t inputLength = readU32(request + 16), outputLength = readU32(request + 20);
+
+    struct HuffmanStats stats;
+    memset(&stats, 0, sizeof(stats));
+    int framed = (operation == 'c' || operation == 'd') &&
+                 (source == SERVE_SOURCE_INLINE ? inputLength <= SERVE_MAX_INLINE && outputLength == 0
+                  : source == SERVE_SOURCE_FILES && inputLength <= SERVE_MAX_PATH &&
+                    outputLength <= SERVE_MAX_PATH);
+    if (!framed) {
+        sendResponse(fd, HUFF_ERR_ARG, &stats, NULL, 0);
+        return -1;
+    }
+
+    unsigned char* payload = malloc((size_t)inputLength + outputLength + 2);
+    if (!payload)
+        return -1;
+    if (readFully(fd, payload, inputLength, deadline, &options) != 0 ||
+        readFully(fd, payload + inputLength + 1, outputLength, deadline, &options) != 0) {
+        free(payload);
+        return -1;
+    }
+    payload[inputLength] = '\0';
+    payload[inputLength + 1 + outputLength] = '\0';
+
+    uint32_t threads = readU32(request + 4);
+    options.threads = threads == 0 || threads > maxThreads ? maxThreads : threads;
+    options.blockSize = (size_t)readU64(request + 8);
+    options.maxCodeLength = request[3];
+    options.context = (flags & SERVE_FLAG_CONTEXT) != 0;
+    options.adaptive = (flags & SERVE_FLAG_ADAPTIVE) != 0;
+    options.dictionary = flags & SERVE_FLAG_DICTIONARY ? defaults->dictionary : NULL;
+    options.stats = &stats;
+    options.progress = NULL;
+    options.maxOutputSize = source == SERVE_SOURCE_INLINE ? SERVE_MAX_INLINE_OUTPUT : 0;
+
+    int status;
+    unsigned char* output = NULL;
+    size_t outputSize = 0;
+    if ((flags & SERVE_FLAG_DICTIONARY) && !defaults->dictionary)
+        status = HUFF_ERR_ARG;
+    else if (source == SERVE_SOURCE_INLINE)
+        status = (operation == 'c' ? compressBufferWithOptions : decompressBufferWithOptions)(
+            payload, inputLength, &output, &outputSize, &options);
+    else
+        status = (operation == 'c' ? compressFileWithOptions : decompressFileWithOptions)(
+            (const char*)payload, (const char*)payload + inputLength + 1, &options);
+    free(payload);
+
+    int result = sendResponse(fd, status, &stats, output, status == HUFF_OK ? outputSize : 0);
+    freeBuffer(output);
+    return result;
+}
+
+static void* serveWorker(void* arg) {
+    struct ServeJob* job = arg;
+    struct Server* server = job->server;
+    pthread_mutex_lock(&server->lock);
+    for (;;) {
+        while (!server->stop && server->queueCount == 0)
+            pthread_cond_wait(&server->ready, &server->lock);
+        if (server->stop)
+            break;
+        int fd = server->queue[server->queueHead];
+        server->queueHead = (server->queueHead + 1) % server->capacity;
+        server->queueCount--;
+        job->fd = fd;
+        job->canceled = 0;
+        pthread_mutex_unlock(&server->lock);
+
+        int keep = serveRequest(fd, server->options, server->workers, &job->canceled) == 0;
+
+        pthread_mutex_lock(&server->lock);
+        job->fd = -1;
+        if (job->canceled)
+            keep = 0;
+        if (keep && !server->stop) {
+            server->idle[server->idleCount++] = fd;
+            char byte = 0;
+            if (write(server->wake[1], &byte, 1) < 0) {
+                // The pipe is already full of wake-ups; the accept loop will look anyway
+            }
+        } else {
+            close(fd);
+            server->connections--;
+        }
+    }
+    pthread_mutex_unlock(&server->lock);
+    return NULL;
+}
+
+// Make room for one more connection in both sets; called with the lock held
+static int growServer(struct Server* server) {
+    if (server->connections < server->capacity)
+        return 0;
+    size_t capacity = server->capacity ? server->capacity * 2 : 16;
+    int* idle = realloc(server->idle, capacity * sizeof(int));
+    if (idle)
+        server->idle = idle;
+    int* queue = malloc(capacity * sizeof(int));
+    if (!idle || !queue) {
+        free(queue);
+        return -1;
+    }
+    for (size_t i = 0; i < server->queueCount; i++)
+        queue[i] = server->queue[(server->queueHead + i) % server->capacity];
+    free(server->queue);
+    server->queue = queue;
+    server->queueHead = 0;
+    server->capacity = capacity;
+    return 0;
+}
+
+// Bind `path`, replacing a stale socket file but not a server that still answers
+static int listenOn(const char* path) {
+    struct sockaddr_un address;
+    memset(&address, 0, sizeof(address));
+    address.sun_family = AF_UNIX;
+    if (strlen(path) >= sizeof(address.sun_path)) {
+        fprintf(stderr, "Error: Socket path '%s' is too long\n", path);
+        return -1;
+    }
+    strcpy(address.sun_path, path);
+
+    struct stat st;
+    if (stat(path, &st) == 0 && S_ISSOCK(st.st_mode)) {
+        int probe = socket(AF_UNIX, SOCK_STREAM, 0);
+        int live = probe >= 0 && connect(probe, (struct sockaddr*)&address, sizeof(address)) == 0;
+        if (probe >= 0)
+            close(probe);
+        if (live) {
+            fprintf(stderr, "Error: Another server is already listening on '%s'\n", path);
+            return -1;
+        }
+        unlink(path);
+    }
+
+    int fd = socket(AF_UNIX, SOCK_STREAM, 0);
+    if (fd < 0 || bind(fd, (struct sockaddr*)&address, sizeof(address)) != 0 || listen(fd, 128) != 0) {
+        fprintf(stderr, "Error: Cannot listen on '%s': %s\n", path, strerror(errno));
+        if (fd >= 0)
+            close(fd);
+        return -1;
+    }
+    fcntl(fd, F_SETFD, FD_CLOEXEC);
+    return fd;
+}
+
+int serveSocket(const char* socketPath, unsigned workers, const struct HuffmanOptions* options) {
+    int listener = listenOn(socketPath);
+    if (listener < 0)
+        return HUFF_ERR_IO;
+    // A client that hangs up before its response arrives must not take the server down
+    signal(SIGPIPE, SIG_IGN);
+
+    struct Server server;
+    memset(&server, 0, sizeof(server));
+    server.options = options;
+    if (pipe(server.wake) != 0) {
+        close(listener);
+        unlink(socketPath);
+        return HUFF_ERR_IO;
+    }
+    fcntl(server.wake[0], F_SETFL, O_NONBLOCK);
+    fcntl(server.wake[1], F_SETFL, O_NONBLOCK);
+    pthread_mutex_init(&server.lock, NULL);
+    pthread_cond_init(&server.ready, NULL);
+
+    workers = resolveThreads(workers);
+    server.workers = workers;
+    server.jobs = calloc(workers, sizeof(*server.jobs));
+    pthread_t* threads = server.jobs ? malloc(workers * sizeof(*threads)) : NULL;
+    unsigned started = 0;
+    for (unsigned i = 0; threads && i < workers; i++)
+        server.jobs[i] = (struct ServeJob){&server, -1, 0};
+    while (threads && started < workers &&
+           pthread_create(&threads[started], NULL, serveWorker, &server.jobs[started]) == 0)
+        started++;
+    int status = started ? HUFF_OK : HUFF_ERR_NOMEM;
+    if (started)
+        fprintf(stderr, "Listening on %s with %u workers\n", socketPath, started);
+
+    struct pollfd* polls = NULL;
+    size_t pollCapacity = 0;
+    while (status == HUFF_OK && !isCanceled(options)) {
+        pthread_mutex_lock(&server.lock);
+        if (2 + server.capacity + started > pollCapacity) {
+            struct pollfd* grown = realloc(polls, (2 + server.capacity + started) * sizeof(*polls));
+            if (!grown) {
+                pthread_mutex_unlock(&server.lock);
+                status = HUFF_ERR_NOMEM;
+                break;
+            }
+            polls = grown;
+            pollCapacity = 2 + server.capacity + started;
+        }
+        size_t count = 2 + server.idleCount;
+        polls[0] = (struct pollfd){listener, POLLIN, 0};
+        polls[1] = (struct pollfd){server.wake[0], POLLIN, 0};
+        for (size_t i = 0; i < server.idleCount; i++)
+            polls[2 + i] = (struct pollfd){server.idle[i], POLLIN, 0};
+        size_t idleEnd = count;
+        // Running jobs are watched for a hangup only; POLLHUP needs no event bit
+        for (unsigned i = 0; i < started; i++)
+            if (server.jobs[i].fd >= 0 && !server.jobs[i].canceled)
+                polls[count++] = (struct pollfd){server.jobs[i].fd, 0, 0};
+        pthread_mutex_unlock(&server.lock);
+
+        if (poll(polls, (nfds_t)count, SERVE_POLL_MS) <= 0)
+            continue;
+        if (polls[1].revents) {
+            char drain[64];
+            while (read(server.wake[0], drain, sizeof(drain)) > 0) {
+            }
+        }
+
+        pthread_mutex_lock(&server.lock);
+        // Queue the polled connections that have a request (or a hangup) waiting
+        for (size_t i = 2; i < idleEnd; i++) {
+            if (!polls[i].revents)
+                continue;
+            for (size_t j = 0; j < server.idleCount; j++)
+                if (server.idle[j] == polls[i].fd) {
+                    server.idle[j] = server.idle[--server.idleCount];
+                    server.queue[(server.queueHead + server.queueCount++) % server.capacity] = polls[i].fd;
+                    pthread_cond_signal(&server.ready);
+                    break;
+                }
+        }
+        // Cancel the jobs whose client has gone; the worker closes the connection
+        for (size_t i = idleEnd; i < count; i++) {
+            if (!polls[i].revents)
+                continue;
+            for (unsigned j = 0; j < started; j++)
+                if (server.jobs[j].fd == polls[i].fd)
+                    server.jobs[j].canceled = 1;
+        }
+        if (polls[0].revents & POLLIN) {
+            int client = accept(listener, NULL, NULL);
+            if (client >= 0 && growServer(&server) == 0) {
+                struct timeval timeout = {SERVE_IO_TIMEOUT_MS / 1000, SERVE_IO_TIMEOUT_MS % 1000 * 1000};
+                setsockopt(client, SOL_SOCKET, SO_SNDTIMEO, &timeout, sizeof(timeout));
+                fcntl(client, F_SETFD, FD_CLOEXEC);
+                server.idle[server.idleCount++] = client;
+                server.connections++;
+            } else if (client >= 0) {
+                close(client);
+            }
+        }
+        pthread_mutex_unlock(&server.lock);
+    }
+
+    // Running jobs are canceled; idle and queued connections are just closed
+    pthread_mutex_lock(&server.lock);
+    server.stop = 1;
+    for (unsigned i = 0; i < started; i++)
+        server.jobs[i].canceled = 1;
+    pthread_cond_broadcast(&server.ready);
+    pthread_mutex_unlock(&server.lock);
+    for (unsigned i = 0; i < started; i++)
+        pthread_join(threads[i], NULL);
+    for (size_t i = 0; i < server.idleCount; i++)
+        close(server.idle[i]);
+    for (size_t i = 0; i < server.queueCount; i++)
+        close(server.queue[(server.queueHead + i) % server.capacity]);
+
+    free(threads);
+    free(server.jobs);
+    free(polls);
+    free(server.idle);
+    free(server.queue);
+    close(server.wake[0]);
+    close(server.wake[1]);
+    pthread_cond_destroy(&server.ready);
+    pthread_mutex_destroy(&server.lock);
+    close(listener);
+    unlink(socketPath);
+    return status;
+}
+
+#endif
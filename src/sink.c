@@ -0,0 +1,141 @@
+#include <stdlib.h>
+#include <string.h>
+#include "sink.h"
+#include "stats.h"
+
+void sinkInitMemory(struct ByteSink* sink, size_t initialCapacity) {
+    sink->size = 0;
+    sink->capacity = initialCapacity ? initialCapacity : 64;
+    sink->data = malloc(sink->capacity);
+    sink->file = NULL;
+    sink->flushed = 0;
+    sink->flushNs = 0;
+    sink->error = sink->data ? HUFF_OK : HUFF_ERR_NOMEM;
+    sink->limit = 0;
+    sink->discard = 0;
+    sink->checksumming = 0;
+}
+
+void sinkInitFile(struct ByteSink* sink, FILE* file, size_t bufferSize) {
+    sinkInitMemory(sink, bufferSize);
+    sink->file = file;
+}
+
+// Decoding without keeping the output: the buffer only collects what the checksum still has to see
+void sinkInitDiscard(struct ByteSink* sink, size_t bufferSize) {
+    sinkInitMemory(sink, bufferSize);
+    sink->discard = 1;
+}
+
+static void foldChecksum(struct ByteSink* sink) {
+    if (sink->checksumming && sink->checked < sink->size) {
+        checksumUpdate(&sink->checksum, sink->data + sink->checked, sink->size - sink->checked);
+        sink->checked = sink->size;
+    }
+}
+
+int sinkFlush(struct ByteSink* sink) {
+    if ((sink->file || sink->discard) && sink->size && !sink->error) {
+        foldChecksum(sink);
+        uint64_t start = monotonicNs();
+        if (sink->file && fwrite(sink->data, 1, sink->size, sink->file) != sink->size)
+            sink->error = HUFF_ERR_IO;
+        sink->flushNs += monotonicNs() - start;
+        sink->flushed += sink->size;
+        sink->size = 0;
+        sink->checked = 0;
+    }
+    return sink->error ? -1 : 0;
+}
+
+// Total bytes written to the sink so far, flushed or not
+uint64_t sinkTell(const struct ByteSink* sink) {
+    return sink->flushed + sink->size;
+}
+
+int sinkStatus(const struct ByteSink* sink) {
+    return sink->error;
+}
+
+// Make room for `len` more bytes: flush file and discard sinks, grow memory sinks
+static int sinkReserve(struct ByteSink* sink, size_t len) {
+    if (sink->error)
+        return -1;
+    // Checked before growing, so a size field claiming terabytes never gets its buffer
+    uint64_t used = sinkTell(sink);
+    if (sink->limit && (used > sink->limit || len > sink->limit - used)) {
+        sink->error = HUFF_ERR_LIMIT;
+        return -1;
+    }
+    if (sink->size + len <= sink->capacity)
+        return 0;
+    if (sink->file || sink->discard) {
+        if (sinkFlush(sink) != 0)
+            return -1;
+        if (len <= sink->capacity)
+            return 0;
+    }
+    size_t capacity = sink->capacity;
+    while (capacity < sink->size + len)
+        capacity *= 2;
+    unsigned char* grown = realloc(sink->data, capacity);
+    if (!grown) {
+        sink->error = HUFF_ERR_NOMEM;
+        return -1;
+    }
+    sink->data = grown;
+    sink->capacity = capacity;
+    return 0;
+}
+
+void sinkWrite(struct ByteSink* sink, const void* src, size_t len) {
+    if (sinkReserve(sink, len) != 0)
+        return;
+    memcpy(sink->data + sink->size, src, len);
+    sink->size += len;
+}
+
+void sinkPutByte(struct ByteSink* sink, unsigned char byte) {
+    // A limited sink takes the checked path for every byte
+    if (sink->size < sink->capacity && !sink->limit) {
+        sink->data[sink->size++] = byte;
+        return;
+    }
+    sinkWrite(sink, &byte, 1);
+}
+
+// Append `len` uninitialized bytes to a memory sink and return where they start
+unsigned char* sinkExtend(struct ByteSink* sink, size_t len) {
+    if (sink->file || sink->discard || sinkReserve(sink, len) != 0)
+        return NULL;
+    unsigned char* region = sink->data + sink->size;
+    sink->size += len;
+    return region;
+}
+
+// Hand the buffer of a memory sink over to the caller
+unsigned char* sinkDetach(struct ByteSink* sink, size_t* size) {
+    unsigned char* data = sink->data;
+    *size = sink->size;
+    sink->data = NULL;
+    sink->size = sink->capacity = 0;
+    return data;
+}
+
+void sinkFree(struct ByteSink* sink) {
+    free(sink->data);
+    sink->data = NULL;
+    sink->size = sink->capacity = 0;
+}
+
+void sinkStartChecksum(struct ByteSink* sink) {
+    sink->checksumming = 1;
+    sink->checked = sink->size;
+    checksumInit(&sink->checksum);
+}
+
+uint64_t sinkChecksum(struct ByteSink* sink) {
+    foldChecksum(sink);
+    sink->checksumming = 0;
+    return checksumDigest(&sink->checksum);
+}
@@ -0,0 +1,64 @@
+#define _POSIX_C_SOURCE 200809L
+
+#include <math.h>
+#include "stats.h"
+
+#ifdef _WIN32
+#include <windows.h>
+
+uint64_t monotonicNs(void) {
+    LARGE_INTEGER frequency, now;
+    QueryPerformanceFrequency(&frequency);
+    QueryPerformanceCounter(&now);
+    uint64_t ticks = (uint64_t)now.QuadPart, hz = (uint64_t)frequency.QuadPart;
+    return ticks / hz * 1000000000u + ticks % hz * 1000000000u / hz;
+}
+
+#else
+#include <time.h>
+
+uint64_t monotonicNs(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000u + (uint64_t)ts.tv_nsec;
+}
+
+#endif
+
+void mergeStats(struct HuffmanStats* dst, const struct HuffmanStats* src) {
+    for (int s = 0; s < 256; s++)
+        dst->histogram[s] += src->histogram[s];
+    dst->codedBits += src->codedBits;
+    dst->limitLossBits += src->limitLossBits;
+    for (int p = 0; p < HUFF_PHASE_COUNT; p++)
+        dst->phaseNs[p] += src->phaseNs[p];
+}
+
+void finishStats(struct HuffmanStats* stats) {
+    uint64_t total = 0;
+    for (int s = 0; s < 256; s++)
+        total += stats->histogram[s];
+    stats->entropy = 0;
+    stats->averageCodeLength = 0;
+    if (total == 0)
+        return;
+
+    double entropy = 0;
+    for (int s = 0; s < 256; s++) {
+        if (stats->histogram[s]) {
+            double p = (double)stats->histogram[s] / (double)total;
+            entropy -= p * log2(p);
+        }
+    }
+    stats->entropy = entropy;
+    stats->averageCodeLength = (double)stats->codedBits / (double)total;
+}
+
+void setProgress(const struct HuffmanOptions* options, uint64_t done) {
+    if (options->progress)
+        *options->progress = done;
+}
+
+int isCanceled(const struct HuffmanOptions* options) {
+    return options->cancel && *options->cancel;
+}
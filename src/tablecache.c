@@ -0,0 +1,273 @@
+#include <pthread.h>
+#include <stddef.h>
+#include <stdlib.h>
+#include <string.h>
+#include "tablecache.h"
+#include "canonical.h"
+#include "huffman.h"
+
+#define CACHE_BUCKETS 256
+
+enum { ENTRY_ENCODE, ENTRY_DECODE };
+
+/*
+ * One built table.  Encoder entries are keyed by freq and maxLength and
+ * hold lengths and codes; decoder entries are keyed by lengths and hold
+ * the decode table.  An entry evicted while a decoder still uses it stays
+ * allocated, unlinked, until its last user releases it.
+ */
+struct CacheEntry {
+    struct CacheEntry* newer;
+    struct CacheEntry* older;
+    struct CacheEntry* chain;    // next entry in the same bucket
+    uint64_t hash;
+    size_t bytes;
+    unsigned users;
+    int kind;
+    int linked;
+    unsigned maxLength;
+    uint64_t limitLoss;
+    uint64_t freq[256];
+    uint8_t lengths[256];
+    uint32_t codes[256];
+    struct DecodeTable table;
+};
+
+static struct {
+    pthread_mutex_t lock;
+    struct CacheEntry* buckets[CACHE_BUCKETS];
+    struct CacheEntry* newest;
+    struct CacheEntry* oldest;
+    size_t bytes;
+    size_t limit;
+    uint64_t entries;
+    uint64_t hits;
+    uint64_t misses;
+    uint64_t evictions;
+} cache = { PTHREAD_MUTEX_INITIALIZER, {0}, NULL, NULL, 0, TABLE_CACHE_DEFAULT_LIMIT, 0, 0, 0, 0 };
+
+// Word-at-a-time multiply-xorshift hash; keys are whole tables of 64-bit words
+static uint64_t hashWords(uint64_t hash, const void* data, size_t words) {
+    const unsigned char* p = data;
+    for (size_t i = 0; i < words; i++) {
+        uint64_t word;
+        memcpy(&word, p + 8 * i, 8);
+        hash = (hash ^ word) * 0x9e3779b97f4a7c15u;
+        hash ^= hash >> 29;
+    }
+    return hash;
+}
+
+static uint64_t encodeKey(const uint64_t freq[256], unsigned maxLength) {
+    return hashWords(maxLength, freq, 256);
+}
+
+static uint64_t decodeKey(const uint8_t lengths[256]) {
+    return hashWords(0, lengths, 256 / 8);
+}
+
+static void freeEntry(struct CacheEntry* entry) {
+    if (entry->kind == ENTRY_DECODE)
+        freeDecodeTable(&entry->table);
+    free(entry);
+}
+
+// The following helpers run with cache.lock held
+
+static void unlinkEntry(struct CacheEntry* entry) {
+    struct CacheEntry** slot = &cache.buckets[entry->hash % CACHE_BUCKETS];
+    while (*slot != entry)
+        slot = &(*slot)->chain;
+    *slot = entry->chain;
+    if (entry->newer)
+        entry->newer->older = entry->older;
+    else
+        cache.newest = entry->older;
+    if (entry->older)
+        entry->older->newer = entry->newer;
+    else
+        cache.oldest = entry->newer;
+    cache.bytes -= entry->bytes;
+    cache.entries--;
+    entry->linked = 0;
+}
+
+static void pushNewest(struct CacheEntry* entry) {
+    entry->newer = NULL;
+    entry->older = cache.newest;
+    if (cache.newest)
+        cache.newest->newer = entry;
+    else
+        cache.oldest = entry;
+    cache.newest = entry;
+}
+
+static void touchEntry(struct CacheEntry* entry) {
+    if (cache.newest == entry)
+        return;
+    entry->newer->older = entry->older;
+    if (entry->older)
+        entry->older->newer = entry->newer;
+    else
+        cache.oldest = entry->newer;
+    pushNewest(entry);
+}
+
+// Drop least recently used entries until `incoming` more bytes fit
+static void evictFor(size_t incoming) {
+    while (cache.oldest && cache.bytes + incoming > cache.limit) {
+        struct CacheEntry* victim = cache.oldest;
+        unlinkEntry(victim);
+        cache.evictions++;
+        if (victim->users == 0)
+            freeEntry(victim);
+    }
+}
+
+// Link a new entry unless it cannot fit at all; returns whether it was linked
+static int insertEntry(struct CacheEntry* entry) {
+    if (entry->bytes > cache.limit)
+        return 0;
+    evictFor(entry->bytes);
+    struct CacheEntry** bucket = &cache.buckets[entry->hash % CACHE_BUCKETS];
+    entry->chain = *bucket;
+    *bucket = entry;
+    pushNewest(entry);
+    cache.bytes += entry->bytes;
+    cache.entries++;
+    entry->linked = 1;
+    return 1;
+}
+
+static struct CacheEntry* findEncode(uint64_t hash, const uint64_t freq[256], unsigned maxLength) {
+    for (struct CacheEntry* e = cache.buckets[hash % CACHE_BUCKETS]; e; e = e->chain)
+        if (e->hash == hash && e->kind == ENTRY_ENCODE && e->maxLength == maxLength &&
+            memcmp(e->freq, freq, sizeof(e->freq)) == 0)
+            return e;
+    return NULL;
+}
+
+static struct CacheEntry* findDecode(uint64_t hash, const uint8_t lengths[256]) {
+    for (struct CacheEntry* e = cache.buckets[hash % CACHE_BUCKETS]; e; e = e->chain)
+        if (e->hash == hash && e->kind == ENTRY_DECODE && memcmp(e->lengths, lengths, 256) == 0)
+            return e;
+    return NULL;
+}
+
+uint64_t cachedCodeLengths(const uint64_t freq[256], uint8_t lengths[256], uint32_t codes[256],
+                           unsigned maxLength) {
+    if (!maxLength)
+        maxLength = MAX_CODE_LEN;
+    uint64_t hash = encodeKey(freq, maxLength);
+    pthread_mutex_lock(&cache.lock);
+    struct CacheEntry* entry = findEncode(hash, freq, maxLength);
+    if (entry) {
+        cache.hits++;
+        touchEntry(entry);
+        memcpy(lengths, entry->lengths, 256);
+        memcpy(codes, entry->codes, 256 * sizeof(uint32_t));
+        uint64_t limitLoss = entry->limitLoss;
+        pthread_mutex_unlock(&cache.lock);
+        return limitLoss;
+    }
+    cache.misses++;
+    int enabled = cache.limit != 0;
+    pthread_mutex_unlock(&cache.lock);
+
+    // Built outside the lock so threads missing on different tables do not wait for each other
+    uint64_t limitLoss = buildCodeLengths(freq, lengths, maxLength);
+    assignCanonicalCodes(lengths, codes);
+    entry = enabled ? malloc(sizeof(*entry)) : NULL;
+    if (!entry)
+        return limitLoss;
+    entry->hash = hash;
+    entry->bytes = sizeof(*entry);
+    entry->users = 0;
+    entry->kind = ENTRY_ENCODE;
+    entry->linked = 0;
+    entry->maxLength = maxLength;
+    entry->limitLoss = limitLoss;
+    memcpy(entry->freq, freq, sizeof(entry->freq));
+    memcpy(entry->lengths, lengths, 256);
+    memcpy(entry->codes, codes, sizeof(entry->codes));
+
+    pthread_mutex_lock(&cache.lock);
+    int linked = !findEncode(hash, freq, maxLength) && insertEntry(entry);
+    pthread_mutex_unlock(&cache.lock);
+    if (!linked)
+        free(entry);
+    return limitLoss;
+}
+
+const struct DecodeTable* acquireDecodeTable(const uint8_t lengths[256], int* status) {
+    uint64_t hash = decodeKey(lengths);
+    pthread_mutex_lock(&cache.lock);
+    struct CacheEntry* entry = findDecode(hash, lengths);
+    if (entry) {
+        cache.hits++;
+        touchEntry(entry);
+        entry->users++;
+        pthread_mutex_unlock(&cache.lock);
+        return &entry->table;
+    }
+    cache.misses++;
+    pthread_mutex_unlock(&cache.lock);
+
+    entry = malloc(sizeof(*entry));
+    if (!entry) {
+        *status = HUFF_ERR_NOMEM;
+        return NULL;
+    }
+    entry->hash = hash;
+    entry->users = 1;
+    entry->kind = ENTRY_DECODE;
+    entry->linked = 0;
+    memcpy(entry->lengths, lengths, 256);
+    assignCanonicalCodes(lengths, entry->codes);
+    *status = buildDecodeTable(&entry->table, lengths, entry->codes);
+    if (*status != HUFF_OK) {
+        free(entry);
+        return NULL;
+    }
+    size_t rootSize = (size_t)1 << entry->table.rootBits, tableSize = rootSize;
+    for (size_t p = 0; p < rootSize; p++)
+        if (entry->table.entries[p].subBits)
+            tableSize += (size_t)1 << entry->table.entries[p].subBits;
+    entry->bytes = sizeof(*entry) + tableSize * sizeof(struct DecodeEntry);
+
+    // A table another thread cached meanwhile wins; this one is then private to the caller
+    pthread_mutex_lock(&cache.lock);
+    if (!findDecode(hash, lengths))
+        insertEntry(entry);
+    pthread_mutex_unlock(&cache.lock);
+    return &entry->table;
+}
+
+void releaseDecodeTable(const struct DecodeTable* table) {
+    if (!table)
+        return;
+    struct CacheEntry* entry = (struct CacheEntry*)((const char*)table - offsetof(struct CacheEntry, table));
+    pthread_mutex_lock(&cache.lock);
+    int unused = --entry->users == 0 && !entry->linked;
+    pthread_mutex_unlock(&cache.lock);
+    if (unused)
+        freeEntry(entry);
+}
+
+void huffmanSetTableCacheLimit(size_t bytes) {
+    pthread_mutex_lock(&cache.lock);
+    cache.limit = bytes;
+    evictFor(0);
+    pthread_mutex_unlock(&cache.lock);
+}
+
+void huffmanTableCacheStats(struct HuffmanCacheStats* stats) {
+    pthread_mutex_lock(&cache.lock);
+    stats->hits = cache.hits;
+    stats->misses = cache.misses;
+    stats->evictions = cache.evictions;
+    stats->entries = cache.entries;
+    stats->bytes = cache.bytes;
+    stats->limit = cache.limit;
+    pthread_mutex_unlock(&cache.lock);
+}